@@ -0,0 +1,101 @@
+"""
+Benchmark walking a source on the device serially and concurrently.
+
+The fixture tree is a local directory behind a latency-injecting
+`SimulatedTransport`, placed under a fake "mtp:host=..." directory so it's
+walked as a source on the device.
+
+Usage:
+    python -m benchmarks.walk [--dirs N] [--files N] [--latency SECONDS]
+"""
+
+
+import argparse
+import os
+import tempfile
+import time
+
+from pysyncdroid.sync import Sync, WALK_JOBS
+from pysyncdroid.transport import SimulatedTransport
+
+
+#: constants
+FAKE_MTP_DETAILS = ("mtp://fixture/", "/run/user/<user>/gvfs/mtp:host=fixture")
+
+
+def create_fixture(top, dirs, files):
+    """
+    Create a tree of album directories with (empty) files, grouped by year.
+
+    :argument top: fixture root directory
+    :type top: str
+    :argument dirs: number of album directories
+    :type dirs: int
+    :argument files: number of files per album directory
+    :type files: int
+
+    """
+    for d in range(dirs):
+        album_dir = os.path.join(top, str(2000 + d % 10), "album{}".format(d))
+        os.makedirs(album_dir)
+
+        for f in range(files):
+            path = os.path.join(album_dir, "IMG_{:04d}.jpg".format(f))
+            with open(path, "w"):
+                pass
+
+
+def walk(source, latency, jobs):
+    """
+    Walk the source.
+
+    :argument source: source directory
+    :type source: str
+    :argument latency: per-call latency in seconds
+    :type latency: float
+    :argument jobs: max number of directories listed at the same time
+    :type jobs: int
+
+    :returns tuple - duration, number of listed directories and files
+
+    """
+    sync = Sync(
+        FAKE_MTP_DETAILS,
+        source,
+        "/dst",
+        backend=SimulatedTransport(latency=latency),
+    )
+    sync.walk_jobs = jobs
+
+    start = time.time()
+    dirs = 0
+    files = 0
+    for _, _, dir_files in sync.walk_source():
+        dirs += 1
+        files += len(dir_files)
+
+    return time.time() - start, dirs, files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--dirs", type=int, default=100)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = os.path.join(tmp_dir, "mtp:host=fixture", "DCIM")
+        create_fixture(source, args.dirs, args.files)
+
+        for jobs in (1, WALK_JOBS):
+            duration, dirs, files = walk(source, args.latency, jobs)
+            print(
+                "jobs={j:<3} {d} directories, {f} files: {t:.2f}s".format(
+                    j=jobs, d=dirs, f=files, t=duration
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,108 @@
 
 
 import argparse
-
-from pysyncdroid.exceptions import DeviceException, MappingFileException
+import re
+import sqlite3
+
+from pysyncdroid.exceptions import (
+    DeviceException,
+    MappingFileException,
+    SyncException,
+)
+from pysyncdroid.filters import INCLUDE_PREFIX
 from pysyncdroid.find_device import get_connection_details, get_mtp_details
-from pysyncdroid.sync import Sync, IGNORE, REMOVE, SYNCHRONIZE
+from pysyncdroid.plan import load_plans
+from pysyncdroid.state import StateStore, STATE_DB_PATH
+from pysyncdroid.sync import (
+    Sync,
+    IGNORE,
+    REMOVE,
+    SYNCHRONIZE,
+    MTIME_TOLERANCE,
+)
+from pysyncdroid.transport import GVFS, FUSE, GIO, HELPER, LOCAL
+from pysyncdroid.watch import Watcher, DEBOUNCE
+
+
+#: constants
+# size suffixes multipliers
+SIZE_UNITS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3}
+
+# mapping file filter rules prefixes
+MAPPING_EXCLUDE_PREFIX = "- "
+MAPPING_INCLUDE_PREFIX = "+ "
+
+
+def positive_int(value):
+    """
+    Argument type for positive integers.
+
+    :argument value: argument value
+    :type value: str
+
+    :returns int
+
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            '"{v}" is not a positive integer'.format(v=value)
+        )
+
+    return number
+
+
+def size(value):
+    """
+    Argument type for sizes, in bytes or with a K, M or G suffix.
+
+    :argument value: argument value
+    :type value: str
+
+    :returns int
+
+    """
+    match = re.match(r"^(\d+)([kmg]?)b?$", value.strip().lower())
+    if match is None:
+        raise argparse.ArgumentTypeError(
+            '"{v}" is not a size, e.g. 500K or 10M'.format(v=value)
+        )
+
+    return int(match.group(1)) * SIZE_UNITS[match.group(2)]
+
+
+def days_to_seconds(days):
+    """
+    Convert an optional number of days to seconds.
+
+    :argument days: number of days
+    :type days: float or None
+
+    :returns float or None
+
+    """
+    if days is None:
+        return None
+
+    return days * 24 * 60 * 60
+
+
+class FilterRuleAction(argparse.Action):
+    """
+    Collect exclude and include patterns (in the given order) as filter
+    rules.
+    """
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        rules = list(getattr(namespace, self.dest) or [])
+        prefix = INCLUDE_PREFIX if option_string == "--include" else ""
+        rules.extend(prefix + value for value in values)
+
+        setattr(namespace, self.dest, rules)
 
 
 def create_parser():
@@ -52,6 +150,63 @@ def create_parser():
         default=False,
         help="Overwrite existing files; not used by default",
     )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        default=False,
+        help="Overwrite existing files only if they differ in size or the "
+        "source file is newer; not used by default",
+    )
+    parser.add_argument(
+        "-c",
+        "--checksum",
+        action="store_true",
+        default=False,
+        help="Overwrite existing files only if their content changed since "
+        "the recorded sync (see --state-db); not used by default",
+    )
+
+    # moves are detected across the whole tree, i.e. in memory
+    plan_group = parser.add_mutually_exclusive_group()
+    plan_group.add_argument(
+        "--detect-moves",
+        action="store_true",
+        default=False,
+        help="Move files moved (or renamed) in the source on the destination "
+        "instead of copying them again; not used by default",
+    )
+    plan_group.add_argument(
+        "--spill-plan",
+        action="store_true",
+        default=False,
+        help="Scan the whole source to a temporary file first and "
+        "synchronize from it, i.e. with memory use independent of the tree "
+        "size; not used by default",
+    )
+    parser.add_argument(
+        "--manifest",
+        action="store_true",
+        default=False,
+        help="Keep a manifest of synchronized files in the destination "
+        "directory and read it instead of listing destination directories; "
+        "not used by default",
+    )
+    parser.add_argument(
+        "--bulk-list",
+        action="store_true",
+        default=False,
+        help="List the whole destination directory tree at once (by a single "
+        "`find` over the gvfs mount) instead of directory by directory; not "
+        "used by default",
+    )
+    parser.add_argument(
+        "--mtime-tolerance",
+        type=float,
+        default=MTIME_TOLERANCE,
+        metavar="SECONDS",
+        help="Max difference of modification times considered equal; "
+        "{} by default".format(MTIME_TOLERANCE),
+    )
     parser.add_argument(
         "-i",
         "--ignore-file-type",
@@ -59,6 +214,141 @@ def create_parser():
         default=None,
         help="Ignored file type(s), e.g. html, txt, ...",
     )
+    parser.add_argument(
+        "--exclude",
+        nargs="+",
+        action=FilterRuleAction,
+        dest="filter_rules",
+        metavar="PATTERN",
+        help="Excluded paths, gitignore-style patterns relative to the "
+        "source, e.g. .thumbnails/ or /Android/data/; excluded directories "
+        "aren't listed at all",
+    )
+    parser.add_argument(
+        "--include",
+        nargs="+",
+        action=FilterRuleAction,
+        dest="filter_rules",
+        metavar="PATTERN",
+        help="Paths included again (the last matching pattern wins), "
+        "gitignore-style patterns relative to the source",
+    )
+    parser.add_argument(
+        "--min-size",
+        type=size,
+        default=None,
+        metavar="SIZE",
+        help="Skip smaller files, e.g. 100K",
+    )
+    parser.add_argument(
+        "--max-size",
+        type=size,
+        default=None,
+        metavar="SIZE",
+        help="Skip bigger files, e.g. 2G",
+    )
+    parser.add_argument(
+        "--min-age",
+        type=float,
+        default=None,
+        metavar="DAYS",
+        help="Skip files modified less than DAYS ago",
+    )
+    parser.add_argument(
+        "--max-age",
+        type=float,
+        default=None,
+        metavar="DAYS",
+        help="Skip files modified more than DAYS ago",
+    )
+    parser.add_argument(
+        "-b",
+        "--backend",
+        choices=[GVFS, FUSE, GIO, HELPER, LOCAL],
+        default=GVFS,
+        help="Device operations backend; gvfs by default",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=positive_int,
+        default=1,
+        help="Number of files copied at the same time; 1 by default",
+    )
+
+    # sync state
+    state_group = parser.add_mutually_exclusive_group()
+    state_group.add_argument(
+        "--trust-state",
+        action="store_true",
+        default=False,
+        help="Skip directories unchanged since the recorded sync, i.e. "
+        "without listing them on the device; not used by default",
+    )
+    state_group.add_argument(
+        "--rescan",
+        action="store_true",
+        default=False,
+        help="List all directories and re-record the sync state; not used "
+        "by default",
+    )
+    # a dry run doesn't synchronize anything, i.e. there's nothing to watch
+    run_group = parser.add_mutually_exclusive_group()
+    run_group.add_argument(
+        "--watch",
+        action="store_true",
+        default=False,
+        help="Keep synchronizing source files as they change; not used by "
+        "default",
+    )
+    run_group.add_argument(
+        "-n",
+        "--dry-run",
+        action="store_true",
+        default=False,
+        help="Only report what would be synchronized (and estimate how long "
+        "it would take, see --state-db); not used by default",
+    )
+    run_group.add_argument(
+        "--save-plan",
+        metavar="PATH",
+        help="Like --dry-run, and save the plan to be applied later (see "
+        "--apply-plan); not used by default",
+    )
+    run_group.add_argument(
+        "--apply-plan",
+        metavar="PATH",
+        help="Synchronize as planned by --save-plan, i.e. without scanning; "
+        "not used by default",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=DEBOUNCE,
+        metavar="SECONDS",
+        help="Wait for changes to settle for this long when watching; "
+        "{} by default".format(DEBOUNCE),
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=False,
+        help="List only source directories modified since the recorded sync; "
+        "not used by default",
+    )
+    parser.add_argument(
+        "--two-way",
+        action="store_true",
+        default=False,
+        help="Synchronize changes made on either side to the other one, "
+        "merged against the recorded sync; not used by default",
+    )
+    parser.add_argument(
+        "--state-db",
+        default=STATE_DB_PATH,
+        metavar="PATH",
+        help="Sync state database; {} by default".format(STATE_DB_PATH),
+    )
 
     return parser
 
@@ -85,6 +375,10 @@ def parse_sync_mapping_file(sync_mapping_file):
         if not line:
             continue
 
+        # filter rules, see `parse_mapping_filter_rules`
+        if line.startswith((MAPPING_EXCLUDE_PREFIX, MAPPING_INCLUDE_PREFIX)):
+            continue
+
         if src_dst_separator not in line:
             raise MappingFileException(
                 "Please separate source and destination"
@@ -99,6 +393,47 @@ def parse_sync_mapping_file(sync_mapping_file):
     return sources, destinations
 
 
+def parse_mapping_filter_rules(sync_mapping_file):
+    """
+    Parse filter rules of sync mapping file, i.e. lines with an exclude
+    ("- PATTERN") or include ("+ PATTERN") pattern.
+
+    Rules apply to the mapping they follow, rules preceding all mappings
+    apply to all of them.
+
+    :argument sync_mapping_file: Sync mapping file absolute path
+    :type sync_mapping_file: str
+
+    :returns list - filter rules of each mapping
+
+    """
+    shared_rules = []
+    mapping_rules = []
+
+    with open(sync_mapping_file, "r") as f:
+        mapping_lines = f.readlines()
+
+    for line in mapping_lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        if line.startswith(MAPPING_EXCLUDE_PREFIX):
+            rule = line[len(MAPPING_EXCLUDE_PREFIX) :].strip()
+        elif line.startswith(MAPPING_INCLUDE_PREFIX):
+            rule = INCLUDE_PREFIX + line[len(MAPPING_INCLUDE_PREFIX) :].strip()
+        else:
+            mapping_rules.append(list(shared_rules))
+            continue
+
+        if mapping_rules:
+            mapping_rules[-1].append(rule)
+        else:
+            shared_rules.append(rule)
+
+    return mapping_rules
+
+
 def parse_sync_info(args):
     """
     Parse sync info, i.e. handle combinations of soure, destination and file
@@ -158,9 +493,142 @@ def run(args):
     except (argparse.ArgumentError, MappingFileException) as exc:
         return str(exc)
 
-    for source, destination in zip(sources, destinations):
+    mapping_rules = None
+    if args.file is not None:
+        mapping_rules = parse_mapping_filter_rules(args.file)
+
+    if args.two_way:
+        conflicting = [
+            option
+            for option, value in (
+                ("--trust-state", args.trust_state),
+                ("--checksum", args.checksum),
+                ("--incremental", args.incremental),
+                ("--detect-moves", args.detect_moves),
+                ("--spill-plan", args.spill_plan),
+                ("--manifest", args.manifest),
+                ("--watch", args.watch),
+                ("--dry-run", args.dry_run),
+                ("--save-plan", args.save_plan),
+                ("--apply-plan", args.apply_plan),
+            )
+            if value
+        ]
+        if conflicting:
+            return "Two-way sync (--two-way) can't be combined with {}".format(
+                ", ".join(conflicting)
+            )
+
+    plans = None
+    if args.apply_plan is not None:
+        try:
+            with open(args.apply_plan, "r") as f:
+                plans = load_plans(f)
+        except (OSError, ValueError) as exc:
+            return str(exc)
+
+    # synchronized files are recorded only for options relying on them
+    record_files = (
+        args.trust_state
+        or args.rescan
+        or args.checksum
+        or args.incremental
+        or args.two_way
+    )
+
+    # operation costs of every run are recorded to estimate dry runs
+    try:
+        store = StateStore(args.state_db)
+    except (OSError, sqlite3.Error) as exc:
+        if record_files:
+            return 'Can\'t open state database "{p}": {e}'.format(
+                p=args.state_db, e=exc
+            )
+        store = None
+
+    plan_file = None
+    if args.save_plan is not None:
+        try:
+            plan_file = open(args.save_plan, "w")
+        except OSError as exc:
+            if store is not None:
+                store.close()
+            return str(exc)
+
+    try:
+        syncs = sync_mappings(
+            args,
+            mtp_details,
+            sources,
+            destinations,
+            store if record_files else None,
+            mapping_rules,
+            plan_file,
+            plans,
+            store,
+        )
+    except SyncException as exc:
+        return str(exc)
+    else:
+        if args.watch:
+            return watch(args, syncs)
+    finally:
+        if store is not None:
+            store.close()
+        if plan_file is not None:
+            plan_file.close()
+
+
+def sync_mappings(
+    args,
+    mtp_details,
+    sources,
+    destinations,
+    state=None,
+    mapping_rules=None,
+    plan_file=None,
+    plans=None,
+    costs_store=None,
+):
+    """
+    Synchronize source to destination mappings.
+
+    :argument args: command line arguments namespace
+    :type args: object
+    :argument mtp_details: MTP URL and gvfs path to the device
+    :type mtp_details: tuple
+    :argument sources: source directories
+    :type sources: list
+    :argument destinations: destination directories
+    :type destinations: list
+    :argument state: sync state store
+    :type state: StateStore or None
+    :argument mapping_rules: filter rules of each mapping (from the mapping
+    file), applied after command line ones
+    :type mapping_rules: list or None
+    :argument plan_file: file object to save plans of the mappings to
+    instead of synchronizing them
+    :type plan_file: file or None
+    :argument plans: saved plans to carry out instead of synchronizing, see
+    `load_plans`
+    :type plans: dict or None
+    :argument costs_store: store to record operation costs in
+    :type costs_store: StateStore or None
+
+    :returns list - Sync instances
+
+    """
+    syncs = []
+
+    if mapping_rules is None:
+        mapping_rules = [[] for _ in sources]
+
+    for source, destination, rules in zip(
+        sources, destinations, mapping_rules
+    ):
         source = source.strip()
         destination = destination.strip()
+        rules = (args.filter_rules or []) + rules
 
         sync = Sync(
             mtp_details=mtp_details,
@@ -170,12 +638,85 @@ def run(args):
             unmatched=args.unmatched,
             overwrite_existing=args.overwrite,
             ignore_file_types=args.ignore_file_type,
+            backend=args.backend,
+            jobs=args.jobs,
+            update=args.update,
+            mtime_tolerance=args.mtime_tolerance,
+            state=state,
+            device="{v}:{m}".format(v=args.vendor, m=args.model),
+            trust_state=args.trust_state,
+            checksum=args.checksum,
+            incremental=args.incremental,
+            detect_moves=args.detect_moves,
+            spill_plan=args.spill_plan,
+            manifest=args.manifest,
+            bulk_list=args.bulk_list,
+            filter_rules=rules or None,
+            min_size=args.min_size,
+            max_size=args.max_size,
+            min_age=days_to_seconds(args.min_age),
+            max_age=days_to_seconds(args.max_age),
+            two_way=args.two_way,
+            costs_store=costs_store,
         )
 
         sync.set_source_abs()
         sync.set_destination_abs()
 
-        sync.sync()
+        if args.dry_run or plan_file is not None:
+            print(sync.dry_run(plan_file).format())
+        elif plans is not None:
+            records = plans.get((sync.device, sync.get_mapping_key()))
+            if records is None:
+                print(
+                    "No saved plan for {s} ==> {d}".format(
+                        s=sync.source, d=sync.destination
+                    )
+                )
+            elif sync.apply_plan(records):
+                print(
+                    "Some planned actions in {s} ==> {d} were skipped as "
+                    "files changed since planned".format(
+                        s=sync.source, d=sync.destination
+                    )
+                )
+        else:
+            sync.sync()
+
+        # conflicting files are left alone
+        if args.two_way:
+            for src_file, dst_file in sync.conflicts:
+                print(
+                    "Conflict, {s} and {d} both changed since the last "
+                    "sync".format(s=src_file, d=dst_file)
+                )
+
+        syncs.append(sync)
+
+    return syncs
+
+
+def watch(args, syncs):
+    """
+    Keep synchronizing source files as they change, until interrupted.
+
+    :argument args: command line arguments namespace
+    :type args: object
+    :argument syncs: Sync instances
+    :type syncs: list
+
+    """
+    try:
+        watcher = Watcher(syncs, debounce=args.debounce)
+    except (OSError, ValueError) as exc:
+        return str(exc)
+
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
 
 
 def main():
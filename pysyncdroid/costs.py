@@ -0,0 +1,119 @@
+"""Costs of transport operations measured while synchronizing"""
+
+
+import threading
+
+
+#: constants
+# measured operations
+COPY_OP = "copy"
+MOVE_OP = "move"
+REMOVE_OP = "remove"
+MKDIR_OP = "mkdir"
+
+
+class Costs(object):
+    def __init__(self, sums=None):
+        """
+        Per-operation latency and throughput, fitted to measured operations.
+
+        An operation (or a batch of operations) takes `count * latency +
+        size * seconds_per_byte` seconds. Both rates are fitted by least
+        squares, i.e. only the sums of the normal equations are kept (and
+        recorded, see `StateStore.add_costs`), no matter how many operations
+        were measured.
+
+        :argument sums: operation to a list of sums - count^2, count * size,
+        size^2, count * seconds, size * seconds
+        :type sums: dict or None
+
+        """
+        self.sums = {
+            operation: list(op_sums)
+            for operation, op_sums in (sums or {}).items()
+        }
+        # operations are measured by concurrent jobs
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self.sums)
+
+    def add(self, operation, seconds, count=1, size=0):
+        """
+        Add a measured operation (or a batch of them).
+
+        :argument operation: operation, e.g. COPY_OP
+        :type operation: str
+        :argument seconds: operation duration
+        :type seconds: float
+        :argument count: number of operations
+        :type count: int
+        :argument size: number of bytes transferred
+        :type size: int
+
+        """
+        with self._lock:
+            op_sums = self.sums.setdefault(operation, [0.0] * 5)
+            op_sums[0] += count * count
+            op_sums[1] += count * size
+            op_sums[2] += float(size) * size
+            op_sums[3] += count * seconds
+            op_sums[4] += size * seconds
+
+    def get_rates(self, operation):
+        """
+        Fit per-operation latency and per-byte time to measured operations.
+
+        :argument operation: operation, e.g. COPY_OP
+        :type operation: str
+
+        :returns tuple or None - (latency, seconds per byte), None if the
+        operation wasn't measured
+
+        """
+        op_sums = self.sums.get(operation)
+        if not op_sums or not op_sums[0]:
+            return None
+
+        # count^2, count * size, size^2, count * seconds, size * seconds
+        n_n, n_b, b_b, n_t, b_t = op_sums
+
+        det = n_n * b_b - n_b * n_b
+        if b_b and det > 1e-9 * n_n * b_b:
+            latency = (n_t * b_b - n_b * b_t) / det
+            per_byte = (n_n * b_t - n_b * n_t) / det
+        elif b_b:
+            # sizes proportional to counts, attribute the time to the bytes
+            latency, per_byte = 0.0, b_t / b_b
+        else:
+            latency, per_byte = n_t / n_n, 0.0
+
+        # noisy measurements, keep both rates meaningful
+        if per_byte < 0:
+            latency, per_byte = n_t / n_n, 0.0
+        elif latency < 0:
+            latency, per_byte = 0.0, b_t / b_b
+
+        return latency, per_byte
+
+    def estimate(self, operation, count, size=0):
+        """
+        Estimate duration of operations.
+
+        :argument operation: operation, e.g. COPY_OP
+        :type operation: str
+        :argument count: number of operations
+        :type count: int
+        :argument size: number of bytes transferred
+        :type size: int
+
+        :returns float or None - seconds, None if the operation wasn't
+        measured
+
+        """
+        rates = self.get_rates(operation)
+        if rates is None:
+            return None
+
+        latency, per_byte = rates
+        return count * latency + size * per_byte
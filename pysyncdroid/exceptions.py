@@ -9,9 +9,9 @@ class DeviceException(Exception):
     pass
 
 
-class IgnoredTypeException(Exception):
+class MappingFileException(Exception):
     pass
 
 
-class MappingFileException(Exception):
+class SyncException(Exception):
     pass
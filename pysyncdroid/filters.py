@@ -0,0 +1,270 @@
+"""Include/exclude filters of synchronized files"""
+
+
+import os
+import re
+import time
+
+
+#: constants
+# prefix of a rule re-including paths excluded by preceding rules
+INCLUDE_PREFIX = "!"
+
+
+def translate(pattern):
+    """
+    Translate a gitignore-style pattern to a regular expression matching
+    paths relative to the synchronized directory.
+
+    Patterns containing a slash (other than a trailing one) are anchored to
+    the synchronized directory, the others match a name at any depth. A
+    trailing slash matches directories only. `*` and `?` don't match a
+    slash, `**` matches any number of directories.
+
+    :argument pattern: gitignore-style pattern
+    :type pattern: str
+
+    :returns tuple - compiled regular expression and a directory only flag
+
+    """
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+
+    regex = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+
+        if pattern.startswith("**", i):
+            i += 2
+            if pattern.startswith("/", i):
+                # "**/" - any number of directories, including none
+                regex.append("(?:.*/)?")
+                i += 1
+            else:
+                regex.append(".*")
+            continue
+
+        if c == "*":
+            regex.append("[^/]*")
+        elif c == "?":
+            regex.append("[^/]")
+        elif c == "[" and "]" in pattern[i + 2 :]:
+            end = pattern.index("]", i + 2)
+            chars = pattern[i + 1 : end]
+            if chars.startswith("!"):
+                chars = "^" + chars[1:]
+            regex.append("[{}]".format(chars.replace("\\", "\\\\")))
+            i = end
+        else:
+            regex.append(re.escape(c))
+
+        i += 1
+
+    prefix = "" if anchored else "(?:.*/)?"
+    return re.compile(prefix + "".join(regex) + r"\Z", re.DOTALL), dir_only
+
+
+def combine(regexes):
+    """
+    Combine regular expressions to one matching any of them.
+
+    :argument regexes: compiled regular expressions
+    :type regexes: list
+
+    :returns compiled regular expression or None if there's none to combine
+
+    """
+    if not regexes:
+        return None
+
+    return re.compile(
+        "|".join("(?:{})".format(regex.pattern) for regex in regexes),
+        re.DOTALL,
+    )
+
+
+class Filter(object):
+    def __init__(
+        self,
+        rules=None,
+        ignore_file_types=None,
+        min_size=None,
+        max_size=None,
+        min_age=None,
+        max_age=None,
+    ):
+        """
+        Files (and directories) excluded from synchronization, compiled
+        once.
+
+        Rules are gitignore-style patterns excluding matching paths, or
+        re-including them if prefixed with `INCLUDE_PREFIX`; the last
+        matching rule wins. An excluded directory is pruned, i.e. nothing in
+        it is synchronized (nor listed).
+
+        :argument rules: gitignore-style patterns
+        :type rules: list or None
+        :argument ignore_file_types: extensions for ignored file types
+        :type ignore_file_types: list or None
+        :argument min_size: min size (in bytes) of synchronized files
+        :type min_size: int or None
+        :argument max_size: max size (in bytes) of synchronized files
+        :type max_size: int or None
+        :argument min_age: min age (in seconds) of synchronized files, i.e.
+        time since their modification
+        :type min_age: float or None
+        :argument max_age: max age (in seconds) of synchronized files
+        :type max_age: float or None
+
+        """
+        self.rules = []
+        for rule in rules or []:
+            include = rule.startswith(INCLUDE_PREFIX)
+            if include:
+                rule = rule[len(INCLUDE_PREFIX) :]
+
+            regex, dir_only = translate(rule)
+            self.rules.append((regex, dir_only, include))
+
+        # rules in the order of evaluation, i.e. the last matching one first
+        self.rules.reverse()
+
+        # without re-including rules, any match excludes - a single regular
+        # expression per path type is evaluated then
+        self._combined = None
+        if not any(include for _, _, include in self.rules):
+            self._combined = {
+                is_dir: combine(
+                    [
+                        regex
+                        for regex, dir_only, _ in self.rules
+                        if is_dir or not dir_only
+                    ]
+                )
+                for is_dir in (False, True)
+            }
+
+        self.ignore_file_types = frozenset(
+            f.lower().lstrip(".") for f in ignore_file_types or []
+        )
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.min_age = min_age
+        self.max_age = max_age
+
+    def _excludes(self, rel_path, is_dir):
+        """
+        Evaluate rules for a path.
+
+        :argument rel_path: path relative to the synchronized directory
+        :type rel_path: str
+        :argument is_dir: directory flag
+        :type is_dir: bool
+
+        :returns bool
+
+        """
+        if self._combined is not None:
+            regex = self._combined[is_dir]
+            return regex is not None and bool(regex.match(rel_path))
+
+        for regex, dir_only, include in self.rules:
+            if dir_only and not is_dir:
+                continue
+
+            if regex.match(rel_path):
+                return not include
+
+        return False
+
+    def excludes_dir(self, rel_dir):
+        """
+        Check whether a directory is excluded, i.e. to be pruned.
+
+        :argument rel_dir: dir path relative to the synchronized directory
+        :type rel_dir: str
+
+        :returns bool
+
+        """
+        return bool(self.rules) and self._excludes(rel_dir, True)
+
+    def excludes_file(self, name, rel_dir=os.curdir):
+        """
+        Check whether a file is excluded by its name, i.e. by rules and file
+        type (but not by its size or age).
+
+        :argument name: file name
+        :type name: str
+        :argument rel_dir: dir path relative to the synchronized directory
+        :type rel_dir: str
+
+        :returns bool
+
+        """
+        if self.ignore_file_types:
+            extension = os.path.splitext(name)[1][1:].lower()
+            if extension in self.ignore_file_types:
+                return True
+
+        if not self.rules:
+            return False
+
+        if rel_dir != os.curdir:
+            name = os.path.join(rel_dir, name)
+
+        return self._excludes(name, False)
+
+    def excludes_path(self, rel_path):
+        """
+        Check whether a file is excluded by its path, i.e. also by excluded
+        parent directories (which aren't walked otherwise).
+
+        :argument rel_path: file path relative to the synchronized directory
+        :type rel_path: str
+
+        :returns bool
+
+        """
+        rel_dir, name = os.path.split(rel_path)
+
+        if self.rules:
+            parent = ""
+            for part in rel_dir.split(os.sep) if rel_dir else []:
+                parent = os.path.join(parent, part)
+                if self._excludes(parent, True):
+                    return True
+
+        return self.excludes_file(name, rel_dir or os.curdir)
+
+    def excludes_stats(self, size, mtime):
+        """
+        Check whether a file is excluded by its size or age.
+
+        :argument size: file size
+        :type size: int
+        :argument mtime: file modification time
+        :type mtime: float
+
+        :returns bool
+
+        """
+        if self.min_size is not None and size < self.min_size:
+            return True
+        if self.max_size is not None and size > self.max_size:
+            return True
+
+        if self.min_age is None and self.max_age is None:
+            return False
+
+        age = time.time() - mtime
+        if self.min_age is not None and age < self.min_age:
+            return True
+        if self.max_age is not None and age > self.max_age:
+            return True
+
+        return False
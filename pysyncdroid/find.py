@@ -0,0 +1,47 @@
+"""Python wrapper for the find bash command"""
+
+
+import os
+
+from pysyncdroid.utils import iter_bash_cmd
+
+
+#: constants
+# entry type, size, modification time and path relative to the listed
+# directory (escapes are interpreted by `find`); NUL-terminated as file names
+# may contain newlines
+FIND_FORMAT = r"%y\t%s\t%T@\t%P\0"
+
+
+def scan_tree(top):
+    """
+    ls -lR
+
+    List a whole directory tree in a single streamed `find` process, i.e.
+    over the gvfs FUSE mount for a directory on the device (where reading
+    each directory is still an MTP round trip).
+
+    NOTE: symlinks aren't followed.
+
+    :argument top: directory path
+    :type top: str
+
+    :returns dict - relative dir path to a list of name, size, modification
+    time, directory and symlink flags tuples
+
+    """
+    tree = {os.curdir: []}
+
+    cmd = ["find", top, "-mindepth", "1", "-printf", FIND_FORMAT]
+    for record in iter_bash_cmd(cmd, separator="\0"):
+        type_, size, mtime, path = record.split("\t", 3)
+        rel_dir, name = os.path.split(path)
+        is_dir = type_ == "d"
+
+        tree.setdefault(rel_dir or os.curdir, []).append(
+            (name, int(size), float(mtime), is_dir, type_ == "l")
+        )
+        if is_dir:
+            tree.setdefault(path, [])
+
+    return tree
@@ -0,0 +1,181 @@
+"""In-process file operations over the gvfs FUSE mount"""
+
+
+import errno
+import os
+from stat import S_ISDIR
+
+
+# read/write buffer size used when the kernel can't copy the data for us;
+# MTP transfers are most efficient with large sequential chunks
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# errors meaning kernel-assisted copy is not supported for the given files
+KERNEL_COPY_UNSUPPORTED = (
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.EXDEV,
+    errno.EBADF,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+)
+
+
+def _kernel_copy(fsrc, fdst):
+    """
+    Copy file data with `sendfile`, i.e. without copying it to user space.
+
+    :argument fsrc: source file object
+    :type fsrc: file
+    :argument fdst: destination file object
+    :type fdst: file
+
+    :returns bool - False if kernel-assisted copy isn't supported
+
+    """
+    infd = fsrc.fileno()
+    outfd = fdst.fileno()
+    offset = 0
+
+    while True:
+        try:
+            sent = os.sendfile(outfd, infd, offset, COPY_BUFFER_SIZE)
+        except OSError as exc:
+            # nothing has been written yet, it's safe to use another method
+            if offset == 0 and exc.errno in KERNEL_COPY_UNSUPPORTED:
+                return False
+            raise
+
+        if sent == 0:
+            return True
+
+        offset += sent
+
+
+def _buffered_copy(fsrc, fdst):
+    """
+    Copy file data via a large, reused user space buffer.
+
+    :argument fsrc: source file object
+    :type fsrc: file
+    :argument fdst: destination file object
+    :type fdst: file
+
+    """
+    buf = bytearray(COPY_BUFFER_SIZE)
+    view = memoryview(buf)
+
+    while True:
+        read = fsrc.readinto(buf)
+        if not read:
+            break
+
+        fdst.write(view[:read])
+
+
+def cp(src, dst):
+    """
+    cp
+
+    Stream file data directly through the FUSE mount, i.e. without spawning
+    a `gvfs-copy` process for each file.
+
+    :argument src: source file to be copied
+    :type src: str
+    :argument dst: destination file/directory
+    :type dst: str
+
+    """
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        if not _kernel_copy(fsrc, fdst):
+            _buffered_copy(fsrc, fdst)
+
+
+def mkdir(path):
+    """
+    mkdir -p
+
+    :argument path: new directory path
+    :type path: str
+
+    """
+    os.makedirs(path, exist_ok=True)
+
+
+def mv(src, dst):
+    """
+    mv
+
+    NOTE: a rename, i.e. doesn't work across filesystems (or storages).
+
+    :argument src: source file to be moved
+    :type src: str
+    :argument dst: destination file
+    :type dst: str
+
+    """
+    os.rename(src, dst)
+
+
+def rm(src):
+    """
+    rm -f
+
+    :argument src: file to be removed
+    :type src: str
+
+    """
+    try:
+        os.remove(src)
+    except FileNotFoundError:
+        pass
+
+
+def stat(path):
+    """
+    stat
+
+    :argument path: file/directory path
+    :type path: str
+
+    :returns tuple - size, modification time and a directory flag
+
+    """
+    st = os.stat(path)
+    return st.st_size, st.st_mtime, S_ISDIR(st.st_mode)
+
+
+def scandir(path):
+    """
+    ls -l
+
+    :argument path: directory path
+    :type path: str
+
+    :returns list - name, size, modification time, directory and symlink
+    flags tuples
+
+    """
+    entries = []
+
+    for entry in os.scandir(path):
+        try:
+            st = entry.stat()
+        except FileNotFoundError:
+            # dangling symlink
+            st = entry.stat(follow_symlinks=False)
+
+        entries.append(
+            (
+                entry.name,
+                st.st_size,
+                st.st_mtime,
+                S_ISDIR(st.st_mode),
+                entry.is_symlink(),
+            )
+        )
+
+    return entries
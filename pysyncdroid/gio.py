@@ -0,0 +1,159 @@
+"""Python wrappers for gio bash commands"""
+
+
+import os
+from urllib.parse import unquote
+
+from pysyncdroid.exceptions import BashException
+from pysyncdroid.utils import run_bash_cmd, run_bash_cmd_async
+
+
+# upper limit for the summed length of arguments passed to a single `gio`
+# invocation; well below both ARG_MAX and MAX_ARG_STRLEN on Linux
+GIO_MAX_ARGS_LENGTH = 100000
+
+# prefix of error messages reported by `gio` for a particular file
+GIO_ERROR_PREFIX = "gio: "
+
+
+def cp(src, dst):
+    """
+    cp
+
+    :argument src: source file/directory to be copied
+    :type src: str
+    :argument dst: destination file/directory
+    :type dst: str
+
+    """
+    run_bash_cmd(["gio", "copy", src, dst])
+
+
+async def cp_async(src, dst):
+    """
+    cp, asyncio version
+
+    :argument src: source file/directory to be copied
+    :type src: str
+    :argument dst: destination file/directory
+    :type dst: str
+
+    """
+    await run_bash_cmd_async(["gio", "copy", src, dst])
+
+
+def mv(src, dst):
+    """
+    mv
+
+    :argument src: source file/directory to be moved
+    :type src: str
+    :argument dst: destination file/directory
+    :type dst: str
+
+    """
+    run_bash_cmd(["gio", "move", src, dst])
+
+
+def batch_args(args, fixed_length=0, max_length=GIO_MAX_ARGS_LENGTH):
+    """
+    Split arguments to batches with a bounded summed length.
+
+    NOTE: an argument longer than the limit still forms its own batch.
+
+    :argument args: arguments to split
+    :type args: list
+    :argument fixed_length: length of arguments shared by all batches
+    :type fixed_length: int
+    :argument max_length: max summed length of arguments in a batch
+    :type max_length: int
+
+    :returns generator
+
+    """
+    batch = []
+    batch_length = fixed_length
+
+    for arg in args:
+        # +1 for the terminating NUL byte
+        arg_length = len(os.fsencode(arg)) + 1
+
+        if batch and batch_length + arg_length > max_length:
+            yield batch
+            batch = []
+            batch_length = fixed_length
+
+        batch.append(arg)
+        batch_length += arg_length
+
+    if batch:
+        yield batch
+
+
+def parse_failed_files(err, srcs):
+    """
+    Map `gio` error output back to the files which failed.
+
+    `gio` reports errors as "gio: <file URI>: <error message>". If it's not
+    possible to tell which file an error line belongs to, all files are
+    considered failed.
+
+    :argument err: `gio` error output
+    :type err: str
+    :argument srcs: source files passed to `gio`
+    :type srcs: list
+
+    :returns dict - failed source file to error message
+
+    """
+    failed = {}
+    srcs_set = set(srcs)
+
+    for line in err.splitlines():
+        line = line.strip()
+        if not line.startswith(GIO_ERROR_PREFIX):
+            continue
+
+        uri, _, message = line[len(GIO_ERROR_PREFIX) :].partition(": ")
+        if uri.startswith("file://"):
+            path = unquote(uri[len("file://") :])
+        else:
+            path = uri
+
+        if path in srcs_set:
+            failed[path] = message
+
+    if err.strip() and not failed:
+        failed = {src: err.strip() for src in srcs}
+
+    return failed
+
+
+def cp_batch(srcs, dst_dir, max_length=GIO_MAX_ARGS_LENGTH):
+    """
+    cp SRC... DIR
+
+    Copy files to a directory with as few `gio copy` invocations as possible.
+
+    :argument srcs: source files to be copied
+    :type srcs: list
+    :argument dst_dir: destination directory
+    :type dst_dir: str
+    :argument max_length: max summed length of arguments in a single call
+    :type max_length: int
+
+    :returns dict - failed source file to error message
+
+    """
+    failed = {}
+    fixed_length = len(os.fsencode(dst_dir)) + len("gio copy ") + 1
+
+    for batch in batch_args(srcs, fixed_length, max_length):
+        try:
+            run_bash_cmd(["gio", "copy"] + batch + [dst_dir])
+        except BashException as exc:
+            # drop the 'Command "..." failed:' part, it contains all the paths
+            err = str(exc).split('" failed: ', 1)[-1]
+            failed.update(parse_failed_files(err, batch))
+
+    return failed
@@ -1,7 +1,8 @@
 """Python wrappers for gvfs-tools bash commands"""
 
 
-from pysyncdroid.utils import run_bash_cmd
+from pysyncdroid.gio import batch_args, GIO_MAX_ARGS_LENGTH
+from pysyncdroid.utils import run_bash_cmd, run_bash_cmd_async
 
 
 def cp(src, dst):
@@ -30,6 +31,24 @@ def mkdir(path):
     run_bash_cmd(["gvfs-mkdir", "-p", path])
 
 
+def mkdir_batch(paths, max_length=GIO_MAX_ARGS_LENGTH):
+    """
+    mkdir -p DIR...
+
+    Create directories with as few `gvfs-mkdir` invocations as possible.
+
+    :argument paths: new directories paths
+    :type paths: list
+    :argument max_length: max summed length of arguments in a single call
+    :type max_length: int
+
+    """
+    fixed_length = len("gvfs-mkdir -p ")
+
+    for batch in batch_args(paths, fixed_length, max_length):
+        run_bash_cmd(["gvfs-mkdir", "-p"] + batch)
+
+
 def mount(mtp_url):
     """
     mount
@@ -45,14 +64,15 @@ def mv(src, dst):
     """
     mv
 
-    :argument src: source file/directory to be copied
+    NOTE: a native move, i.e. a rename on the device if possible.
+
+    :argument src: source file/directory to be moved
     :type src: str
     :argument dst: destination file/directory
     :type dst: str
 
     """
-    cp(src, dst)
-    rm(src)
+    run_bash_cmd(["gvfs-move", src, dst])
 
 
 def rm(src):
@@ -66,3 +86,51 @@ def rm(src):
 
     """
     run_bash_cmd(["gvfs-rm", "-f", src])
+
+
+async def cp_async(src, dst):
+    """
+    cp, asyncio version
+
+    :argument src: source file/directory to be copied
+    :type src: str
+    :argument dst: destination file/directory
+    :type dst: str
+
+    """
+    await run_bash_cmd_async(["gvfs-copy", src, dst])
+
+
+async def mount_async(mtp_url):
+    """
+    mount, asyncio version
+
+    :argument mtp_url: device MTP URL
+    :type mtp_url: str
+
+    """
+    await run_bash_cmd_async(["gvfs-mount", mtp_url])
+
+
+async def mv_async(src, dst):
+    """
+    mv, asyncio version
+
+    :argument src: source file/directory to be moved
+    :type src: str
+    :argument dst: destination file/directory
+    :type dst: str
+
+    """
+    await run_bash_cmd_async(["gvfs-move", src, dst])
+
+
+async def rm_async(src):
+    """
+    rm -f, asyncio version
+
+    :argument src: file to be removed
+    :type src: str
+
+    """
+    await run_bash_cmd_async(["gvfs-rm", "-f", src])
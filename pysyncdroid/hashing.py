@@ -0,0 +1,150 @@
+"""File content hashing"""
+
+
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import os
+
+
+#: constants
+# fast and (unlike md5/sha1) still collision resistant
+HASH_ALGORITHM = "blake2b"
+
+HASH_BUFFER_SIZE = 1024 * 1024
+
+# number of bytes hashed at both ends of a file for its quick fingerprint
+FINGERPRINT_SIZE = 64 * 1024
+
+
+def hash_file(path):
+    """
+    Get file content hash.
+
+    :argument path: file path
+    :type path: str
+
+    :returns str
+
+    """
+    digest = hashlib.new(HASH_ALGORITHM)
+    buf = bytearray(HASH_BUFFER_SIZE)
+    view = memoryview(buf)
+
+    with open(path, "rb") as f:
+        while True:
+            read = f.readinto(buf)
+            if not read:
+                break
+
+            digest.update(view[:read])
+
+    return digest.hexdigest()
+
+
+def fingerprint(path):
+    """
+    Get file quick fingerprint, i.e. hash of its size and its first and last
+    `FINGERPRINT_SIZE` bytes.
+
+    :argument path: file path
+    :type path: str
+
+    :returns str
+
+    """
+    digest = hashlib.new(HASH_ALGORITHM)
+
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        digest.update(str(size).encode())
+        digest.update(f.read(FINGERPRINT_SIZE))
+
+        if size > FINGERPRINT_SIZE:
+            f.seek(max(FINGERPRINT_SIZE, size - FINGERPRINT_SIZE))
+            digest.update(f.read(FINGERPRINT_SIZE))
+
+    return digest.hexdigest()
+
+
+class Hasher(object):
+    def __init__(self, state=None, jobs=None):
+        """
+        Hash files in a process pool, i.e. in parallel with whatever submits
+        them.
+
+        Hashes are cached in the state store keyed by file device, inode, size
+        and modification time, so only touched files are re-hashed.
+
+        :argument state: store caching file hashes
+        :type state: StateStore or None
+        :argument jobs: max number of files hashed at the same time, number
+        of CPUs by default
+        :type jobs: int or None
+
+        """
+        self.state = state
+        self.jobs = jobs
+
+        self._executor = None
+        # file path to its hash
+        self._hashes = {}
+        # file path to its cache key and a future hash
+        self._pending = {}
+        # (dev, inode, size, mtime_ns, hash) tuples to be cached
+        self._computed = []
+
+    def submit(self, path):
+        """
+        Start hashing a file, unless its hash is cached.
+
+        :argument path: file path
+        :type path: str
+
+        """
+        st = os.stat(path)
+        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+        if self.state is not None:
+            hash_ = self.state.get_hash(*key)
+            if hash_ is not None:
+                self._hashes[path] = hash_
+                return
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.jobs)
+
+        self._pending[path] = (key, self._executor.submit(hash_file, path))
+
+    def result(self, path):
+        """
+        Get a submitted file hash, wait for it if necessary.
+
+        :argument path: file path
+        :type path: str
+
+        :returns str
+
+        """
+        if path not in self._hashes:
+            key, future = self._pending.pop(path)
+            self._hashes[path] = future.result()
+            self._computed.append(key + (self._hashes[path],))
+
+        return self._hashes[path]
+
+    def close(self):
+        """
+        Cache computed hashes and stop the process pool.
+        """
+        if self.state is not None and self._computed:
+            self.state.set_hashes(self._computed)
+
+        if self._executor is not None:
+            for _, future in self._pending.values():
+                future.cancel()
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+        self._hashes = {}
+        self._pending = {}
+        self._computed = []
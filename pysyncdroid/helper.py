@@ -0,0 +1,261 @@
+"""Long-lived helper process executing device operations over a pipe"""
+
+
+import json
+import subprocess
+import sys
+import threading
+
+from pysyncdroid import fuse
+from pysyncdroid.exceptions import BashException
+
+
+# operations the helper process can execute
+OPERATIONS = {
+    "cp": fuse.cp,
+    "mkdir": fuse.mkdir,
+    "mv": fuse.mv,
+    "rm": fuse.rm,
+    "scandir": fuse.scandir,
+    "stat": fuse.stat,
+}
+
+
+def execute(line):
+    """
+    Execute a request.
+
+    :argument line: JSON encoded request
+    :type line: str
+
+    :returns dict - response
+
+    """
+    try:
+        request = json.loads(line)
+        op = request["op"]
+        args = list(request.get("args", []))
+    except (ValueError, TypeError, KeyError, AttributeError):
+        op = None
+
+    if not isinstance(op, str):
+        return {"ok": False, "error": "Malformed request"}
+
+    func = OPERATIONS.get(op)
+    if func is None:
+        return {"ok": False, "error": 'Unknown operation "{op}"'.format(op=op)}
+
+    try:
+        return {"ok": True, "result": func(*args)}
+    except Exception as exc:
+        # mimic `run_bash_cmd` errors, see `Sync.gvfs_wrapper`
+        if isinstance(exc, OSError):
+            exc = exc.strerror or exc
+
+        return {
+            "ok": False,
+            "error": 'Operation "{op}" failed: {err}'.format(
+                op=" ".join(str(a) for a in [op] + args), err=exc
+            ),
+        }
+
+
+def serve(stdin, stdout):
+    """
+    Execute requests until stdin is closed.
+
+    Each request and response is a JSON object on a single line, e.g.
+        request: {"op": "cp", "args": ["/src/song.mp3", "/dst/song.mp3"]}
+        response: {"ok": true, "result": null}
+        response: {"ok": false, "error": "... failed: Permission denied"}
+
+    Failed (and malformed) requests are reported, the helper keeps serving.
+
+    :argument stdin: requests stream
+    :type stdin: file
+    :argument stdout: responses stream
+    :type stdout: file
+
+    """
+    for line in stdin:
+        if not line.strip():
+            continue
+
+        stdout.write(json.dumps(execute(line)) + "\n")
+        stdout.flush()
+
+
+class Helper(object):
+    def __init__(self, cmd=None):
+        """
+        Client for a helper process executing device operations (copy,
+        mkdir, rm, scandir and stat) requested over its stdin/stdout.
+
+        The process is started on the first request and restarted if it
+        dies. The request which was being executed is retried once - all
+        operations are idempotent.
+
+        :argument cmd: command starting the helper process
+        :type cmd: list or None
+
+        """
+        if cmd is None:
+            cmd = [sys.executable, "-m", "pysyncdroid.helper"]
+        self.cmd = cmd
+
+        self._process = None
+        # one request at a time, responses aren't tagged
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the helper process.
+        """
+        self._process = subprocess.Popen(
+            self.cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+            bufsize=1,
+        )
+
+    def close(self):
+        """
+        Stop the helper process.
+        """
+        if self._process is None:
+            return
+
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+
+        self._process.wait()
+        self._process = None
+
+    def _request(self, line):
+        """
+        Send a request to the helper process and read its response.
+
+        :argument line: JSON encoded request
+        :type line: str
+
+        :returns str - JSON encoded response, empty if the helper died
+
+        """
+        if self._process is None or self._process.poll() is not None:
+            self.close()
+            self.start()
+
+        try:
+            self._process.stdin.write(line + "\n")
+            self._process.stdin.flush()
+            return self._process.stdout.readline()
+        except (BrokenPipeError, ValueError):
+            return ""
+
+    def call(self, op, *args):
+        """
+        Execute an operation in the helper process.
+
+        :argument op: operation name
+        :type op: str
+        :argument *args: operation's arguments
+        :type *args:
+
+        :returns operation result
+
+        """
+        line = json.dumps({"op": op, "args": args})
+
+        with self._lock:
+            response = self._request(line)
+            if not response:
+                # the helper died, give it another chance
+                self.close()
+                response = self._request(line)
+
+        if not response:
+            raise BashException(
+                'Helper process died while executing "{op}"'.format(op=op)
+            )
+
+        response = json.loads(response)
+        if not response["ok"]:
+            raise BashException(response["error"])
+
+        return response["result"]
+
+    def cp(self, src, dst):
+        """
+        cp
+
+        :argument src: source file to be copied
+        :type src: str
+        :argument dst: destination file/directory
+        :type dst: str
+
+        """
+        self.call("cp", src, dst)
+
+    def mkdir(self, path):
+        """
+        mkdir -p
+
+        :argument path: new directory path
+        :type path: str
+
+        """
+        self.call("mkdir", path)
+
+    def mv(self, src, dst):
+        """
+        mv
+
+        :argument src: source file to be moved
+        :type src: str
+        :argument dst: destination file
+        :type dst: str
+
+        """
+        self.call("mv", src, dst)
+
+    def rm(self, src):
+        """
+        rm -f
+
+        :argument src: file to be removed
+        :type src: str
+
+        """
+        self.call("rm", src)
+
+    def scandir(self, path):
+        """
+        ls -l
+
+        :argument path: directory path
+        :type path: str
+
+        :returns list - name, size, modification time, directory and symlink
+        flags tuples
+
+        """
+        return [tuple(entry) for entry in self.call("scandir", path)]
+
+    def stat(self, path):
+        """
+        stat
+
+        :argument path: file/directory path
+        :type path: str
+
+        :returns tuple - size, modification time and a directory flag
+
+        """
+        return tuple(self.call("stat", path))
+
+
+if __name__ == "__main__":
+    serve(sys.stdin, sys.stdout)
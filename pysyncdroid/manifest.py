@@ -0,0 +1,136 @@
+"""Manifest of synchronized files kept in the destination directory"""
+
+
+import json
+import random
+
+
+#: constants
+# manifest file name, in the destination directory root
+MANIFEST_NAME = ".pysyncdroid-manifest.json"
+MANIFEST_VERSION = 1
+
+# number of directories listed to check the manifest is up to date
+SPOT_CHECKS = 3
+
+
+class Manifest(object):
+    def __init__(self, dirs=None):
+        """
+        Files present in a destination directory tree (as left by the last
+        sync), i.e. its listing without listing it.
+
+        Files are recorded by a directory path relative to the destination
+        directory and a file name.
+
+        :argument dirs: relative dir path to a dict of file name to a
+        (size, mtime) tuple
+        :type dirs: dict or None
+
+        """
+        self.dirs = dirs or {}
+
+    @classmethod
+    def loads(cls, data):
+        """
+        Load a serialized manifest.
+
+        :argument data: serialized manifest
+        :type data: str
+
+        :returns Manifest
+
+        :raises ValueError - not a manifest (of a known version)
+
+        """
+        manifest = json.loads(data)
+
+        if (
+            not isinstance(manifest, dict)
+            or manifest.get("version") != MANIFEST_VERSION
+        ):
+            raise ValueError("Unknown manifest format")
+
+        return cls(
+            {
+                rel_dir: {
+                    name: (size, mtime)
+                    for name, (size, mtime) in files.items()
+                }
+                for rel_dir, files in manifest["dirs"].items()
+            }
+        )
+
+    def dumps(self):
+        """
+        Serialize the manifest.
+
+        :returns str
+
+        """
+        return json.dumps(
+            {"version": MANIFEST_VERSION, "dirs": self.dirs}, sort_keys=True
+        )
+
+    def get_dir(self, rel_dir):
+        """
+        Get files recorded for a directory.
+
+        :argument rel_dir: relative dir path
+        :type rel_dir: str
+
+        :returns dict or None - file name to a (size, mtime) tuple
+
+        """
+        return self.dirs.get(rel_dir)
+
+    def set_dir(self, rel_dir, files):
+        """
+        Record files of a directory.
+
+        :argument rel_dir: relative dir path
+        :type rel_dir: str
+        :argument files: file name to a (size, mtime) tuple
+        :type files: dict
+
+        """
+        self.dirs[rel_dir] = files
+
+    def is_stale(self, scan, excludes=None):
+        """
+        Spot-check the manifest, i.e. compare files (names and sizes) of up
+        to `SPOT_CHECKS` random directories with their actual listing.
+
+        :argument scan: function listing a relative dir path, see
+        `Transport.scan`
+        :type scan: function
+        :argument excludes: function checking whether a file (given by its
+        name and relative dir path) isn't synchronized, i.e. recorded
+        :type excludes: function or None
+
+        :returns bool
+
+        """
+        rel_dirs = sorted(self.dirs)
+        if len(rel_dirs) > SPOT_CHECKS:
+            rel_dirs = random.sample(rel_dirs, SPOT_CHECKS)
+
+        for rel_dir in rel_dirs:
+            entries = scan(rel_dir)
+            if entries is None:
+                return True
+
+            files = {
+                e.name: e.size
+                for e in entries
+                if not e.is_dir
+                and e.name != MANIFEST_NAME
+                and not (excludes is not None and excludes(e.name, rel_dir))
+            }
+            recorded = {
+                name: size for name, (size, _) in self.dirs[rel_dir].items()
+            }
+            if files != recorded:
+                return True
+
+        return False
@@ -0,0 +1,531 @@
+"""Per-directory synchronization plan"""
+
+
+import datetime
+import json
+import os
+import sqlite3
+import tempfile
+
+
+#: constants
+# actions
+COPY = "copy"
+SKIP = "skip"
+REMOVE = "remove"
+PULL = "pull"
+MOVE = "move"
+# two-way sync only
+REMOVE_SOURCE = "remove-source"
+CONFLICT = "conflict"
+
+# saved plan records, see `write_plan_header`
+PLAN_FILE_VERSION = 2
+DIR_RECORD = "dir"
+
+# size units of a plan summary
+SIZE_UNITS = ("B", "KiB", "MiB", "GiB", "TiB")
+
+# sides of a directory stored in the plan store
+SOURCE_SIDE = 0
+DESTINATION_SIDE = 1
+RECORDED_SIDE = 2
+
+
+SCHEMA = """
+CREATE TABLE dirs (
+    id INTEGER PRIMARY KEY,
+    rel_dir TEXT NOT NULL
+);
+CREATE TABLE files (
+    dir_id INTEGER NOT NULL,
+    side INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    hash TEXT
+);
+CREATE INDEX files_dir_id ON files (dir_id);
+"""
+
+
+class Action(object):
+    __slots__ = ("kind", "name", "src_file", "dst_file")
+
+    def __init__(self, kind, name, src_file, dst_file):
+        """
+        Action on a file present in the source, the destination or both.
+
+        Files are copied from `src_file` to `dst_file`, pulled the other way
+        around and removed from the destination.
+
+        :argument kind: action, one of COPY, SKIP, REMOVE and PULL
+        :type kind: str
+        :argument name: file path relative to the synchronized directory
+        :type name: str
+        :argument src_file: source file absolute path
+        :type src_file: str
+        :argument dst_file: destination file absolute path
+        :type dst_file: str
+
+        """
+        self.kind = kind
+        self.name = name
+        self.src_file = src_file
+        self.dst_file = dst_file
+
+
+class DirPlan(object):
+    __slots__ = ("src_dir", "dst_dir", "actions")
+
+    def __init__(self, src_dir, dst_dir):
+        """
+        Actions synchronizing a source directory to its destination.
+
+        :argument src_dir: source directory absolute path
+        :type src_dir: str
+        :argument dst_dir: destination directory absolute path
+        :type dst_dir: str
+
+        """
+        self.src_dir = src_dir
+        self.dst_dir = dst_dir
+        self.actions = []
+
+    def add(self, kind, name):
+        """
+        Plan an action.
+
+        :argument kind: action, one of COPY, SKIP, REMOVE and PULL
+        :type kind: str
+        :argument name: file path relative to the synchronized directory
+        :type name: str
+
+        """
+        self.actions.append(
+            Action(
+                kind,
+                name,
+                os.path.join(self.src_dir, name),
+                os.path.join(self.dst_dir, name),
+            )
+        )
+
+    def get(self, kind):
+        """
+        Get planned actions of a kind, in the planned order.
+
+        :argument kind: action, one of COPY, SKIP, REMOVE and PULL
+        :type kind: str
+
+        :returns list of Action
+
+        """
+        return [action for action in self.actions if action.kind == kind]
+
+
+def diff(src_names, dst_names):
+    """
+    Match source and destination file names (a hash join, i.e. in linear
+    time).
+
+    :argument src_names: source file names
+    :type src_names: list
+    :argument dst_names: destination file names
+    :type dst_names: list
+
+    :returns generator - (name, in source flag, in destination flag) tuples,
+    source names first (in the given order), then names present only in the
+    destination
+
+    """
+    dst_names_set = set(dst_names)
+    src_names_set = set()
+
+    for name in src_names:
+        src_names_set.add(name)
+        yield name, True, name in dst_names_set
+
+    for name in dst_names:
+        if name not in src_names_set:
+            yield name, False, True
+
+
+def format_size(size):
+    """
+    Format a number of bytes in binary units.
+
+    :argument size: number of bytes
+    :type size: int
+
+    :returns str
+
+    """
+    for unit in SIZE_UNITS[:-1]:
+        if size < 1024:
+            break
+        size /= 1024.0
+    else:
+        unit = SIZE_UNITS[-1]
+
+    if unit == SIZE_UNITS[0]:
+        return "{s} {u}".format(s=size, u=unit)
+
+    return "{s:.1f} {u}".format(s=size, u=unit)
+
+
+def write_plan_header(f, device, mapping):
+    """
+    Start a mapping section of a saved plan.
+
+    A saved plan is a JSON lines file. Each mapping section starts with a
+    header object, followed by records (arrays):
+        ["dir", relative dir path, create flag]
+        ["copy", file name, size, mtime, destination size, destination mtime]
+        ["remove" | "pull", file name, size, mtime]
+        ["move", relative path, new relative path]
+    Files are recorded by name within the preceding "dir" record, with the
+    size and modification time they were planned with (of the source file
+    for copies, of the destination file otherwise); copies also with the
+    ones of the overwritten destination file (null if there's none); moves
+    by destination relative paths.
+
+    :argument f: plan file object
+    :type f: file
+    :argument device: device identity
+    :type device: str
+    :argument mapping: source to destination mapping identity
+    :type mapping: str
+
+    """
+    f.write(
+        json.dumps(
+            {
+                "version": PLAN_FILE_VERSION,
+                "device": device,
+                "mapping": mapping,
+            }
+        )
+        + "\n"
+    )
+
+
+def write_plan_record(f, record):
+    """
+    Write a saved plan record, see `write_plan_header`.
+
+    :argument f: plan file object
+    :type f: file
+    :argument record: plan record
+    :type record: list
+
+    """
+    f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+
+def load_plans(f):
+    """
+    Load a saved plan, see `write_plan_header`.
+
+    :argument f: plan file object
+    :type f: file
+
+    :returns dict - (device, mapping) tuple to a list of records
+
+    :raises ValueError - not a plan (of a known version)
+
+    """
+    plans = {}
+    records = None
+
+    for line in f:
+        if not line.strip():
+            continue
+
+        entry = json.loads(line)
+        if isinstance(entry, dict):
+            if entry.get("version") != PLAN_FILE_VERSION:
+                raise ValueError("Unknown plan format")
+
+            records = plans.setdefault((entry["device"], entry["mapping"]), [])
+        elif isinstance(entry, list) and records is not None:
+            records.append(entry)
+        else:
+            raise ValueError("Unknown plan format")
+
+    return plans
+
+
+class PlanSummary(object):
+    def __init__(self, source, destination):
+        """
+        Totals of actions planned for a mapping, i.e. what a sync would do.
+
+        :argument source: sync source directory
+        :type source: str
+        :argument destination: sync destination directory
+        :type destination: str
+
+        """
+        self.source = source
+        self.destination = destination
+
+        # action to a [files, bytes] list
+        self.totals = {kind: [0, 0] for kind in (COPY, REMOVE, PULL)}
+        self.moves = 0
+        self.dirs = 0
+        # estimated duration, None if unknown
+        self.seconds = None
+
+    def add(self, kind, size):
+        """
+        Count a planned action.
+
+        :argument kind: action, one of COPY, REMOVE and PULL
+        :type kind: str
+        :argument size: file size
+        :type size: int
+
+        """
+        totals = self.totals[kind]
+        totals[0] += 1
+        totals[1] += size
+
+    def format(self):
+        """
+        Format the summary as a report.
+
+        :returns str
+
+        """
+        lines = ["{s} ==> {d}".format(s=self.source, d=self.destination)]
+
+        for kind in (COPY, REMOVE, PULL):
+            files, size = self.totals[kind]
+            lines.append(
+                "  {k}: {f} files, {s}".format(
+                    k=kind, f=files, s=format_size(size)
+                )
+            )
+
+        if self.moves:
+            lines.append("  move: {m} files".format(m=self.moves))
+        lines.append("  create: {d} directories".format(d=self.dirs))
+
+        if self.seconds is None:
+            duration = "unknown (no operations measured for the device yet)"
+        else:
+            duration = str(datetime.timedelta(seconds=round(self.seconds)))
+        lines.append("  estimated duration: {d}".format(d=duration))
+
+        return "\n".join(lines)
+
+
+def is_changed(stats, base_stats, mtime_tolerance):
+    """
+    Check whether a file changed since the last sync.
+
+    :argument stats: (size, mtime) tuple, None if the file is missing
+    :type stats: tuple or None
+    :argument base_stats: (size, mtime) tuple as of the last sync
+    :type base_stats: tuple
+    :argument mtime_tolerance: max difference of modification times (in
+    seconds) considered equal
+    :type mtime_tolerance: float
+
+    :returns bool
+
+    """
+    if stats is None or stats[0] != base_stats[0]:
+        return True
+
+    return abs(stats[1] - base_stats[1]) > mtime_tolerance
+
+
+def merge(src_stats, dst_stats, base, mtime_tolerance):
+    """
+    Three-way merge of a file present in the source, the destination or
+    both, against the baseline - the file on both sides as of the last sync.
+
+    A side which changed since the last sync wins; changes on both sides are
+    a conflict. A file missing on one side was removed there if it was
+    synchronized before, and is new on the other side otherwise.
+
+    :argument src_stats: source (size, mtime) tuple, None if missing
+    :type src_stats: tuple or None
+    :argument dst_stats: destination (size, mtime) tuple, None if missing
+    :type dst_stats: tuple or None
+    :argument base: (source size, source mtime, destination size,
+    destination mtime) tuple, None if the file wasn't synchronized before
+    :type base: tuple or None
+    :argument mtime_tolerance: max difference of modification times (in
+    seconds) considered equal
+    :type mtime_tolerance: float
+
+    :returns str - action, one of COPY, PULL, REMOVE, REMOVE_SOURCE, SKIP
+    and CONFLICT
+
+    """
+    if base is None:
+        if dst_stats is None:
+            return COPY
+        if src_stats is None:
+            return PULL
+
+        # present on both sides, modification times of copies may differ
+        return SKIP if src_stats[0] == dst_stats[0] else CONFLICT
+
+    src_changed = is_changed(src_stats, base[:2], mtime_tolerance)
+    dst_changed = is_changed(dst_stats, base[2:], mtime_tolerance)
+
+    if src_changed and dst_changed:
+        return CONFLICT
+
+    if src_changed:
+        return REMOVE if src_stats is None else COPY
+
+    if dst_changed:
+        return REMOVE_SOURCE if dst_stats is None else PULL
+
+    return SKIP
+
+
+class PlanStore(object):
+    def __init__(self, source, destination, template, path=None):
+        """
+        On-disk store of sync data dictionaries, i.e. of the directories to
+        be synchronized, for trees too big to be kept in memory.
+
+        Directory paths are interned in a directory table (relative to the
+        source and destination), files are stored by name. Sync data are
+        rebuilt one directory at a time while iterating over the store.
+
+        :argument source: sync source directory
+        :type source: str
+        :argument destination: sync destination directory
+        :type destination: str
+        :argument template: function creating an empty sync data dictionary
+        for a source and a destination subdir
+        :type template: function
+        :argument path: database file path, a temporary file (removed when
+        closed) by default
+        :type path: str or None
+
+        """
+        self.source = source
+        self.destination = destination
+        self.template = template
+
+        self._temporary = path is None
+        if self._temporary:
+            fd, path = tempfile.mkstemp(prefix="pysyncdroid-", suffix=".db")
+            os.close(fd)
+        self.path = path
+
+        # consumed in another thread than filled, one at a time
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # a scratch database, no need to survive a crash
+        self._conn.execute("PRAGMA journal_mode = OFF")
+        self._conn.execute("PRAGMA synchronous = OFF")
+        self._conn.executescript(SCHEMA)
+
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def close(self):
+        """
+        Close the database, remove it if temporary.
+        """
+        self._conn.close()
+
+        if self._temporary:
+            os.remove(self.path)
+
+    def put(self, sync_data):
+        """
+        Store sync data of a directory.
+
+        :argument sync_data: sync data dictionary
+        :type sync_data: dict
+
+        """
+        rel_dir = sync_data["src_dir_abs"][len(self.source) :].lstrip(os.sep)
+        dir_id = self._conn.execute(
+            "INSERT INTO dirs (rel_dir) VALUES (?)", (rel_dir,)
+        ).lastrowid
+
+        rows = []
+        for side, files, stats in (
+            (
+                SOURCE_SIDE,
+                sync_data["src_dir_fls"],
+                sync_data["src_dir_stats"],
+            ),
+            (
+                DESTINATION_SIDE,
+                sync_data["dst_dir_fls"],
+                sync_data["dst_dir_stats"],
+            ),
+        ):
+            for path in files:
+                size, mtime = stats.get(path, (None, None))
+                hash_ = sync_data["src_dir_hashes"].get(path)
+                rows.append(
+                    (dir_id, side, os.path.basename(path), size, mtime, hash_)
+                )
+
+        for name, (size, mtime, hash_) in sync_data[
+            "recorded_dir_fls"
+        ].items():
+            rows.append((dir_id, RECORDED_SIDE, name, size, mtime, hash_))
+
+        self._conn.executemany(
+            "INSERT INTO files (dir_id, side, name, size, mtime, hash) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        self._len += 1
+
+    def __iter__(self):
+        """
+        Rebuild stored sync data, in the stored order.
+
+        :returns generator - sync data dictionaries
+
+        """
+        self._conn.commit()
+
+        dirs = self._conn.execute("SELECT id, rel_dir FROM dirs ORDER BY id")
+        for dir_id, rel_dir in dirs:
+            sync_data = self.template(
+                os.path.join(self.source, rel_dir),
+                os.path.join(self.destination, rel_dir),
+            )
+
+            rows = self._conn.execute(
+                "SELECT side, name, size, mtime, hash FROM files "
+                "WHERE dir_id = ? ORDER BY rowid",
+                (dir_id,),
+            )
+            for side, name, size, mtime, hash_ in rows:
+                if side == RECORDED_SIDE:
+                    sync_data["recorded_dir_fls"][name] = (size, mtime, hash_)
+                    continue
+
+                if side == SOURCE_SIDE:
+                    path = os.path.join(sync_data["src_dir_abs"], name)
+                    sync_data["src_dir_fls"].append(path)
+                    stats = sync_data["src_dir_stats"]
+                    if hash_ is not None:
+                        sync_data["src_dir_hashes"][path] = hash_
+                else:
+                    path = os.path.join(sync_data["dst_dir_abs"], name)
+                    sync_data["dst_dir_fls"].append(path)
+                    stats = sync_data["dst_dir_stats"]
+
+                if size is not None:
+                    stats[path] = (size, mtime)
+
+            yield sync_data
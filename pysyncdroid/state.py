@@ -0,0 +1,363 @@
+"""Persistent sync state, i.e. what was synchronized last time"""
+
+
+import json
+import os
+import sqlite3
+import threading
+
+
+#: default state database location
+STATE_DB_PATH = os.path.join(
+    os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share"),
+    "pysyncdroid",
+    "state.db",
+)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    device TEXT NOT NULL,
+    mapping TEXT NOT NULL,
+    rel_dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    hash TEXT,
+    PRIMARY KEY (device, mapping, rel_dir, name)
+);
+CREATE TABLE IF NOT EXISTS hashes (
+    dev INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (dev, inode)
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    device TEXT NOT NULL,
+    mapping TEXT NOT NULL,
+    rel_dir TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    dirs TEXT NOT NULL,
+    files TEXT NOT NULL,
+    PRIMARY KEY (device, mapping, rel_dir)
+);
+CREATE TABLE IF NOT EXISTS baseline (
+    device TEXT NOT NULL,
+    mapping TEXT NOT NULL,
+    rel_dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    src_size INTEGER NOT NULL,
+    src_mtime REAL NOT NULL,
+    dst_size INTEGER NOT NULL,
+    dst_mtime REAL NOT NULL,
+    PRIMARY KEY (device, mapping, rel_dir, name)
+);
+CREATE TABLE IF NOT EXISTS costs (
+    device TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    count_sq REAL NOT NULL,
+    count_size REAL NOT NULL,
+    size_sq REAL NOT NULL,
+    count_seconds REAL NOT NULL,
+    size_seconds REAL NOT NULL,
+    PRIMARY KEY (device, operation)
+);
+"""
+
+
+class StateStore(object):
+    def __init__(self, path=STATE_DB_PATH):
+        """
+        SQLite store of synchronized files keyed by device identity and
+        source to destination mapping.
+
+        Files are recorded by their path relative to the mapping source, i.e.
+        by a relative directory path and a file name.
+
+        :argument path: database file path
+        :type path: str
+
+        """
+        self.path = path
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        """
+        Close the database.
+        """
+        with self._lock:
+            self._conn.close()
+
+    def get_files(self, device, mapping):
+        """
+        Get files recorded for a mapping.
+
+        :argument device: device identity
+        :type device: str
+        :argument mapping: source to destination mapping identity
+        :type mapping: str
+
+        :returns dict - relative dir path to a dict of file name to a
+        (size, mtime, hash) tuple
+
+        """
+        files = {}
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rel_dir, name, size, mtime, hash FROM files "
+                "WHERE device = ? AND mapping = ?",
+                (device, mapping),
+            ).fetchall()
+
+        for rel_dir, name, size, mtime, hash_ in rows:
+            files.setdefault(rel_dir, {})[name] = (size, mtime, hash_)
+
+        return files
+
+    def set_files(self, device, mapping, files):
+        """
+        Record files of given directories, i.e. replace what was recorded for
+        these directories before.
+
+        :argument device: device identity
+        :type device: str
+        :argument mapping: source to destination mapping identity
+        :type mapping: str
+        :argument files: relative dir path to a dict of file name to a
+        (size, mtime, hash) tuple
+        :type files: dict
+
+        """
+        with self._lock, self._conn:
+            for rel_dir, dir_files in files.items():
+                self._conn.execute(
+                    "DELETE FROM files "
+                    "WHERE device = ? AND mapping = ? AND rel_dir = ?",
+                    (device, mapping, rel_dir),
+                )
+                self._conn.executemany(
+                    "INSERT INTO files "
+                    "(device, mapping, rel_dir, name, size, mtime, hash) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        (device, mapping, rel_dir, name, size, mtime, hash_)
+                        for name, (size, mtime, hash_) in dir_files.items()
+                    ),
+                )
+
+    def get_dirs(self, device, mapping):
+        """
+        Get source directories recorded for a mapping.
+
+        :argument device: device identity
+        :type device: str
+        :argument mapping: source to destination mapping identity
+        :type mapping: str
+
+        :returns dict - relative dir path to a (mtime, subdirs, files) tuple
+
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rel_dir, mtime, dirs, files FROM dirs "
+                "WHERE device = ? AND mapping = ?",
+                (device, mapping),
+            ).fetchall()
+
+        return {
+            rel_dir: (mtime, json.loads(dirs), json.loads(files))
+            for rel_dir, mtime, dirs, files in rows
+        }
+
+    def set_dirs(self, device, mapping, dirs):
+        """
+        Record source directories of a mapping, i.e. replace all directories
+        recorded for the mapping before.
+
+        :argument device: device identity
+        :type device: str
+        :argument mapping: source to destination mapping identity
+        :type mapping: str
+        :argument dirs: relative dir path to a (mtime, subdirs, files) tuple
+        :type dirs: dict
+
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM dirs WHERE device = ? AND mapping = ?",
+                (device, mapping),
+            )
+            self._conn.executemany(
+                "INSERT INTO dirs (device, mapping, rel_dir, mtime, dirs, "
+                "files) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        device,
+                        mapping,
+                        rel_dir,
+                        mtime,
+                        json.dumps(subdirs),
+                        json.dumps(files),
+                    )
+                    for rel_dir, (mtime, subdirs, files) in dirs.items()
+                ),
+            )
+
+    def get_baseline(self, device, mapping):
+        """
+        Get files on both sides of a mapping as of the last two-way sync.
+
+        :argument device: device identity
+        :type device: str
+        :argument mapping: source to destination mapping identity
+        :type mapping: str
+
+        :returns dict - relative dir path to a dict of file name to a
+        (source size, source mtime, destination size, destination mtime)
+        tuple
+
+        """
+        files = {}
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rel_dir, name, src_size, src_mtime, dst_size, "
+                "dst_mtime FROM baseline WHERE device = ? AND mapping = ?",
+                (device, mapping),
+            ).fetchall()
+
+        for rel_dir, name, src_size, src_mtime, dst_size, dst_mtime in rows:
+            files.setdefault(rel_dir, {})[name] = (
+                src_size,
+                src_mtime,
+                dst_size,
+                dst_mtime,
+            )
+
+        return files
+
+    def set_baseline(self, device, mapping, files):
+        """
+        Record files on both sides of a mapping, i.e. replace the whole
+        baseline recorded for the mapping before.
+
+        :argument device: device identity
+        :type device: str
+        :argument mapping: source to destination mapping identity
+        :type mapping: str
+        :argument files: relative dir path to a dict of file name to a
+        (source size, source mtime, destination size, destination mtime)
+        tuple
+        :type files: dict
+
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM baseline WHERE device = ? AND mapping = ?",
+                (device, mapping),
+            )
+            self._conn.executemany(
+                "INSERT INTO baseline (device, mapping, rel_dir, name, "
+                "src_size, src_mtime, dst_size, dst_mtime) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (device, mapping, rel_dir, name) + tuple(base)
+                    for rel_dir, dir_files in files.items()
+                    for name, base in dir_files.items()
+                ),
+            )
+
+    def get_hash(self, dev, inode, size, mtime_ns):
+        """
+        Get cached file content hash.
+
+        :argument dev: file device number
+        :type dev: int
+        :argument inode: file inode number
+        :type inode: int
+        :argument size: file size
+        :type size: int
+        :argument mtime_ns: file modification time in nanoseconds
+        :type mtime_ns: int
+
+        :returns str or None - None if the file isn't cached or was modified
+
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT hash FROM hashes WHERE dev = ? AND inode = ? "
+                "AND size = ? AND mtime_ns = ?",
+                (dev, inode, size, mtime_ns),
+            ).fetchone()
+
+        return row[0] if row is not None else None
+
+    def set_hashes(self, hashes):
+        """
+        Cache file content hashes.
+
+        :argument hashes: (dev, inode, size, mtime_ns, hash) tuples
+        :type hashes: list
+
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO hashes "
+                "(dev, inode, size, mtime_ns, hash) VALUES (?, ?, ?, ?, ?)",
+                hashes,
+            )
+
+    def get_costs(self, device):
+        """
+        Get operation costs measured against a device.
+
+        :argument device: device identity
+        :type device: str
+
+        :returns dict - operation to a list of sums, see `Costs`
+
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT operation, count_sq, count_size, size_sq, "
+                "count_seconds, size_seconds FROM costs WHERE device = ?",
+                (device,),
+            ).fetchall()
+
+        return {row[0]: list(row[1:]) for row in rows}
+
+    def add_costs(self, device, sums):
+        """
+        Add operation costs measured against a device to the recorded ones.
+
+        :argument device: device identity
+        :type device: str
+        :argument sums: operation to a list of sums, see `Costs`
+        :type sums: dict
+
+        """
+        with self._lock, self._conn:
+            for operation, op_sums in sums.items():
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO costs VALUES (?, ?, 0, 0, 0, 0, 0)",
+                    (device, operation),
+                )
+                self._conn.execute(
+                    "UPDATE costs SET count_sq = count_sq + ?, "
+                    "count_size = count_size + ?, size_sq = size_sq + ?, "
+                    "count_seconds = count_seconds + ?, "
+                    "size_seconds = size_seconds + ? "
+                    "WHERE device = ? AND operation = ?",
+                    list(op_sums) + [device, operation],
+                )
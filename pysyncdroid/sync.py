@@ -4,11 +4,29 @@
 """Main synchronization functionality."""
 
 
+import asyncio
+from collections import deque
+from contextlib import closing
 import os
+import stat
+import tempfile
+import threading
+import time
 
 from pysyncdroid import exceptions
-from pysyncdroid import gvfs
-from pysyncdroid.utils import run_bash_cmd
+from pysyncdroid import plan
+from pysyncdroid.costs import Costs, COPY_OP, MKDIR_OP, MOVE_OP, REMOVE_OP
+from pysyncdroid.filters import Filter
+from pysyncdroid.hashing import Hasher
+from pysyncdroid.manifest import Manifest, MANIFEST_NAME
+from pysyncdroid.transport import FileInfo, get_transport, GVFS
+from pysyncdroid.utils import (
+    JobPool,
+    iter_in_thread,
+    leaf_paths,
+    run_bash_cmd,
+    walk_tree,
+)
 
 
 #: constants
@@ -17,6 +35,24 @@ IGNORE = "ignore"
 REMOVE = "remove"
 SYNCHRONIZE = "synchronize"
 
+# planned action for each unmatched files action
+UNMATCHED_ACTIONS = {
+    IGNORE: plan.SKIP,
+    REMOVE: plan.REMOVE,
+    SYNCHRONIZE: plan.PULL,
+}
+
+# default max difference (in seconds) of modification times considered equal;
+# MTP (and FAT on memory cards) timestamps are coarse
+MTIME_TOLERANCE = 2.0
+
+# max number of device directories listed at the same time; listing a source
+# on the device is dominated by the MTP round trip latency
+WALK_JOBS = 8
+
+# max number of directories scanned ahead of the one being synchronized
+SCAN_QUEUE_SIZE = 16
+
 
 def readlink(path):
     """
@@ -51,6 +87,26 @@ class Sync(object):
         overwrite_existing=False,
         ignore_file_types=None,
         verbose=False,
+        backend=GVFS,
+        jobs=1,
+        update=False,
+        mtime_tolerance=MTIME_TOLERANCE,
+        state=None,
+        device=None,
+        trust_state=False,
+        checksum=False,
+        incremental=False,
+        detect_moves=False,
+        spill_plan=False,
+        manifest=False,
+        bulk_list=False,
+        filter_rules=None,
+        min_size=None,
+        max_size=None,
+        min_age=None,
+        max_age=None,
+        two_way=False,
+        costs_store=None,
     ):
         """
         Class for synchronizing directories between a computer and an Android
@@ -70,6 +126,67 @@ class Sync(object):
         :type ignore_file_types: list ot None
         :argument verbose: flag to display what is going on
         :type verbose: bool
+        :argument backend: transport name or instance
+        :type backend: str or Transport
+        :argument jobs: max number of files copied at the same time
+        :type jobs: int
+        :argument update: flag to overwrite existing files only if they differ
+        in size or the source file is newer
+        :type update: bool
+        :argument mtime_tolerance: max difference of modification times (in
+        seconds) considered equal
+        :type mtime_tolerance: float
+        :argument state: store of files synchronized last time, updated after
+        each successful sync
+        :type state: StateStore or None
+        :argument device: device identity the state is recorded for, the MTP
+        URL by default
+        :type device: str or None
+        :argument trust_state: flag to skip listing destination directories
+        whose source files didn't change since the recorded sync
+        :type trust_state: bool
+        :argument checksum: flag to overwrite existing files only if their
+        content changed since the recorded sync
+        :type checksum: bool
+        :argument incremental: flag to skip listing source directories whose
+        modification time didn't change since the recorded sync (requires the
+        state store)
+        :type incremental: bool
+        :argument detect_moves: flag to move unmatched destination files
+        matching new source files (by size and quick fingerprint) instead of
+        copying the source files
+        :type detect_moves: bool
+        :argument spill_plan: flag to keep sync data of the whole tree in a
+        temporary on-disk store instead of memory, see `get_sync_data`
+        :type spill_plan: bool
+        :argument manifest: flag to keep a manifest of synchronized files in
+        the destination directory and use it instead of listing destination
+        directories, see `load_manifest`
+        :type manifest: bool
+        :argument bulk_list: flag to list the whole destination directory
+        tree at once instead of listing destination directories one by one
+        :type bulk_list: bool
+        :argument filter_rules: gitignore-style patterns of excluded paths,
+        see `Filter`
+        :type filter_rules: list or None
+        :argument min_size: min size (in bytes) of synchronized files
+        :type min_size: int or None
+        :argument max_size: max size (in bytes) of synchronized files
+        :type max_size: int or None
+        :argument min_age: min age (in seconds since modification) of
+        synchronized files
+        :type min_age: float or None
+        :argument max_age: max age (in seconds since modification) of
+        synchronized files
+        :type max_age: float or None
+        :argument two_way: flag to synchronize changes on either side to the
+        other one, see `sync_two_way` (requires the state store; unmatched
+        files action doesn't apply)
+        :type two_way: bool
+        :argument costs_store: store to record measured operation costs in,
+        and to read them from to estimate dry runs; the state store by
+        default
+        :type costs_store: StateStore or None
 
         """
         self.mtp_url = mtp_details[0]
@@ -81,10 +198,103 @@ class Sync(object):
         self.verbose = verbose
         self.unmatched = unmatched
         self.overwrite_existing = overwrite_existing
-
-        if ignore_file_types is not None:
-            ignore_file_types = [f.lower() for f in ignore_file_types]
-        self.ignore_file_types = ignore_file_types
+        self.transport = get_transport(backend, log=self._verbose)
+        self.jobs = jobs
+        self.update = update
+        self.mtime_tolerance = mtime_tolerance
+        self.state = state
+        self.device = device or self.mtp_url
+        self.trust_state = trust_state
+        self.checksum = checksum
+
+        # source files are hashed only in checksum mode
+        self.hasher = Hasher(state) if checksum else None
+
+        if incremental and state is None:
+            raise ValueError("Incremental scan requires a state store")
+        self.incremental = incremental
+        self.detect_moves = detect_moves
+
+        if spill_plan and detect_moves:
+            raise ValueError("Moves can't be detected with a spilled plan")
+        self.spill_plan = spill_plan
+        self.manifest = manifest
+        self.bulk_list = bulk_list
+
+        if two_way:
+            if state is None:
+                raise ValueError("Two-way sync requires a state store")
+            if (
+                trust_state
+                or checksum
+                or incremental
+                or detect_moves
+                or spill_plan
+                or manifest
+            ):
+                raise ValueError(
+                    "Two-way sync can't skip unchanged directories, compare "
+                    "file content, detect moves, spill the plan nor keep a "
+                    "manifest"
+                )
+        self.two_way = two_way
+        # (source, destination) absolute paths pairs of files changed on both
+        # sides since the last two-way sync, i.e. left alone
+        self.conflicts = []
+
+        # source files to be recorded in the state store, relative directory
+        # path to a dict of file name to a (size, mtime, hash) tuple
+        self.state_files = {}
+        # source directories to be recorded in the state store (incremental
+        # mode only), relative directory path to a (mtime, subdirs, files)
+        # tuple
+        self.state_dirs = {}
+
+        # manifest loaded from the destination (if any and up to date), and
+        # the one to be saved there - the loaded one updated with destination
+        # directories synchronized in this run
+        self.loaded_manifest = None
+        self.saved_manifest = Manifest()
+
+        # destination directories known to be missing (including created
+        # ones, they were empty), and those to be created, see `create_dirs`
+        self.missing_dirs = set()
+        self.dirs_to_create = []
+        self._dirs_lock = threading.Lock()
+
+        # destination directory tree listed at once (bulk listing only),
+        # relative dir path to a list of FileInfo
+        self.dst_tree = None
+
+        # transport operations measured in this run (recorded in the costs
+        # store, if any), and sizes of files planned to be copied - keyed by
+        # the copied file path
+        self.costs_store = state if costs_store is None else costs_store
+        self.costs = Costs()
+        self.copy_sizes = {}
+
+        # pool running copy (and remove) jobs while synchronizing
+        self.job_pool = None
+        # max number of source directories listed at the same time, applies
+        # to sources on the device only
+        self.walk_jobs = WALK_JOBS
+
+        self._verbose_lock = threading.Lock()
+        # incremented with each re-mount, see `gvfs_wrapper`
+        self._mount_generation = 0
+        self._mount_lock = threading.Lock()
+        self._mount_lock_async = None
+
+        # excluded files and directories, evaluated on both sides by their
+        # path relative to the source (destination) directory
+        self.filter = Filter(
+            rules=filter_rules,
+            ignore_file_types=ignore_file_types,
+            min_size=min_size,
+            max_size=max_size,
+            min_age=min_age,
+            max_age=max_age,
+        )
 
     def _verbose(self, message):
         """
@@ -96,30 +306,39 @@ class Sync(object):
 
         """
         if self.verbose:
-            print(message)
+            # don't let messages from concurrent jobs interleave
+            with self._verbose_lock:
+                print(message)
 
     def gvfs_wrapper(self, func, *args):
         """
-        Wrap gvfs operations and handle exceptions which can terminate
+        Wrap transport operations and handle exceptions which can terminate
         processing.
 
         Currently handling:
             Connection reset by peer
 
-        :argument func: gvfs function to be executed
+        :argument func: transport operation to be executed
         :type func: function
         :argument *args: function's arguments
         :type *args:
 
         """
+        mount_generation = self._mount_generation
+
         try:
             func(*args)
         except exceptions.BashException as exc:
             exc_msg = str(exc).strip()
 
             if exc_msg.endswith("Connection reset by peer"):
-                # re-mount and try again
-                gvfs.mount(self.mtp_url)
+                # re-mount (unless a concurrent job already did so) and try
+                # again
+                with self._mount_lock:
+                    if mount_generation == self._mount_generation:
+                        self.transport.mount(self.mtp_url)
+                        self._mount_generation += 1
+
                 func(*args)
             else:
                 raise exc
@@ -235,45 +454,70 @@ class Sync(object):
         # list of files present in the destination directory prior to sync
         subdir["dst_dir_fls"] = []
 
-        return subdir
-
-    def handle_ignored_file_type(self, path):
-        """
-        Check if a given file is allowed to be synchronized.
+        # files size and modification time, collected while listing
+        subdir["src_dir_stats"] = {}
+        subdir["dst_dir_stats"] = {}
 
-        :argument path: file path
-        :type path: str
+        # source files content hash, collected only in checksum mode
+        subdir["src_dir_hashes"] = {}
+        # files recorded in the state store, file name to a
+        # (size, mtime, hash) tuple
+        subdir["recorded_dir_fls"] = {}
 
-        """
-        if self.ignore_file_types:
-            _, extension = os.path.splitext(path)
+        # names of source files excluded by their size or age, i.e. of
+        # destination files to be left alone
+        subdir["src_dir_skipped"] = set()
 
-            if extension:
-                extension = extension.lower().replace(".", "")
+        # actions synchronizing the subdir, planned right before the sync
+        subdir["plan"] = None
 
-                if extension in self.ignore_file_types:
-                    raise exceptions.IgnoredTypeException
+        return subdir
 
     def get_source_subdir_data(self, src_subdir_files, sync_data):
         """
         Collect source subdir content to synchronize.
 
-        :argument src_subdir_files: source subdir filenames
-        :type src_subdir_files: list
+        :argument src_subdir_files: source subdir files entries
+        :type src_subdir_files: list of FileInfo
         :argument sync_data: sync data dictionary
         :type sync_data: dict
 
         """
-        for f in src_subdir_files:
-            try:
-                self.handle_ignored_file_type(f)
-            except exceptions.IgnoredTypeException:
+        rel_dir = os.path.relpath(sync_data["src_dir_abs"], self.source)
+
+        for entry in src_subdir_files:
+            if self.filter.excludes_file(entry.name, rel_dir):
+                continue
+
+            # leave the destination file (if any) alone as well
+            if self.filter.excludes_stats(entry.size, entry.mtime):
+                sync_data["src_dir_skipped"].add(entry.name)
                 continue
 
-            src_f_abs = os.path.join(sync_data["src_dir_abs"], f)
+            src_f_abs = os.path.join(sync_data["src_dir_abs"], entry.name)
             sync_data["src_dir_fls"].append(src_f_abs)
+            sync_data["src_dir_stats"][src_f_abs] = (entry.size, entry.mtime)
+
+            if self.checksum:
+                self.hasher.submit(src_f_abs)
+
+    def get_source_subdir_hashes(self, sync_data):
+        """
+        Collect source subdir files content hash (in checksum mode).
+
+        :argument sync_data: sync data dictionary
+        :type sync_data: dict
+
+        """
+        if not self.checksum:
+            return
+
+        for src_f_abs in sync_data["src_dir_fls"]:
+            sync_data["src_dir_hashes"][src_f_abs] = self.hasher.result(
+                src_f_abs
+            )
 
-    def get_destination_subdir_data(self, sync_data):
+    def get_destination_subdir_data(self, sync_data, create=True):
         """
         Collect destination subdir content, i.e. files present in the dst
         subdir prior to sync. We refere to these files as to 'unmatched' files.
@@ -282,31 +526,454 @@ class Sync(object):
 
         :argument sync_data: sync data dictionary
         :type sync_data: dict
+        :argument create: flag to create missing destination subdir
+        :type create: bool
+
+        """
+        rel_dir = os.path.relpath(sync_data["dst_dir_abs"], self.destination)
+
+        # get already existing files with their size and modification time,
+        # i.e. in a single listing - or none if recorded in the manifest or
+        # listed with the whole tree
+        if self.is_missing_dir(os.path.dirname(sync_data["dst_dir_abs"])):
+            # no need to list a subdir of a missing directory
+            entries = None
+        else:
+            entries = self.list_destination_subdir(sync_data, rel_dir)
+
+        if entries is None:
+            # ensure destination dir tree, see `create_dirs`
+            with self._dirs_lock:
+                self.missing_dirs.add(sync_data["dst_dir_abs"])
+                if create:
+                    self.dirs_to_create.append(sync_data["dst_dir_abs"])
+            return
+
+        self.add_destination_entries(sync_data, rel_dir, entries)
+
+    def add_destination_entries(self, sync_data, rel_dir, entries):
+        """
+        Collect listed destination subdir files, leaving out excluded ones.
+
+        :argument sync_data: sync data dictionary
+        :type sync_data: dict
+        :argument rel_dir: dir path relative to the destination directory
+        :type rel_dir: str
+        :argument entries: destination subdir entries
+        :type entries: list of FileInfo
+
+        """
+        for entry in entries:
+            if entry.is_dir:
+                continue
+
+            # the manifest isn't a synchronized file
+            if rel_dir == os.curdir and entry.name == MANIFEST_NAME:
+                continue
+
+            if (
+                self.filter.excludes_file(entry.name, rel_dir)
+                or entry.name in sync_data["src_dir_skipped"]
+            ):
+                continue
+
+            dst_f_abs = os.path.join(sync_data["dst_dir_abs"], entry.name)
+            sync_data["dst_dir_fls"].append(dst_f_abs)
+            sync_data["dst_dir_stats"][dst_f_abs] = (entry.size, entry.mtime)
+
+    def list_destination_subdir(self, sync_data, rel_dir):
+        """
+        List destination subdir, i.e. get its entries recorded in the
+        manifest, listed with the whole destination tree or listed now.
+
+        :argument sync_data: sync data dictionary
+        :type sync_data: dict
+        :argument rel_dir: dir path relative to the destination directory
+        :type rel_dir: str
+
+        :returns list or None - FileInfo tuples, None if the subdir doesn't
+        exist
+
+        """
+        if self.loaded_manifest is not None:
+            entries = self.get_manifest_entries(rel_dir)
+            if entries is not None:
+                return entries
+
+        if self.dst_tree is not None:
+            return self.dst_tree.get(rel_dir)
+
+        return self.transport.scan(sync_data["dst_dir_abs"])
+
+    def is_missing_dir(self, path):
+        """
+        Check whether a destination directory (or any of its parents) is
+        known to be missing, i.e. without listing it.
+
+        :argument path: destination directory absolute path
+        :type path: str
+
+        :returns bool
+
+        """
+        with self._dirs_lock:
+            while path.startswith(self.destination):
+                if path in self.missing_dirs:
+                    return True
+
+                parent = os.path.dirname(path)
+                if parent == path:
+                    break
+                path = parent
+
+        return False
+
+    def create_dirs(self):
+        """
+        Create missing destination directories found so far at once, i.e.
+        only the leaf ones (along with their parents) in a single batch.
+        """
+        with self._dirs_lock:
+            dirs, self.dirs_to_create = self.dirs_to_create, []
+
+        if not dirs:
+            return
+
+        leaf_dirs = leaf_paths(dirs)
+        for path in leaf_dirs:
+            self._verbose("Creating directory {d}".format(d=path))
+
+        started = time.monotonic()
+        self.gvfs_wrapper(self.transport.mkdir_batch, leaf_dirs)
+        self.costs.add(MKDIR_OP, time.monotonic() - started, len(leaf_dirs))
+
+    def scan_destination_tree(self):
+        """
+        List the whole destination directory tree at once.
+
+        :returns dict or None - relative dir path to a list of FileInfo, None
+        if the tree can't be listed at once
 
         """
-        if not os.path.exists(sync_data["dst_dir_abs"]):
-            # ensure destination dir tree
+        self._verbose("Listing {d}".format(d=self.destination))
+
+        try:
+            dst_tree = self.transport.scan_tree(self.destination)
+        except (exceptions.BashException, OSError) as exc:
             self._verbose(
-                "Creating directory {d}".format(d=sync_data["dst_dir_abs"])
+                "Listing {d} failed ({e}), listing destination directories "
+                "one by one".format(d=self.destination, e=exc)
             )
-            self.gvfs_wrapper(gvfs.mkdir, sync_data["dst_dir_abs"])
-        else:
-            # get already existing files in the destination dir if any
-            for f in os.listdir(sync_data["dst_dir_abs"]):
-                try:
-                    self.handle_ignored_file_type(f)
-                except exceptions.IgnoredTypeException:
-                    continue
+            return None
+
+        # a missing destination directory has no subdirs either
+        return dst_tree or {}
+
+    def get_manifest_entries(self, rel_dir):
+        """
+        Get destination subdir content recorded in the loaded manifest.
+
+        :argument rel_dir: dir path relative to the destination directory
+        :type rel_dir: str
+
+        :returns list or None - FileInfo tuples, None if not recorded
+
+        """
+        files = self.loaded_manifest.get_dir(rel_dir)
+        if files is None:
+            return None
+
+        return [
+            FileInfo(name, size, mtime, False)
+            for name, (size, mtime) in sorted(files.items())
+        ]
+
+    def load_manifest(self):
+        """
+        Load the manifest of files synchronized last time from the
+        destination directory (possibly by another computer), i.e. a listing
+        of the destination directory tree read at once.
+
+        The manifest is spot-checked against a few listed directories, a
+        stale (or unreadable) manifest isn't used - destination directories
+        are listed then.
+        """
+        self.loaded_manifest = None
+        self.saved_manifest = Manifest()
+
+        manifest_path = os.path.join(self.destination, MANIFEST_NAME)
+        fd, tmp_path = tempfile.mkstemp(prefix="pysyncdroid-")
+        os.close(fd)
+
+        try:
+            self.gvfs_wrapper(self.transport.cp, manifest_path, tmp_path)
+            with open(tmp_path) as f:
+                manifest = Manifest.loads(f.read())
+        except (exceptions.BashException, OSError, ValueError):
+            self._verbose("No manifest in {d}".format(d=self.destination))
+            return
+        finally:
+            os.remove(tmp_path)
+
+        def scan(rel_dir):
+            return self.transport.scan(
+                os.path.normpath(os.path.join(self.destination, rel_dir))
+            )
+
+        if manifest.is_stale(scan, self.filter.excludes_file):
+            self._verbose(
+                "Manifest in {d} is stale, listing destination "
+                "directories".format(d=self.destination)
+            )
+            return
+
+        self.loaded_manifest = manifest
+        self.saved_manifest = Manifest(dict(manifest.dirs))
+
+    def record_manifest_dir(self, sync_data):
+        """
+        Record destination subdir files as left by the planned actions, to
+        be saved in the manifest.
+
+        NOTE: copied files are recorded with their source size and
+        modification time.
+
+        :argument sync_data: sync data dictionary
+        :type sync_data: dict
+
+        """
+        files = {}
+        for action in sync_data["plan"].actions:
+            if action.kind == plan.REMOVE:
+                continue
+
+            if action.kind == plan.COPY:
+                stats = sync_data["src_dir_stats"].get(action.src_file)
+            else:
+                stats = sync_data["dst_dir_stats"].get(action.dst_file)
+
+            if stats is not None:
+                files[action.name] = stats
+
+        rel_dir = os.path.relpath(sync_data["dst_dir_abs"], self.destination)
+        self.saved_manifest.set_dir(rel_dir, files)
+
+    def save_manifest(self):
+        """
+        Replace the manifest in the destination directory.
+        """
+        fd, tmp_path = tempfile.mkstemp(prefix="pysyncdroid-")
+        with os.fdopen(fd, "w") as f:
+            f.write(self.saved_manifest.dumps())
+
+        manifest_path = os.path.join(self.destination, MANIFEST_NAME)
+        self._verbose("Saving manifest {m}".format(m=manifest_path))
+
+        try:
+            self.remove_manifest()
+            self.gvfs_wrapper(self.transport.cp, tmp_path, manifest_path)
+        finally:
+            os.remove(tmp_path)
 
-                dst_f_abs = os.path.join(sync_data["dst_dir_abs"], f)
-                sync_data["dst_dir_fls"].append(dst_f_abs)
+    def remove_manifest(self):
+        """
+        Remove the manifest from the destination directory (if any).
+        """
+        manifest_path = os.path.join(self.destination, MANIFEST_NAME)
+        if self.transport.exists(manifest_path):
+            self.gvfs_wrapper(self.transport.rm, manifest_path)
+
+    def walk_source(self, recorded_dirs=None):
+        """
+        Walk the source directory tree (top-down, like `os.walk`), listing
+        each directory once - files type, size and modification time come
+        with the listing.
+
+        Given recorded directories, list only directories whose modification
+        time changed since the recorded sync. Unchanged directories are only
+        stat-ed and their recorded subdirs are walked on.
+
+        NOTE: a directory modification time changes when its entries are
+        added, removed or renamed, but not when a file is modified in place.
+
+        NOTE2: symlinked directories and directories excluded by the filter
+        are not walked.
+
+        NOTE3: sibling subtrees of a source on the device are listed
+        concurrently (up to `walk_jobs` directories at the same time), i.e.
+        directories are yielded as they are listed, parents before children.
+
+        :argument recorded_dirs: relative dir path to a (mtime, subdirs,
+        files) tuple
+        :type recorded_dirs: dict or None
+
+        :returns generator - (root, subdirs, files entries) of listed
+        directories
+
+        """
+
+        def visit(node):
+            root, mtime = node
+
+            recorded = None
+            if recorded_dirs is not None:
+                if mtime is None:
+                    _, mtime, _ = self.transport.stat(root)
+                recorded = recorded_dirs.get(
+                    os.path.relpath(root, self.source)
+                )
+
+            if recorded is None or recorded[0] != mtime:
+                entries = self.transport.scandir(root)
+                subdirs = [e for e in entries if e.is_dir and not e.is_link]
+                files = [e for e in entries if not e.is_dir]
+                dirs = [e.name for e in subdirs]
+                # subdirs modification time comes with the listing
+                children = [
+                    (os.path.join(root, e.name), e.mtime) for e in subdirs
+                ]
+                listed = True
+            else:
+                _, dirs, files = recorded
+                children = [(os.path.join(root, d), None) for d in dirs]
+                listed = False
+
+            # excluded subdirs are pruned, i.e. not listed at all (but still
+            # recorded, the filter may change)
+            children = [
+                child
+                for child in children
+                if not self.filter.excludes_dir(
+                    os.path.relpath(child[0], self.source)
+                )
+            ]
+
+            return (root, mtime, dirs, files, listed), children
+
+        scan_start = time.time()
+        self.state_dirs = {}
+        jobs = self.walk_jobs if "mtp:host" in self.source else 1
+
+        # walk directories with their modification time, if known
+        for root, mtime, dirs, files, listed in walk_tree(
+            visit, (self.source, None), jobs
+        ):
+            if listed:
+                yield root, dirs, files
+                files = [e.name for e in files]
+
+            # a directory modified just now might change again without its
+            # (coarse) modification time changing, don't trust it next time
+            if recorded_dirs is not None and (
+                mtime < scan_start - self.mtime_tolerance
+            ):
+                rel_dir = os.path.relpath(root, self.source)
+                self.state_dirs[rel_dir] = (mtime, dirs, files)
+
+    def walk_both(self):
+        """
+        Walk the source and destination directory trees at once (top-down),
+        i.e. directories present on either side, listing each directory on
+        both sides once.
+
+        NOTE: subdirs of a directory missing on one side aren't listed on
+        that side either.
+
+        :returns generator - (sync data dictionary, source directory exists
+        flag, destination directory exists flag) tuples
+
+        """
+
+        def visit(node):
+            rel_dir, src_missing, dst_missing = node
+            sync_data = self.sync_data_template(
+                os.path.normpath(os.path.join(self.source, rel_dir)),
+                os.path.normpath(os.path.join(self.destination, rel_dir)),
+            )
+
+            src_entries = None
+            if not src_missing:
+                src_entries = self.transport.scan(sync_data["src_dir_abs"])
+
+            dst_entries = None
+            if not dst_missing:
+                dst_entries = self.list_destination_subdir(sync_data, rel_dir)
+
+            subdirs = set()
+            for entries in (src_entries, dst_entries):
+                subdirs.update(
+                    e.name for e in entries or [] if e.is_dir and not e.is_link
+                )
+
+            if src_entries is not None:
+                self.get_source_subdir_data(
+                    [e for e in src_entries if not e.is_dir], sync_data
+                )
+            if dst_entries is not None:
+                self.add_destination_entries(sync_data, rel_dir, dst_entries)
+
+            children = []
+            for name in sorted(subdirs):
+                child = os.path.normpath(os.path.join(rel_dir, name))
+                if not self.filter.excludes_dir(child):
+                    children.append(
+                        (child, src_entries is None, dst_entries is None)
+                    )
+
+            result = (
+                sync_data,
+                src_entries is not None,
+                dst_entries is not None,
+            )
+            return result, children
+
+        on_device = "mtp:host" in self.source + self.destination
+        jobs = self.walk_jobs if on_device else 1
+
+        return walk_tree(visit, (os.curdir, False, False), jobs)
 
     def get_sync_data(self):
         """
         Get list of sync data dictionaries describing files (and directories)
         that are about to be synchronized.
 
-        :returns list
+        With `spill_plan`, sync data are stored on disk and rebuilt one
+        directory at a time while iterating over the returned store, i.e.
+        memory use doesn't depend on the tree size.
+
+        Missing destination directories are created once the whole tree is
+        scanned.
+
+        :returns list or PlanStore (close it when done)
+
+        """
+        if not self.spill_plan:
+            sync_data_set = list(self.iter_sync_data())
+            self.create_dirs()
+            return sync_data_set
+
+        store = plan.PlanStore(
+            self.source, self.destination, self.sync_data_template
+        )
+        try:
+            for sync_data in self.iter_sync_data():
+                store.put(sync_data)
+            self.create_dirs()
+        except BaseException:
+            store.close()
+            raise
+
+        return store
+
+    def iter_sync_data(self):
+        """
+        Scan the source (and destination) directory by directory, see
+        `get_sync_data`.
+
+        NOTE: in checksum mode, files of up to `SCAN_QUEUE_SIZE` directories
+        are hashed ahead of the directory being yielded.
+
+        :returns generator - sync data dictionaries
 
         """
         self._verbose(
@@ -314,12 +981,36 @@ class Sync(object):
             "this may take a while ...".format(s=self.source)
         )
 
-        sync_data_set = []
+        # directories whose source files are being hashed
+        pending = deque()
+        lookahead = SCAN_QUEUE_SIZE if self.checksum else 0
 
-        for root, _, files in os.walk(self.source):
+        recorded_files = {}
+        if self.state is not None:
+            recorded_files = self.state.get_files(
+                self.device, self.get_mapping_key()
+            )
+        self.state_files = {}
+
+        recorded_dirs = None
+        if self.incremental:
+            recorded_dirs = self.state.get_dirs(
+                self.device, self.get_mapping_key()
+            )
+
+        if self.manifest:
+            self.load_manifest()
+
+        self.missing_dirs = set()
+        self.dst_tree = None
+        if self.bulk_list and self.loaded_manifest is None:
+            self.dst_tree = self.scan_destination_tree()
+
+        for root, _, files in self.walk_source(recorded_dirs):
             # skip directory without files, even if it contains a subdir as
-            # subdirs are walked on later
-            if not files:
+            # subdirs are walked on later; unless files moved away from it
+            # are to be detected
+            if not files and not self.detect_moves:
                 continue
 
             # create the sync data dict for this subdir
@@ -327,90 +1018,1484 @@ class Sync(object):
             dst_subdir_abs = self.set_destination_subdir_abs(src_subdir_abs)
             sync_data = self.sync_data_template(src_subdir_abs, dst_subdir_abs)
 
-            # get files in both source and destination directory
+            # get files in the source directory
             self.get_source_subdir_data(files, sync_data)
-            self.get_destination_subdir_data(sync_data)
+            pending.append(sync_data)
 
-            sync_data_set.append(sync_data)
+            # source files are hashed while walking on
+            while len(pending) > lookahead:
+                sync_data = pending.popleft()
+                if self.complete_sync_data(sync_data, recorded_files):
+                    yield sync_data
 
-        return sync_data_set
+        while pending:
+            sync_data = pending.popleft()
+            if self.complete_sync_data(sync_data, recorded_files):
+                yield sync_data
 
-    def copy_file(self, src_file, dst_file):
+    def complete_sync_data(self, sync_data, recorded_files):
         """
-        Copy file from src to dst.
+        Complete source subdir data with files content hash and recorded
+        state, and collect destination subdir data - unless the subdir is
+        unchanged since the recorded sync.
 
-        :argument src_file: source file absolute path
-        :type src_file: str
-        :argument dst_file: destination file absolute path
-        :type dst_file: str
+        :argument sync_data: sync data dictionary
+        :type sync_data: dict
+        :argument recorded_files: files recorded in the state store, relative
+        dir path to a dict of file name to a (size, mtime, hash) tuple
+        :type recorded_files: dict
+
+        :returns bool - flag whether the subdir is to be synchronized
 
         """
-        self._verbose("Copying {s} to {d}".format(s=src_file, d=dst_file))
-        self.gvfs_wrapper(gvfs.cp, src_file, dst_file)
+        self.get_source_subdir_hashes(sync_data)
 
-    def do_sync(self, sync_data):
+        if self.state is not None:
+            rel_dir = os.path.relpath(sync_data["src_dir_abs"], self.source)
+            recorded_dir_files = recorded_files.get(rel_dir)
+            sync_data["recorded_dir_fls"] = recorded_dir_files or {}
+
+            if self.trust_state and self.is_dir_unchanged(sync_data):
+                self._verbose(
+                    "Skipping unchanged {s}".format(s=sync_data["src_dir_abs"])
+                )
+                return False
+
+            self.state_files[rel_dir] = self.get_state_dir_files(sync_data)
+
+        # get files in the destination directory, don't create it just
+        # to detect files moved away from it
+        self.get_destination_subdir_data(
+            sync_data, create=bool(sync_data["src_dir_fls"])
+        )
+
+        return True
+
+    def get_mapping_key(self):
         """
-        Iterate over source dir files and copy then to the given destination.
-        While doing so, update the list of destinatin files.
+        Get source to destination mapping identity, i.e. the mapping with
+        paths on the device relative to the device root (the gvfs path changes
+        with each connection).
+
+        :returns str
+
+        """
+        source = self.source.replace(self.mtp_gvfs_path, "")
+        destination = self.destination.replace(self.mtp_gvfs_path, "")
+
+        return "{s}==>{d}".format(s=source, d=destination)
+
+    def get_state_dir_files(self, sync_data):
+        """
+        Get source subdir files in the form they are recorded in the state
+        store.
 
         :argument sync_data: sync data dictionary
         :type sync_data: dict
 
+        :returns dict - file name to a (size, mtime, hash) tuple
+
         """
+        dir_files = {}
+
         for src_file in sync_data["src_dir_fls"]:
-            dst_file = src_file.replace(
-                sync_data["src_dir_abs"], sync_data["dst_dir_abs"]
-            )
+            name = os.path.basename(src_file)
+            size, mtime = sync_data["src_dir_stats"][src_file]
+            hash_ = sync_data["src_dir_hashes"].get(src_file)
 
-            if (
-                sync_data["dst_dir_fls"]
-                and dst_file in sync_data["dst_dir_fls"]
-            ):
-                sync_data["dst_dir_fls"].remove(dst_file)
+            # keep the recorded hash of an unchanged file
+            recorded = sync_data["recorded_dir_fls"].get(name)
+            if hash_ is None and recorded and recorded[:2] == (size, mtime):
+                hash_ = recorded[2]
 
-                # ignore existing files
-                if not self.overwrite_existing:
-                    continue
+            dir_files[name] = (size, mtime, hash_)
 
-            self.copy_file(src_file, dst_file)
+        return dir_files
 
-    def handle_destination_dir_data(self, sync_data):
+    def is_dir_unchanged(self, sync_data):
         """
-        Manage files that were already in the destination directory but are
-        missing in the source directory (i.e. 'unmatched' files).
+        Check if source subdir files are the same as recorded in the state
+        store, i.e. compare their sizes and modification times (content hashes
+        in checksum mode).
 
         :argument sync_data: sync data dictionary
         :type sync_data: dict
 
+        :returns bool
+
+        """
+        recorded_dir_files = sync_data["recorded_dir_fls"]
+        if not recorded_dir_files:
+            return False
+
+        dir_files = self.get_state_dir_files(sync_data)
+        if set(dir_files) != set(recorded_dir_files):
+            return False
+
+        for name, (size, mtime, hash_) in dir_files.items():
+            recorded_size, recorded_mtime, recorded_hash = recorded_dir_files[
+                name
+            ]
+
+            if size != recorded_size:
+                return False
+
+            if self.checksum:
+                if hash_ is None or hash_ != recorded_hash:
+                    return False
+            elif mtime != recorded_mtime:
+                return False
+
+        return True
+
+    def save_state(self):
         """
-        # end early if there were no files in the destination directory
-        if not sync_data["dst_dir_fls"]:
+        Record synchronized source files (and directories in incremental
+        mode) in the state store (if any), along with measured operation
+        costs.
+        """
+        self.save_costs()
+
+        if self.state is None:
             return
 
-        for unmatched_file in sync_data["dst_dir_fls"]:
-            if self.unmatched == REMOVE:
-                self._verbose("Removing {u}".format(u=unmatched_file))
-                self.gvfs_wrapper(gvfs.rm, unmatched_file)
+        if self.state_files:
+            self.state.set_files(
+                self.device, self.get_mapping_key(), self.state_files
+            )
+            self.state_files = {}
 
-            elif self.unmatched == SYNCHRONIZE:
-                dst_file = unmatched_file.replace(
-                    sync_data["dst_dir_abs"], sync_data["src_dir_abs"]
-                )
-                self.copy_file(src_file=unmatched_file, dst_file=dst_file)
+        if self.incremental:
+            self.state.set_dirs(
+                self.device, self.get_mapping_key(), self.state_dirs
+            )
+            self.state_dirs = {}
 
-    def sync(self):
+    def save_costs(self):
         """
-        Synchronize files.
+        Record measured operation costs in the costs store (if any).
         """
-        for sync_data in self.get_sync_data():
-            if not sync_data["src_dir_fls"]:
-                self._verbose("No files to sync")
-                return
+        if self.costs_store is not None and self.costs:
+            self.costs_store.add_costs(self.device, self.costs.sums)
+            self.costs = Costs()
 
-            self.do_sync(sync_data)
+    def copy_file(self, src_file, dst_file):
+        """
+        Copy file from src to dst.
 
-            # skip any other actions if unmatched files are ignored
-            if self.unmatched == IGNORE:
-                continue
+        :argument src_file: source file absolute path
+        :type src_file: str
+        :argument dst_file: destination file absolute path
+        :type dst_file: str
+
+        """
+        self._verbose("Copying {s} to {d}".format(s=src_file, d=dst_file))
+
+        started = time.monotonic()
+        self.gvfs_wrapper(self.transport.cp, src_file, dst_file)
+        self.add_copy_cost(src_file, time.monotonic() - started)
+
+    def add_copy_cost(self, src_file, seconds):
+        """
+        Add a measured copy of a file planned to be copied, see `get_plan`.
+
+        :argument src_file: copied file absolute path
+        :type src_file: str
+        :argument seconds: copy duration
+        :type seconds: float
+
+        """
+        # files copied on the destination aren't planned
+        size = self.copy_sizes.pop(src_file, None)
+        if size is not None:
+            self.costs.add(COPY_OP, seconds, size=size)
+
+    def move_file(self, src_file, dst_file):
+        """
+        Move (rename) file on the destination.
+
+        :argument src_file: file absolute path
+        :type src_file: str
+        :argument dst_file: new file absolute path
+        :type dst_file: str
+
+        """
+        self._verbose("Moving {s} to {d}".format(s=src_file, d=dst_file))
+
+        started = time.monotonic()
+        self.gvfs_wrapper(self.transport.mv, src_file, dst_file)
+        self.costs.add(MOVE_OP, time.monotonic() - started)
+
+    def remove_file(self, dst_file):
+        """
+        Remove file from the destination.
+
+        :argument dst_file: file absolute path
+        :type dst_file: str
+
+        """
+        self._verbose("Removing {u}".format(u=dst_file))
+
+        started = time.monotonic()
+        self.gvfs_wrapper(self.transport.rm, dst_file)
+        self.costs.add(REMOVE_OP, time.monotonic() - started)
+
+    def remove_source_file(self, src_file):
+        """
+        Remove file from the source (in two-way sync), not measured as a
+        removal from the device.
+
+        :argument src_file: file absolute path
+        :type src_file: str
+
+        """
+        self._verbose("Removing {u}".format(u=src_file))
+        self.gvfs_wrapper(self.transport.rm, src_file)
+
+    def get_moves(self, sync_data_set):
+        """
+        Pair unmatched destination files with new source files, i.e. find
+        files which were moved (or renamed) in the source.
+
+        Files are paired by size first, then by quick fingerprint (read only
+        for files of a matching size). Paired files are moved to their new
+        destination path and treated as existing files afterwards, which
+        are never overwritten - their content matched already (and they
+        may still be being moved).
+
+        :argument sync_data_set: sync data dictionaries
+        :type sync_data_set: list
+
+        :returns list - (unmatched, new) destination absolute paths pairs
+
+        """
+        # unmatched files by size; empty files are cheap to copy
+        unmatched = {}
+        for sync_data in sync_data_set:
+            for dst_file in sync_data["dst_dir_fls"]:
+                stats = sync_data["dst_dir_stats"].get(dst_file)
+                if stats is not None and stats[0] > 0:
+                    unmatched.setdefault(stats[0], []).append(
+                        (dst_file, sync_data)
+                    )
+
+        moves = []
+        if not unmatched:
+            return moves
+
+        fingerprints = {}
+
+        def get_fingerprint(path):
+            if path not in fingerprints:
+                try:
+                    fingerprints[path] = self.transport.fingerprint(path)
+                except OSError:
+                    fingerprints[path] = None
+
+            return fingerprints[path]
+
+        for sync_data in sync_data_set:
+            dst_dir_fls = set(sync_data["dst_dir_fls"])
+
+            for src_file in sync_data["src_dir_fls"]:
+                dst_file = os.path.join(
+                    sync_data["dst_dir_abs"], os.path.basename(src_file)
+                )
+                if dst_file in dst_dir_fls:
+                    continue
+
+                size, _ = sync_data["src_dir_stats"][src_file]
+                candidates = unmatched.get(size)
+                if not candidates:
+                    continue
+
+                src_fingerprint = get_fingerprint(src_file)
+                if src_fingerprint is None:
+                    continue
+
+                for candidate in candidates:
+                    unmatched_file, unmatched_sync_data = candidate
+                    if get_fingerprint(unmatched_file) != src_fingerprint:
+                        continue
+
+                    candidates.remove(candidate)
+                    moves.append((unmatched_file, dst_file))
+
+                    # not unmatched anymore, but existing
+                    unmatched_sync_data["dst_dir_fls"].remove(unmatched_file)
+                    stats = unmatched_sync_data["dst_dir_stats"].pop(
+                        unmatched_file
+                    )
+                    sync_data["dst_dir_fls"].append(dst_file)
+                    sync_data["dst_dir_stats"][dst_file] = stats
+                    sync_data.setdefault("moved_fls", set()).add(dst_file)
+                    break
+
+        return moves
+
+    def submit(self, func, *args):
+        """
+        Run a job in the job pool, or right away when not synchronizing.
+
+        :argument func: function to be executed
+        :type func: function
+        :argument *args: function's arguments
+        :type *args:
+
+        """
+        if self.job_pool is None:
+            func(*args)
+        else:
+            self.job_pool.submit(func, *args)
+
+    def copy_files(self, files):
+        """
+        Copy files from src to dst.
+
+        Batch copying transports (i.e. gio) copy files sharing a destination
+        directory in batches, i.e. with as few `gio copy` invocations as
+        possible. Files which failed to copy in a batch are copied one by one
+        again to get their particular error (or to re-mount the device and
+        carry on).
+
+        :argument files: source and destination absolute paths pairs
+        :type files: list
+
+        """
+        if not self.transport.batch_copy:
+            for src_file, dst_file in files:
+                self.submit(self.copy_file, src_file, dst_file)
+            return
+
+        # batch copy keeps file names, group files by destination directory
+        batches = {}
+        for src_file, dst_file in files:
+            if os.path.basename(src_file) != os.path.basename(dst_file):
+                self.submit(self.copy_file, src_file, dst_file)
+                continue
+
+            dst_dir = os.path.dirname(dst_file)
+            batches.setdefault(dst_dir, []).append(src_file)
+
+        for dst_dir, src_files in batches.items():
+            self.submit(self.copy_batch, src_files, dst_dir)
+
+    def copy_batch(self, src_files, dst_dir):
+        """
+        Copy files to a directory in a batch.
+
+        :argument src_files: source files absolute paths
+        :type src_files: list
+        :argument dst_dir: destination directory absolute path
+        :type dst_dir: str
+
+        """
+        for src_file in src_files:
+            self._verbose("Copying {s} to {d}".format(s=src_file, d=dst_dir))
+
+        started = time.monotonic()
+        failed = self.transport.cp_batch(src_files, dst_dir)
+        seconds = time.monotonic() - started
+
+        sizes = [self.copy_sizes.pop(f, None) for f in src_files]
+        if None not in sizes:
+            self.costs.add(COPY_OP, seconds, len(sizes), sum(sizes))
+
+        for src_file in src_files:
+            if src_file in failed:
+                dst_file = os.path.join(dst_dir, os.path.basename(src_file))
+                self.copy_file(src_file, dst_file)
+
+    def is_modified(self, src_file, dst_file, sync_data):
+        """
+        Check if the source file differs from the existing destination file,
+        i.e. if their sizes differ or the source file is newer.
+
+        :argument src_file: source file absolute path
+        :type src_file: str
+        :argument dst_file: destination file absolute path
+        :type dst_file: str
+        :argument sync_data: sync data dictionary
+        :type sync_data: dict
+
+        :returns bool
+
+        """
+        try:
+            src_size, src_mtime = sync_data["src_dir_stats"][src_file]
+            dst_size, dst_mtime = sync_data["dst_dir_stats"][dst_file]
+        except KeyError:
+            # better safe than sorry
+            return True
+
+        if src_size != dst_size:
+            return True
+
+        return src_mtime > dst_mtime + self.mtime_tolerance
+
+    def is_content_modified(self, src_file, dst_file, sync_data):
+        """
+        Check if the source file content changed since the recorded sync.
+
+        Without a recorded hash fall back to comparing sizes and modification
+        times, see `is_modified`.
+
+        :argument src_file: source file absolute path
+        :type src_file: str
+        :argument dst_file: destination file absolute path
+        :type dst_file: str
+        :argument sync_data: sync data dictionary
+        :type sync_data: dict
+
+        :returns bool
+
+        """
+        src_hash = sync_data["src_dir_hashes"].get(src_file)
+        recorded = sync_data["recorded_dir_fls"].get(
+            os.path.basename(src_file)
+        )
+
+        if src_hash is None or recorded is None or recorded[2] is None:
+            return self.is_modified(src_file, dst_file, sync_data)
+
+        src_size, _ = sync_data["src_dir_stats"][src_file]
+        dst_stats = sync_data["dst_dir_stats"].get(dst_file)
+
+        # the destination file might have been changed meanwhile
+        if dst_stats is not None and dst_stats[0] != src_size:
+            return True
+
+        return src_hash != recorded[2]
+
+    def get_plan(self, sync_data):
+        """
+        Plan actions synchronizing a directory, i.e. diff source files
+        against destination files.
+
+        Existing files are copied only if they should be overwritten,
+        unmatched files are handled according to the unmatched files action.
+        While doing so, leave only unmatched files in the list of destination
+        files.
+
+        :argument sync_data: sync data dictionary
+        :type sync_data: dict
+
+        :returns DirPlan
+
+        """
+        dir_plan = plan.DirPlan(
+            sync_data["src_dir_abs"], sync_data["dst_dir_abs"]
+        )
+        unmatched_files = []
+
+        for name, in_src, in_dst in plan.diff(
+            [os.path.basename(f) for f in sync_data["src_dir_fls"]],
+            [os.path.basename(f) for f in sync_data["dst_dir_fls"]],
+        ):
+            if not in_dst:
+                dir_plan.add(plan.COPY, name)
+                continue
+
+            dst_file = os.path.join(dir_plan.dst_dir, name)
+            if not in_src:
+                unmatched_files.append(dst_file)
+                dir_plan.add(UNMATCHED_ACTIONS[self.unmatched], name)
+                continue
+
+            # files moved to their place match the source already
+            if dst_file in sync_data.get("moved_fls", ()):
+                dir_plan.add(plan.SKIP, name)
+                continue
+
+            src_file = os.path.join(dir_plan.src_dir, name)
+            if self.checksum:
+                modified = self.is_content_modified(
+                    src_file, dst_file, sync_data
+                )
+            else:
+                modified = self.update and self.is_modified(
+                    src_file, dst_file, sync_data
+                )
+
+            # ignore existing (unchanged) files
+            overwrite = self.overwrite_existing or modified
+            dir_plan.add(plan.COPY if overwrite else plan.SKIP, name)
+
+        sync_data["dst_dir_fls"] = unmatched_files
+        sync_data["plan"] = dir_plan
+
+        # copies are measured only to be recorded
+        if self.costs_store is not None:
+            for action in dir_plan.actions:
+                if action.kind == plan.COPY:
+                    stats = sync_data["src_dir_stats"].get(action.src_file)
+                    copied_file = action.src_file
+                elif action.kind == plan.PULL:
+                    stats = sync_data["dst_dir_stats"].get(action.dst_file)
+                    copied_file = action.dst_file
+                else:
+                    continue
+
+                if stats is not None:
+                    self.copy_sizes[copied_file] = stats[0]
+
+        if self.manifest:
+            self.record_manifest_dir(sync_data)
+
+        return dir_plan
+
+    def get_two_way_plan(self, sync_data, base_files):
+        """
+        Plan actions synchronizing a directory both ways, i.e. merge source
+        and destination files against the baseline, see `plan.merge`.
+
+        :argument sync_data: sync data dictionary
+        :type sync_data: dict
+        :argument base_files: file name to a (source size, source mtime,
+        destination size, destination mtime) tuple as of the last sync
+        :type base_files: dict
+
+        :returns DirPlan
+
+        """
+        dir_plan = plan.DirPlan(
+            sync_data["src_dir_abs"], sync_data["dst_dir_abs"]
+        )
+
+        for name, in_src, in_dst in plan.diff(
+            [os.path.basename(f) for f in sync_data["src_dir_fls"]],
+            [os.path.basename(f) for f in sync_data["dst_dir_fls"]],
+        ):
+            src_stats = sync_data["src_dir_stats"].get(
+                os.path.join(dir_plan.src_dir, name)
+            )
+            dst_stats = sync_data["dst_dir_stats"].get(
+                os.path.join(dir_plan.dst_dir, name)
+            )
+            dir_plan.add(
+                plan.merge(
+                    src_stats,
+                    dst_stats,
+                    base_files.get(name),
+                    self.mtime_tolerance,
+                ),
+                name,
+            )
+
+        sync_data["plan"] = dir_plan
+        return dir_plan
+
+    def get_files_to_copy(self, sync_data):
+        """
+        Get source dir files which should be copied to the destination.
+        While doing so, update the list of destinatin files.
+
+        :argument sync_data: sync data dictionary
+        :type sync_data: dict
+
+        :returns list - source and destination absolute paths pairs
+
+        """
+        return [
+            (action.src_file, action.dst_file)
+            for action in self.get_plan(sync_data).get(plan.COPY)
+        ]
+
+    def do_sync(self, sync_data):
+        """
+        Iterate over source dir files and copy then to the given destination.
+        While doing so, update the list of destinatin files.
+
+        :argument sync_data: sync data dictionary
+        :type sync_data: dict
+
+        """
+        self.copy_files(self.get_files_to_copy(sync_data))
+
+    def handle_destination_dir_data(self, sync_data):
+        """
+        Manage files that were already in the destination directory but are
+        missing in the source directory (i.e. 'unmatched' files).
+
+        :argument sync_data: sync data dictionary
+        :type sync_data: dict
+
+        """
+        dir_plan = sync_data.get("plan") or self.get_plan(sync_data)
+
+        for action in dir_plan.get(plan.REMOVE):
+            self.submit(self.remove_file, action.dst_file)
+
+        for action in dir_plan.get(plan.PULL):
+            self.submit(self.copy_file, action.dst_file, action.src_file)
+
+    def iter_sync_data_streamed(self):
+        """
+        Scan the source (and destination) in a separate thread, i.e. while
+        directories scanned before are being synchronized.
+
+        At most `SCAN_QUEUE_SIZE` directories are scanned ahead, so the time
+        to the first copy doesn't depend on the tree size and memory stays
+        bounded.
+
+        NOTE: moves are detected across the whole tree and a spilled plan is
+        stored for the whole tree, i.e. in these modes everything is scanned
+        before the first copy.
+
+        :returns generator - sync data dictionaries
+
+        """
+        if self.spill_plan:
+            sync_data_set = self.get_sync_data()
+            try:
+                yield from sync_data_set
+            finally:
+                sync_data_set.close()
+            return
+
+        if self.detect_moves:
+            sync_data_set = self.get_sync_data()
+            for src_file, dst_file in self.get_moves(sync_data_set):
+                self.submit(self.move_file, src_file, dst_file)
+
+            # directories without files were needed only to detect moves
+            sync_data_set = [sd for sd in sync_data_set if sd["src_dir_fls"]]
+        else:
+            sync_data_set = iter_in_thread(
+                self.iter_sync_data(), SCAN_QUEUE_SIZE
+            )
+
+        yield from sync_data_set
+
+    def sync(self):
+        """
+        Synchronize files.
+        """
+        if self.two_way:
+            self.sync_two_way()
+            return
+
+        self.job_pool = JobPool(self.jobs)
+
+        try:
+            with self.job_pool, closing(
+                self.iter_sync_data_streamed()
+            ) as sync_data_set:
+                for sync_data in sync_data_set:
+                    # all files of the directory may be filtered out
+                    if not sync_data["src_dir_fls"]:
+                        self._verbose("No files to sync")
+                        continue
+
+                    # directories scanned so far, i.e. at least this one
+                    self.create_dirs()
+                    self.do_sync(sync_data)
+
+                    # skip any other actions if unmatched files are ignored
+                    if self.unmatched == IGNORE:
+                        continue
+
+                    self.handle_destination_dir_data(sync_data)
+
+            self.save_state()
+            if self.manifest:
+                self.save_manifest()
+        finally:
+            self.job_pool = None
+            self.close()
+
+    def sync_two_way(self):
+        """
+        Synchronize files both ways, in a single walk of both trees, see
+        `walk_both`.
+
+        Each file is merged against the baseline recorded in the state store
+        by the last two-way sync, see `plan.merge`: new and changed files
+        are copied to the other side (each in one direction at most), files
+        removed on one side are removed on the other one. Files changed on
+        both sides are left alone and reported, see `conflicts`.
+
+        The baseline is replaced once all files are synchronized, with both
+        sides of each file (the side copied to is stat-ed after the copy).
+
+        Both trees are walked (and merged) before anything is synchronized,
+        so that a missing side isn't taken for all its files removed, see
+        `check_two_way_plans`.
+
+        :raises SyncException - the run would wipe one side
+        """
+        mapping = self.get_mapping_key()
+        baseline = self.state.get_baseline(self.device, mapping)
+        new_baseline = {}
+        # (rel dir, name, known side stats, copied file, pulled flag) tuples
+        copied = []
+        self.conflicts = []
+
+        self._verbose(
+            'Gathering list of files to synchronize in "{s}" and "{d}", '
+            "this may take a while ...".format(
+                s=self.source, d=self.destination
+            )
+        )
+
+        self.dst_tree = None
+        if self.bulk_list:
+            self.dst_tree = self.scan_destination_tree()
+
+        # (rel dir, sync data, source exists, destination exists) tuples
+        walked = []
+        for sync_data, src_exists, dst_exists in self.walk_both():
+            rel_dir = os.path.relpath(sync_data["src_dir_abs"], self.source)
+            self.get_two_way_plan(sync_data, baseline.get(rel_dir, {}))
+            walked.append((rel_dir, sync_data, src_exists, dst_exists))
+
+        self.check_two_way_plans(baseline, walked)
+
+        self.job_pool = JobPool(self.jobs)
+
+        try:
+            with self.job_pool:
+                for rel_dir, sync_data, src_exists, dst_exists in walked:
+                    new_baseline[rel_dir] = self.sync_two_way_dir(
+                        sync_data,
+                        src_exists,
+                        dst_exists,
+                        baseline.get(rel_dir, {}),
+                        copied,
+                    )
+
+            for rel_dir, name, stats, copied_file, pulled in copied:
+                copied_stats = self.stat_file(copied_file)
+                if copied_stats is None:
+                    continue
+
+                if pulled:
+                    new_baseline[rel_dir][name] = copied_stats + stats
+                else:
+                    new_baseline[rel_dir][name] = stats + copied_stats
+
+            self.state.set_baseline(self.device, mapping, new_baseline)
+            self.save_costs()
+        finally:
+            self.job_pool = None
+            self.copy_sizes = {}
+            self.close()
+
+    def check_two_way_plans(self, baseline, walked):
+        """
+        Refuse to synchronize both ways if a side is missing (or isn't
+        reachable, e.g. the device storage isn't mounted) or if all files
+        synchronized last time would be removed from a side - all its files
+        would be taken for removed on the other side.
+
+        :argument baseline: relative dir path to a dict of file name to a
+        (source size, source mtime, destination size, destination mtime)
+        tuple as of the last sync
+        :type baseline: dict
+        :argument walked: (rel dir, sync data with its plan, source exists,
+        destination exists) tuples of walked directories
+        :type walked: list
+
+        :raises SyncException
+
+        """
+        base_count = sum(len(files) for files in baseline.values())
+        if not base_count:
+            # nothing synchronized yet, i.e. nothing to remove
+            return
+
+        for rel_dir, _, src_exists, dst_exists in walked:
+            if rel_dir != os.curdir:
+                continue
+
+            for exists, path in (
+                (src_exists, self.source),
+                (dst_exists, self.destination),
+            ):
+                if not exists:
+                    raise exceptions.SyncException(
+                        '"{p}" does not exist (anymore), refusing to '
+                        "synchronize both ways".format(p=path)
+                    )
+
+        for kind, path in (
+            (plan.REMOVE, self.destination),
+            (plan.REMOVE_SOURCE, self.source),
+        ):
+            count = sum(
+                len(sync_data["plan"].get(kind))
+                for _, sync_data, _, _ in walked
+            )
+            if count == base_count:
+                raise exceptions.SyncException(
+                    "Refusing to remove all {n} files synchronized last time "
+                    'from "{p}"'.format(n=count, p=path)
+                )
+
+    def sync_two_way_dir(
+        self, sync_data, src_exists, dst_exists, base_files, copied
+    ):
+        """
+        Synchronize a directory both ways, as merged by `get_two_way_plan`,
+        see `sync_two_way`.
+
+        :argument sync_data: sync data dictionary
+        :type sync_data: dict
+        :argument src_exists: source directory exists flag
+        :type src_exists: bool
+        :argument dst_exists: destination directory exists flag
+        :type dst_exists: bool
+        :argument base_files: file name to a (source size, source mtime,
+        destination size, destination mtime) tuple as of the last sync
+        :type base_files: dict
+        :argument copied: list to add copied files to, as (rel dir, name,
+        known side stats, copied file, pulled flag) tuples
+        :type copied: list
+
+        :returns dict - the directory baseline, without copied files
+
+        """
+        rel_dir = os.path.relpath(sync_data["src_dir_abs"], self.source)
+        dir_plan = sync_data["plan"]
+        dir_base = {}
+
+        kinds = set(action.kind for action in dir_plan.actions)
+        if plan.COPY in kinds and not dst_exists:
+            with self._dirs_lock:
+                self.dirs_to_create.append(dir_plan.dst_dir)
+            self.create_dirs()
+        if plan.PULL in kinds and not src_exists:
+            self._verbose("Creating directory {d}".format(d=dir_plan.src_dir))
+            self.gvfs_wrapper(self.transport.mkdir, dir_plan.src_dir)
+
+        for action in dir_plan.actions:
+            src_stats = sync_data["src_dir_stats"].get(action.src_file)
+            dst_stats = sync_data["dst_dir_stats"].get(action.dst_file)
+
+            if action.kind == plan.SKIP:
+                dir_base[action.name] = src_stats + dst_stats
+
+            elif action.kind == plan.CONFLICT:
+                self.conflicts.append((action.src_file, action.dst_file))
+
+                # keep it a conflict until resolved
+                if action.name in base_files:
+                    dir_base[action.name] = base_files[action.name]
+
+            elif action.kind == plan.COPY:
+                self.copy_sizes[action.src_file] = src_stats[0]
+                self.submit(self.copy_file, action.src_file, action.dst_file)
+                copied.append(
+                    (rel_dir, action.name, src_stats, action.dst_file, False)
+                )
+
+            elif action.kind == plan.PULL:
+                # not sized, i.e. not measured as a copy to the device
+                self.submit(self.copy_file, action.dst_file, action.src_file)
+                copied.append(
+                    (rel_dir, action.name, dst_stats, action.src_file, True)
+                )
+
+            elif action.kind == plan.REMOVE:
+                self.submit(self.remove_file, action.dst_file)
+
+            elif action.kind == plan.REMOVE_SOURCE:
+                self.submit(self.remove_source_file, action.src_file)
+
+        return dir_base
+
+    def dry_run(self, plan_file=None):
+        """
+        Plan synchronization without carrying it out, i.e. scan and diff the
+        source and destination but don't copy, move, remove or create
+        anything (nor record the state or the manifest).
+
+        The duration is estimated from operation costs measured against the
+        device in previous runs, see `estimate_duration`.
+
+        :argument plan_file: file object to save the plan to, to be carried
+        out later, see `apply_plan`
+        :type plan_file: file or None
+
+        :returns PlanSummary
+
+        """
+        if self.two_way:
+            raise ValueError("Two-way sync can't be planned ahead")
+
+        summary = plan.PlanSummary(self.source, self.destination)
+
+        def save(record):
+            if plan_file is not None:
+                plan.write_plan_record(plan_file, record)
+
+        if plan_file is not None:
+            plan.write_plan_header(
+                plan_file, self.device, self.get_mapping_key()
+            )
+
+        try:
+            sync_data_set = self.iter_sync_data()
+            if self.detect_moves:
+                sync_data_set = list(sync_data_set)
+                moves = self.get_moves(sync_data_set)
+                summary.moves = len(moves)
+
+                for src_file, dst_file in moves:
+                    save(
+                        [
+                            plan.MOVE,
+                            os.path.relpath(src_file, self.destination),
+                            os.path.relpath(dst_file, self.destination),
+                        ]
+                    )
+
+            for sync_data in sync_data_set:
+                # directories without files were needed only to detect moves
+                if not sync_data["src_dir_fls"]:
+                    continue
+
+                records = []
+                for action in self.get_plan(sync_data).actions:
+                    if action.kind == plan.COPY:
+                        stats = sync_data["src_dir_stats"].get(action.src_file)
+                    elif action.kind in (plan.REMOVE, plan.PULL):
+                        stats = sync_data["dst_dir_stats"].get(action.dst_file)
+                    else:
+                        continue
+
+                    summary.add(action.kind, stats[0] if stats else 0)
+                    record = [action.kind, action.name] + list(stats or (0, 0))
+                    # the overwritten file, to tell whether it was copied
+                    if action.kind == plan.COPY:
+                        dst_stats = sync_data["dst_dir_stats"].get(
+                            action.dst_file
+                        )
+                        record += list(dst_stats or (None, None))
+                    records.append(record)
+
+                create = self.is_missing_dir(sync_data["dst_dir_abs"])
+                if records or create:
+                    rel_dir = os.path.relpath(
+                        sync_data["src_dir_abs"], self.source
+                    )
+                    save([plan.DIR_RECORD, rel_dir, create])
+                    for record in records:
+                        save(record)
+
+            with self._dirs_lock:
+                dirs, self.dirs_to_create = self.dirs_to_create, []
+            summary.dirs = len(dirs)
+
+            summary.seconds = self.estimate_duration(
+                summary, len(leaf_paths(dirs))
+            )
+        finally:
+            self.state_files = {}
+            self.state_dirs = {}
+            self.copy_sizes = {}
+            self.close()
+
+        return summary
+
+    def stat_file(self, path):
+        """
+        Get file size and modification time, if it exists (and is a file).
+
+        :argument path: file absolute path
+        :type path: str
+
+        :returns tuple or None - (size, mtime)
+
+        """
+        try:
+            size, mtime, is_dir = self.transport.stat(path)
+        except OSError:
+            return None
+
+        return None if is_dir else (size, mtime)
+
+    def check_planned(self, record, src_file, dst_file):
+        """
+        Revalidate a saved plan record, i.e. check whether files it touches
+        are still as they were when planned.
+
+        :argument record: plan record, see `plan.write_plan_header`
+        :type record: list
+        :argument src_file: source file absolute path
+        :type src_file: str
+        :argument dst_file: destination file absolute path
+        :type dst_file: str
+
+        :returns bool or None - True if the action is to be carried out,
+        None if it was carried out already (e.g. by an interrupted run),
+        False if it's stale
+
+        """
+        kind, _, size, mtime = record[:4]
+
+        def is_unchanged(stats, planned_size, planned_mtime):
+            return stats[0] == planned_size and (
+                abs(stats[1] - planned_mtime) <= self.mtime_tolerance
+            )
+
+        def is_copied(stats):
+            # of the same size and not older
+            return stats[0] == size and (
+                stats[1] >= mtime - self.mtime_tolerance
+            )
+
+        # the file planned to be copied (removed), and the one it's copied to
+        # (missing from the source)
+        if kind == plan.COPY:
+            planned_file, other_file = src_file, dst_file
+        else:
+            planned_file, other_file = dst_file, src_file
+
+        planned_stats = self.stat_file(planned_file)
+        if planned_stats is None:
+            return None if kind == plan.REMOVE else False
+
+        if not is_unchanged(planned_stats, size, mtime):
+            return False
+
+        other_stats = self.stat_file(other_file)
+
+        if kind == plan.COPY:
+            planned_dst_size, planned_dst_mtime = record[4:6]
+            if other_stats is None:
+                return planned_dst_size is None
+            if planned_dst_size is not None and is_unchanged(
+                other_stats, planned_dst_size, planned_dst_mtime
+            ):
+                return True
+
+            # the destination changed since planned, copied already unless
+            # it changed otherwise
+            return None if is_copied(other_stats) else False
+
+        if other_stats is None:
+            return True
+
+        # the source file appeared meanwhile, or was pulled already
+        if kind == plan.REMOVE or not is_copied(other_stats):
+            return False
+
+        return None
+
+    def apply_plan(self, records):
+        """
+        Carry out a saved plan, see `dry_run`, i.e. synchronize without
+        scanning the source and destination.
+
+        Only files touched by planned actions are checked, see
+        `check_planned`. Stale actions are skipped, as well as those carried
+        out already (e.g. by an interrupted run).
+
+        NOTE: files synchronized this way aren't recorded in the state store
+        nor in the manifest (the manifest is removed, it would be stale).
+
+        :argument records: plan records of the mapping, see `load_plans`
+        :type records: list
+
+        :returns int - number of stale actions
+
+        """
+        if self.manifest:
+            self.remove_manifest()
+
+        def get_dirs(rel_dir):
+            src_dir = os.path.normpath(os.path.join(self.source, rel_dir))
+            return src_dir, self.set_destination_subdir_abs(src_dir)
+
+        with self._dirs_lock:
+            self.dirs_to_create = [
+                get_dirs(record[1])[1]
+                for record in records
+                if record[0] == plan.DIR_RECORD and record[2]
+            ]
+
+        stale = 0
+        self.job_pool = JobPool(self.jobs)
+
+        try:
+            with self.job_pool:
+                self.create_dirs()
+
+                files = []
+                src_dir = dst_dir = None
+                for record in records:
+                    kind = record[0]
+
+                    if kind == plan.DIR_RECORD:
+                        src_dir, dst_dir = get_dirs(record[1])
+                        continue
+
+                    if kind == plan.MOVE:
+                        src_file, dst_file = [
+                            os.path.join(self.destination, path)
+                            for path in record[1:]
+                        ]
+                        moved = self.stat_file(dst_file) is not None
+                        if self.stat_file(src_file) is None:
+                            status = None if moved else False
+                        else:
+                            status = not moved
+                    else:
+                        src_file = os.path.join(src_dir, record[1])
+                        dst_file = os.path.join(dst_dir, record[1])
+                        status = self.check_planned(record, src_file, dst_file)
+
+                    if status is None:
+                        continue
+
+                    if not status:
+                        planned_file = src_file
+                        if kind in (plan.REMOVE, plan.PULL):
+                            planned_file = dst_file
+
+                        self._verbose(
+                            "Skipping {k} of {f}, changed since "
+                            "planned".format(k=kind, f=planned_file)
+                        )
+                        stale += 1
+                        continue
+
+                    if kind == plan.MOVE:
+                        self.submit(self.move_file, src_file, dst_file)
+                    elif kind == plan.COPY:
+                        files.append((src_file, dst_file))
+                        if self.costs_store is not None:
+                            self.copy_sizes[src_file] = record[2]
+                    elif kind == plan.REMOVE:
+                        self.submit(self.remove_file, dst_file)
+                    elif kind == plan.PULL:
+                        if self.costs_store is not None:
+                            self.copy_sizes[dst_file] = record[2]
+                        self.submit(self.copy_file, dst_file, src_file)
+
+                self.copy_files(files)
+
+            self.save_costs()
+        finally:
+            self.job_pool = None
+            self.copy_sizes = {}
+            self.close()
+
+        return stale
+
+    def estimate_duration(self, summary, mkdir_count):
+        """
+        Estimate duration of planned operations from operation costs
+        measured against the device in previous runs (recorded in the costs
+        store).
+
+        Jobs are assumed to overlap, i.e. the estimate is divided by the
+        number of jobs.
+
+        :argument summary: planned actions
+        :type summary: PlanSummary
+        :argument mkdir_count: number of directories created one by one,
+        i.e. of leaf directories
+        :type mkdir_count: int
+
+        :returns float or None - seconds, None if any planned operation
+        wasn't measured yet
+
+        """
+        costs = Costs()
+        if self.costs_store is not None:
+            costs = Costs(self.costs_store.get_costs(self.device))
+
+        # pulled files are copied the other way around
+        copies = summary.totals[plan.COPY][0] + summary.totals[plan.PULL][0]
+        copied = summary.totals[plan.COPY][1] + summary.totals[plan.PULL][1]
+
+        seconds = 0.0
+        for operation, count, size in (
+            (COPY_OP, copies, copied),
+            (MOVE_OP, summary.moves, 0),
+            (REMOVE_OP, summary.totals[plan.REMOVE][0], 0),
+            (MKDIR_OP, mkdir_count, 0),
+        ):
+            if not count:
+                continue
+
+            op_seconds = costs.estimate(operation, count, size)
+            if op_seconds is None:
+                return None
+            seconds += op_seconds
+
+        return seconds / max(1, self.jobs)
+
+    def sync_paths(self, changed, removed=()):
+        """
+        Synchronize given source files only, i.e. without walking the source
+        directory and listing destination directories.
+
+        Changed files are copied (overwriting existing ones), removed files
+        are removed from the destination if unmatched files are removed.
+
+        NOTE: transport resources are kept, call `close` when done.
+
+        :argument changed: changed source files absolute paths
+        :type changed: iterable
+        :argument removed: removed source files absolute paths
+        :type removed: iterable
+
+        """
+        # files synchronized this way aren't recorded in the manifest, i.e.
+        # it would be stale
+        if self.manifest:
+            self.remove_manifest()
+
+        self.job_pool = JobPool(self.jobs)
+        dst_dirs = set()
+
+        try:
+            with self.job_pool:
+                files = []
+                for src_file in sorted(changed):
+                    if self.filter.excludes_path(
+                        os.path.relpath(src_file, self.source)
+                    ):
+                        continue
+
+                    # gone (or replaced by a directory) meanwhile
+                    try:
+                        st = os.stat(src_file)
+                    except OSError:
+                        continue
+                    if not stat.S_ISREG(st.st_mode):
+                        continue
+
+                    if self.filter.excludes_stats(st.st_size, st.st_mtime):
+                        continue
+
+                    dst_dir = self.set_destination_subdir_abs(
+                        os.path.dirname(src_file)
+                    )
+                    if dst_dir not in dst_dirs:
+                        dst_dirs.add(dst_dir)
+
+                        if not self.transport.exists(dst_dir):
+                            self._verbose(
+                                "Creating directory {d}".format(d=dst_dir)
+                            )
+                            self.gvfs_wrapper(self.transport.mkdir, dst_dir)
+
+                    dst_file = os.path.join(
+                        dst_dir, os.path.basename(src_file)
+                    )
+                    files.append((src_file, dst_file))
+
+                self.copy_files(files)
+
+                if self.unmatched != REMOVE:
+                    return
+
+                for src_file in sorted(removed):
+                    if self.filter.excludes_path(
+                        os.path.relpath(src_file, self.source)
+                    ):
+                        continue
+
+                    dst_file = os.path.join(
+                        self.set_destination_subdir_abs(
+                            os.path.dirname(src_file)
+                        ),
+                        os.path.basename(src_file),
+                    )
+                    self.submit(self.remove_file, dst_file)
+        finally:
+            self.job_pool = None
+
+    def close(self):
+        """
+        Release resources held while synchronizing.
+        """
+        if self.hasher is not None:
+            self.hasher.close()
+
+        self.transport.close()
+
+    async def gvfs_wrapper_async(self, func, *args):
+        """
+        Wrap asyncio transport operations and handle exceptions which can
+        terminate processing, see `gvfs_wrapper`.
+
+        :argument func: asyncio transport operation to be executed
+        :type func: function
+        :argument *args: function's arguments
+        :type *args:
+
+        """
+        mount_generation = self._mount_generation
+
+        try:
+            await func(*args)
+        except exceptions.BashException as exc:
+            exc_msg = str(exc).strip()
+
+            if exc_msg.endswith("Connection reset by peer"):
+                if self._mount_lock_async is None:
+                    self._mount_lock_async = asyncio.Lock()
+
+                async with self._mount_lock_async:
+                    if mount_generation == self._mount_generation:
+                        await self.transport.mount_async(self.mtp_url)
+                        self._mount_generation += 1
+
+                await func(*args)
+            else:
+                raise exc
+
+    async def copy_file_async(self, src_file, dst_file):
+        """
+        Copy file from src to dst, asyncio version.
+
+        :argument src_file: source file absolute path
+        :type src_file: str
+        :argument dst_file: destination file absolute path
+        :type dst_file: str
+
+        """
+        self._verbose("Copying {s} to {d}".format(s=src_file, d=dst_file))
+
+        started = time.monotonic()
+        await self.gvfs_wrapper_async(
+            self.transport.cp_async, src_file, dst_file
+        )
+        self.add_copy_cost(src_file, time.monotonic() - started)
+
+    async def move_file_async(self, src_file, dst_file):
+        """
+        Move (rename) file on the destination, asyncio version.
+
+        :argument src_file: file absolute path
+        :type src_file: str
+        :argument dst_file: new file absolute path
+        :type dst_file: str
+
+        """
+        self._verbose("Moving {s} to {d}".format(s=src_file, d=dst_file))
+
+        started = time.monotonic()
+        await self.gvfs_wrapper_async(
+            self.transport.mv_async, src_file, dst_file
+        )
+        self.costs.add(MOVE_OP, time.monotonic() - started)
+
+    async def remove_file_async(self, dst_file):
+        """
+        Remove file from the destination, asyncio version.
+
+        :argument dst_file: file absolute path
+        :type dst_file: str
+
+        """
+        self._verbose("Removing {u}".format(u=dst_file))
+
+        started = time.monotonic()
+        await self.gvfs_wrapper_async(self.transport.rm_async, dst_file)
+        self.costs.add(REMOVE_OP, time.monotonic() - started)
+
+    async def sync_async(self):
+        """
+        Synchronize files, asyncio version.
+
+        Up to `jobs` device operations are in flight at the same time. The
+        first failed operation cancels the others and is re-raised.
+
+        NOTE: gathering sync data runs in the default executor, i.e. in a
+        separate thread.
+        """
+        loop = asyncio.get_running_loop()
+        if self.two_way:
+            await loop.run_in_executor(None, self.sync_two_way)
+            return
+
+        semaphore = asyncio.Semaphore(max(1, self.jobs))
+        # asyncio primitives are bound to an event loop, don't reuse them
+        self._mount_lock_async = None
+
+        async def run(func, *args):
+            async with semaphore:
+                await func(*args)
+
+        async def wait(tasks):
+            if not tasks:
+                return
+
+            done, pending = await asyncio.wait(
+                tasks, return_when=asyncio.FIRST_EXCEPTION
+            )
+            for task in pending:
+                task.cancel()
+
+            for task in done:
+                if task.exception() is not None:
+                    if pending:
+                        await asyncio.wait(pending)
+                    raise task.exception()
+
+        sync_data_set = None
+        try:
+            tasks = []
+            sync_data_set = await loop.run_in_executor(
+                None, self.get_sync_data
+            )
+            if self.detect_moves:
+                for src_file, dst_file in self.get_moves(sync_data_set):
+                    tasks.append(
+                        asyncio.ensure_future(
+                            run(self.move_file_async, src_file, dst_file)
+                        )
+                    )
+
+                sync_data_set = [
+                    sd for sd in sync_data_set if sd["src_dir_fls"]
+                ]
+
+            for sync_data in sync_data_set:
+                # all files of the directory may be filtered out
+                if not sync_data["src_dir_fls"]:
+                    self._verbose("No files to sync")
+                    continue
+
+                files = self.get_files_to_copy(sync_data)
+                for src_file, dst_file in files:
+                    tasks.append(
+                        asyncio.ensure_future(
+                            run(self.copy_file_async, src_file, dst_file)
+                        )
+                    )
+
+                # skip any other actions if unmatched files are ignored
+                if self.unmatched == IGNORE:
+                    continue
 
-            self.handle_destination_dir_data(sync_data)
+                for action in sync_data["plan"].get(plan.REMOVE):
+                    tasks.append(
+                        asyncio.ensure_future(
+                            run(self.remove_file_async, action.dst_file)
+                        )
+                    )
+
+                for action in sync_data["plan"].get(plan.PULL):
+                    coro_args = (
+                        self.copy_file_async,
+                        action.dst_file,
+                        action.src_file,
+                    )
+                    tasks.append(asyncio.ensure_future(run(*coro_args)))
+
+            await wait(tasks)
+
+            self.save_state()
+            if self.manifest:
+                self.save_manifest()
+        finally:
+            if self.spill_plan and sync_data_set is not None:
+                sync_data_set.close()
+            self.close()
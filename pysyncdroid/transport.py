@@ -0,0 +1,598 @@
+"""Transports, i.e. the ways of listing and manipulating files"""
+
+
+import asyncio
+from collections import namedtuple
+import os
+import shutil
+import threading
+import time
+
+from pysyncdroid import find
+from pysyncdroid import fuse
+from pysyncdroid import gio
+from pysyncdroid import gvfs
+from pysyncdroid import hashing
+from pysyncdroid.helper import Helper
+
+
+#: constants
+# transport names
+GVFS = "gvfs"
+FUSE = "fuse"
+GIO = "gio"
+HELPER = "helper"
+LOCAL = "local"
+
+
+# directory entry with its stat data
+FileInfo = namedtuple(
+    "FileInfo", ["name", "size", "mtime", "is_dir", "is_link"]
+)
+FileInfo.__new__.__defaults__ = (False,)
+
+
+class Transport(object):
+    #: flag to copy files sharing a destination directory via `cp_batch`
+    batch_copy = False
+
+    def __init__(self, log=None):
+        """
+        Base class for transports.
+
+        Files are listed and stat-ed directly, i.e. on the computer or via
+        the gvfs FUSE mount. Subclasses implement file operations.
+
+        :argument log: function to report what is going on
+        :type log: function or None
+
+        """
+        self.log = log
+
+    def _log(self, message):
+        """
+        Report a message if there is somebody listening.
+
+        :argument message: message to report
+        :type message: str
+
+        """
+        if self.log is not None:
+            self.log(message)
+
+    def scandir(self, path):
+        """
+        ls -l
+
+        :argument path: directory path
+        :type path: str
+
+        :returns list of FileInfo
+
+        """
+        return [FileInfo(*entry) for entry in fuse.scandir(path)]
+
+    def scan(self, path):
+        """
+        ls -l, if the directory exists
+
+        Directory presence, its entries and their stat data are collected in
+        a single listing, i.e. without a round trip per file on the device.
+
+        :argument path: directory path
+        :type path: str
+
+        :returns list of FileInfo or None
+
+        """
+        try:
+            return self.scandir(path)
+        except FileNotFoundError:
+            return None
+
+    def scan_tree(self, path):
+        """
+        ls -lR, if the directory exists
+
+        The whole directory tree is listed by a single command instead of a
+        command per directory. Each directory is still read, i.e. on the
+        device it still takes an MTP round trip.
+
+        :argument path: directory path
+        :type path: str
+
+        :returns dict or None - relative dir path to a list of FileInfo
+
+        """
+        if not self.exists(path):
+            return None
+
+        return {
+            rel_dir: [FileInfo(*entry) for entry in entries]
+            for rel_dir, entries in find.scan_tree(path).items()
+        }
+
+    def exists(self, path):
+        """
+        test -e
+
+        :argument path: file/directory path
+        :type path: str
+
+        :returns bool
+
+        """
+        return os.path.exists(path)
+
+    def stat(self, path):
+        """
+        stat
+
+        :argument path: file/directory path
+        :type path: str
+
+        :returns tuple - size, modification time and a directory flag
+
+        """
+        return fuse.stat(path)
+
+    def fingerprint(self, path):
+        """
+        Read file quick fingerprint, see `hashing.fingerprint`.
+
+        :argument path: file path
+        :type path: str
+
+        :returns str
+
+        """
+        return hashing.fingerprint(path)
+
+    def cp(self, src, dst):
+        """
+        cp
+
+        :argument src: source file to be copied
+        :type src: str
+        :argument dst: destination file/directory
+        :type dst: str
+
+        """
+        raise NotImplementedError
+
+    def cp_batch(self, srcs, dst_dir):
+        """
+        cp SRC... DIR
+
+        :argument srcs: source files to be copied
+        :type srcs: list
+        :argument dst_dir: destination directory
+        :type dst_dir: str
+
+        :returns dict - failed source file to error message
+
+        """
+        raise NotImplementedError
+
+    def mkdir(self, path):
+        """
+        mkdir -p
+
+        :argument path: new directory path
+        :type path: str
+
+        """
+        raise NotImplementedError
+
+    def mkdir_batch(self, paths):
+        """
+        mkdir -p DIR...
+
+        :argument paths: new directories paths
+        :type paths: list
+
+        """
+        for path in paths:
+            self.mkdir(path)
+
+    def mv(self, src, dst):
+        """
+        mv
+
+        :argument src: file to be moved
+        :type src: str
+        :argument dst: destination file
+        :type dst: str
+
+        """
+        raise NotImplementedError
+
+    def rm(self, src):
+        """
+        rm -f
+
+        :argument src: file to be removed
+        :type src: str
+
+        """
+        raise NotImplementedError
+
+    def mount(self, mtp_url):
+        """
+        mount
+
+        :argument mtp_url: device MTP URL
+        :type mtp_url: str
+
+        """
+
+    def close(self):
+        """
+        Release resources held by the transport (if any).
+        """
+
+    async def cp_async(self, src, dst):
+        """
+        cp, asyncio version
+
+        NOTE: runs `cp` in the default executor unless overridden.
+
+        :argument src: source file to be copied
+        :type src: str
+        :argument dst: destination file/directory
+        :type dst: str
+
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.cp, src, dst)
+
+    async def mv_async(self, src, dst):
+        """
+        mv, asyncio version
+
+        :argument src: file to be moved
+        :type src: str
+        :argument dst: destination file
+        :type dst: str
+
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.mv, src, dst)
+
+    async def rm_async(self, src):
+        """
+        rm -f, asyncio version
+
+        :argument src: file to be removed
+        :type src: str
+
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.rm, src)
+
+    async def mount_async(self, mtp_url):
+        """
+        mount, asyncio version
+
+        :argument mtp_url: device MTP URL
+        :type mtp_url: str
+
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.mount, mtp_url)
+
+
+class GvfsTransport(Transport):
+    """
+    File operations executed by gvfs-tools, one process per operation.
+    """
+
+    def cp(self, src, dst):
+        gvfs.cp(src, dst)
+
+    def mkdir(self, path):
+        gvfs.mkdir(path)
+
+    def mkdir_batch(self, paths):
+        gvfs.mkdir_batch(paths)
+
+    def mv(self, src, dst):
+        gvfs.mv(src, dst)
+
+    def rm(self, src):
+        gvfs.rm(src)
+
+    def mount(self, mtp_url):
+        gvfs.mount(mtp_url)
+
+    async def cp_async(self, src, dst):
+        await gvfs.cp_async(src, dst)
+
+    async def mv_async(self, src, dst):
+        await gvfs.mv_async(src, dst)
+
+    async def rm_async(self, src):
+        await gvfs.rm_async(src)
+
+    async def mount_async(self, mtp_url):
+        await gvfs.mount_async(mtp_url)
+
+
+class GioTransport(GvfsTransport):
+    """
+    Files copied by `gio`, in batches per destination directory.
+    """
+
+    batch_copy = True
+
+    def cp(self, src, dst):
+        gio.cp(src, dst)
+
+    def cp_batch(self, srcs, dst_dir):
+        return gio.cp_batch(srcs, dst_dir)
+
+    def mv(self, src, dst):
+        gio.mv(src, dst)
+
+    async def cp_async(self, src, dst):
+        await gio.cp_async(src, dst)
+
+    async def mv_async(self, src, dst):
+        await Transport.mv_async(self, src, dst)
+
+
+class FuseTransport(GvfsTransport):
+    """
+    File operations executed in-process over the gvfs FUSE mount, falling
+    back to gvfs-tools when the FUSE mount fails us.
+    """
+
+    def _fuse_or_gvfs(self, name, *args):
+        """
+        Execute an operation via FUSE, fall back to gvfs-tools on failure.
+
+        :argument name: operation name
+        :type name: str
+        :argument *args: operation's arguments
+        :type *args:
+
+        """
+        try:
+            getattr(fuse, name)(*args)
+        except OSError as exc:
+            self._log(
+                "FUSE {n} failed ({e}), falling back to gvfs".format(
+                    n=name, e=exc
+                )
+            )
+            getattr(gvfs, name)(*args)
+
+    def cp(self, src, dst):
+        self._fuse_or_gvfs("cp", src, dst)
+
+    def mkdir(self, path):
+        self._fuse_or_gvfs("mkdir", path)
+
+    def mkdir_batch(self, paths):
+        Transport.mkdir_batch(self, paths)
+
+    def mv(self, src, dst):
+        self._fuse_or_gvfs("mv", src, dst)
+
+    def rm(self, src):
+        self._fuse_or_gvfs("rm", src)
+
+    async def cp_async(self, src, dst):
+        await Transport.cp_async(self, src, dst)
+
+    async def mv_async(self, src, dst):
+        await Transport.mv_async(self, src, dst)
+
+    async def rm_async(self, src):
+        await Transport.rm_async(self, src)
+
+
+class HelperTransport(GvfsTransport):
+    """
+    File operations executed by a long-lived helper process.
+    """
+
+    def __init__(self, log=None):
+        super(HelperTransport, self).__init__(log=log)
+        self.helper = None
+        self._helper_lock = threading.Lock()
+
+    def _get_helper(self):
+        """
+        Get the helper, create it on the first use.
+
+        :returns Helper
+
+        """
+        with self._helper_lock:
+            if self.helper is None:
+                self.helper = Helper()
+
+        return self.helper
+
+    def scandir(self, path):
+        return [FileInfo(*e) for e in self._get_helper().scandir(path)]
+
+    def scan(self, path):
+        # helper errors don't tell a missing directory apart
+        if not self.exists(path):
+            return None
+
+        return self.scandir(path)
+
+    def stat(self, path):
+        return self._get_helper().stat(path)
+
+    def cp(self, src, dst):
+        self._get_helper().cp(src, dst)
+
+    def mkdir(self, path):
+        self._get_helper().mkdir(path)
+
+    def mkdir_batch(self, paths):
+        Transport.mkdir_batch(self, paths)
+
+    def mv(self, src, dst):
+        self._get_helper().mv(src, dst)
+
+    def rm(self, src):
+        self._get_helper().rm(src)
+
+    def close(self):
+        with self._helper_lock:
+            if self.helper is not None:
+                self.helper.close()
+                self.helper = None
+
+    async def cp_async(self, src, dst):
+        await Transport.cp_async(self, src, dst)
+
+    async def mv_async(self, src, dst):
+        await Transport.mv_async(self, src, dst)
+
+    async def rm_async(self, src):
+        await Transport.rm_async(self, src)
+
+
+class LocalTransport(Transport):
+    """
+    File operations on the plain local filesystem.
+    """
+
+    def cp(self, src, dst):
+        if os.path.isdir(dst):
+            dst = os.path.join(dst, os.path.basename(src))
+
+        shutil.copyfile(src, dst)
+
+    def mkdir(self, path):
+        fuse.mkdir(path)
+
+    def mv(self, src, dst):
+        fuse.mv(src, dst)
+
+    def rm(self, src):
+        fuse.rm(src)
+
+
+class SimulatedTransport(LocalTransport):
+    def __init__(self, latency=0.0, throughput=None, log=None):
+        """
+        Local filesystem transport simulating device costs, i.e. sleeping
+        for a fixed latency per call and capping copy throughput.
+
+        Calls are counted per operation in `calls`.
+
+        :argument latency: per call latency in seconds
+        :type latency: float
+        :argument throughput: copy throughput cap in bytes per second
+        :type throughput: int or None
+        :argument log: function to report what is going on
+        :type log: function or None
+
+        """
+        super(SimulatedTransport, self).__init__(log=log)
+
+        self.latency = latency
+        self.throughput = throughput
+
+        self.calls = {}
+        self._calls_lock = threading.Lock()
+
+    def _call(self, name, size=0):
+        """
+        Simulate a call cost.
+
+        :argument name: operation name
+        :type name: str
+        :argument size: number of transferred bytes
+        :type size: int
+
+        """
+        with self._calls_lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+        delay = self.latency
+        if size and self.throughput:
+            delay += size / float(self.throughput)
+
+        if delay:
+            time.sleep(delay)
+
+    def scandir(self, path):
+        self._call("listdir")
+        return super(SimulatedTransport, self).scandir(path)
+
+    def scan_tree(self, path):
+        tree = super(SimulatedTransport, self).scan_tree(path)
+        # a single command, but each listed directory is still a round trip
+        for _ in tree or ():
+            self._call("listdir")
+        return tree
+
+    def exists(self, path):
+        self._call("stat")
+        return super(SimulatedTransport, self).exists(path)
+
+    def stat(self, path):
+        self._call("stat")
+        return super(SimulatedTransport, self).stat(path)
+
+    def fingerprint(self, path):
+        self._call("read", 2 * hashing.FINGERPRINT_SIZE)
+        return super(SimulatedTransport, self).fingerprint(path)
+
+    def cp(self, src, dst):
+        self._call("cp", os.path.getsize(src))
+        super(SimulatedTransport, self).cp(src, dst)
+
+    def mkdir(self, path):
+        self._call("mkdir")
+        super(SimulatedTransport, self).mkdir(path)
+
+    def mv(self, src, dst):
+        self._call("mv")
+        super(SimulatedTransport, self).mv(src, dst)
+
+    def rm(self, src):
+        self._call("rm")
+        super(SimulatedTransport, self).rm(src)
+
+
+TRANSPORTS = {
+    GVFS: GvfsTransport,
+    FUSE: FuseTransport,
+    GIO: GioTransport,
+    HELPER: HelperTransport,
+    LOCAL: LocalTransport,
+}
+
+
+def get_transport(transport, log=None):
+    """
+    Get transport instance.
+
+    :argument transport: transport name or instance
+    :type transport: str or Transport
+    :argument log: function to report what is going on
+    :type log: function or None
+
+    :returns Transport
+
+    """
+    if isinstance(transport, Transport):
+        return transport
+
+    try:
+        return TRANSPORTS[transport](log=log)
+    except KeyError:
+        raise ValueError(
+            'Unknown transport "{t}", use one of: {ts}'.format(
+                t=transport, ts=", ".join(sorted(TRANSPORTS))
+            )
+        )
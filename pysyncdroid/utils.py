@@ -1,11 +1,81 @@
 """Shared functionality and constants"""
 
 
+import asyncio
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    FIRST_EXCEPTION,
+    ThreadPoolExecutor,
+    wait,
+)
+import os
+import queue
 import subprocess
+import tempfile
+import threading
 
 from pysyncdroid.exceptions import BashException
 
 
+#: constants
+# size of output chunks read from a streamed bash command
+READ_SIZE = 64 * 1024
+
+
+def _handle_bash_output(cmd, out, err):
+    """
+    Handle bash command output.
+
+    :argument cmd: bash command
+    :type cmd: list
+    :argument out: command standard output
+    :type out: bytes
+    :argument err: command standard error output
+    :type err: bytes
+
+    :returns str
+
+    """
+    if err:
+        try:
+            err = err.decode("utf-8")
+        except AttributeError:
+            pass
+
+        # TODO use `gio` over `gvfs-*`.
+        # This started to manifest on Ubuntu 18.04.
+        if not err.startswith("This tool has been deprecated"):
+            exc_msg = 'Command "{cmd}" failed: {err}'.format(
+                cmd=" ".join(cmd), err=err
+            )
+            raise BashException(exc_msg)
+
+    try:
+        out = out.decode("utf-8")
+    except AttributeError:
+        pass
+
+    return out.strip()
+
+
+def _bash_oserror(cmd, exc):
+    """
+    Create an OSError for a command which couldn't be executed.
+
+    :argument cmd: bash command
+    :type cmd: list
+    :argument exc: original error
+    :type exc: OSError
+
+    :returns OSError
+
+    """
+    exc_msg = 'Error while trying to execute command "{cmd}": {exc}'.format(
+        cmd=" ".join(cmd), exc=exc.strerror
+    )
+    return OSError(exc_msg)
+
+
 def run_bash_cmd(cmd):
     """
     Run bash command.
@@ -16,37 +86,338 @@ def run_bash_cmd(cmd):
     :returns str
 
     """
-    _cmd = " ".join(cmd)
-
     try:
         bash_cmd = subprocess.Popen(
             cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE
         )
 
         out, err = bash_cmd.communicate()
-        if err:
+        return _handle_bash_output(cmd, out, err)
+
+    except OSError as exc:
+        raise _bash_oserror(cmd, exc)
+
+
+async def run_bash_cmd_async(cmd):
+    """
+    Run bash command without blocking the event loop.
+
+    :argument cmd: bash command
+    :type cmd: list
+
+    :returns str
+
+    """
+    try:
+        bash_cmd = await asyncio.create_subprocess_exec(
+            *cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+    except OSError as exc:
+        raise _bash_oserror(cmd, exc)
+
+    try:
+        out, err = await bash_cmd.communicate()
+    except asyncio.CancelledError:
+        bash_cmd.kill()
+        # reap the killed process
+        await bash_cmd.wait()
+        raise
+
+    return _handle_bash_output(cmd, out, err)
+
+
+def iter_bash_cmd(cmd, separator="\n"):
+    """
+    Run bash command, stream its output, i.e. yield output records while
+    the command is still running.
+
+    NOTE: errors are reported once the whole output is consumed.
+
+    :argument cmd: bash command
+    :type cmd: list
+    :argument separator: output records separator
+    :type separator: str
+
+    :returns generator - output records
+
+    """
+    separator = separator.encode("utf-8")
+
+    # error output isn't read until the command finishes, i.e. it mustn't
+    # fill up a pipe meanwhile
+    with tempfile.TemporaryFile() as err_file:
+        try:
+            bash_cmd = subprocess.Popen(
+                cmd, stdout=subprocess.PIPE, stderr=err_file
+            )
+        except OSError as exc:
+            raise _bash_oserror(cmd, exc)
+
+        rest = b""
+        try:
+            for chunk in iter(lambda: bash_cmd.stdout.read(READ_SIZE), b""):
+                records = (rest + chunk).split(separator)
+                rest = records.pop()
+                for record in records:
+                    yield record.decode("utf-8", "surrogateescape")
+        except GeneratorExit:
+            # abandoned half way
+            bash_cmd.kill()
+            raise
+        finally:
+            bash_cmd.stdout.close()
+            bash_cmd.wait()
+
+        if rest:
+            yield rest.decode("utf-8", "surrogateescape")
+
+        err_file.seek(0)
+        _handle_bash_output(cmd, b"", err_file.read())
+
+
+class JobPool(object):
+    def __init__(self, jobs=1):
+        """
+        Bounded pool of worker threads running jobs concurrently.
+
+        Jobs are executed right away in the calling thread if `jobs` is 1.
+        The first failed job stops the pool, i.e. no new jobs are accepted,
+        pending jobs are cancelled and the error is re-raised (from `submit`
+        or when leaving the pool context).
+
+        :argument jobs: max number of jobs running at the same time
+        :type jobs: int
+
+        """
+        self.jobs = max(1, jobs)
+
+        self._executor = None
+        self._futures = set()
+        self._futures_lock = threading.Lock()
+        # don't queue more jobs than workers can pick up soon
+        self._slots = threading.BoundedSemaphore(self.jobs * 2)
+
+        if self.jobs > 1:
+            self._executor = ThreadPoolExecutor(max_workers=self.jobs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._shutdown()
+
+    def _job_done(self, future):
+        """
+        Release job slot.
+
+        :argument future: finished job
+        :type future: Future
+
+        """
+        self._slots.release()
+
+        if future.cancelled() or future.exception() is None:
+            with self._futures_lock:
+                self._futures.discard(future)
+
+    def _raise_error(self):
+        """
+        Re-raise the first error of finished jobs (if any).
+        """
+        with self._futures_lock:
+            futures = list(self._futures)
+
+        for future in futures:
+            if future.done() and not future.cancelled():
+                exc = future.exception()
+                if exc is not None:
+                    self._shutdown()
+                    raise exc
+
+    def _shutdown(self):
+        """
+        Cancel pending jobs and wait for the running ones.
+        """
+        if self._executor is None:
+            return
+
+        with self._futures_lock:
+            futures = list(self._futures)
+
+        for future in futures:
+            future.cancel()
+
+        self._executor.shutdown(wait=True)
+
+    def submit(self, func, *args):
+        """
+        Run a job.
+
+        :argument func: function to be executed
+        :type func: function
+        :argument *args: function's arguments
+        :type *args:
+
+        """
+        if self._executor is None:
+            func(*args)
+            return
+
+        self._raise_error()
+
+        self._slots.acquire()
+        future = self._executor.submit(func, *args)
+        with self._futures_lock:
+            self._futures.add(future)
+        future.add_done_callback(self._job_done)
+
+    def close(self):
+        """
+        Wait for all jobs to finish.
+        """
+        if self._executor is None:
+            return
+
+        with self._futures_lock:
+            futures = list(self._futures)
+
+        wait(futures, return_when=FIRST_EXCEPTION)
+        self._raise_error()
+        self._executor.shutdown(wait=True)
+
+
+def leaf_paths(paths):
+    """
+    Reduce paths to the leaf ones, i.e. drop paths which are parents of
+    other paths.
+
+    :argument paths: absolute paths
+    :type paths: iterable
+
+    :returns list - leaf paths, in the given order
+
+    """
+    paths = list(dict.fromkeys(paths))
+    parents = set()
+
+    for path in paths:
+        parent = os.path.dirname(path)
+        while parent not in parents and parent != path:
+            parents.add(parent)
+            path, parent = parent, os.path.dirname(parent)
+
+    return [path for path in paths if path not in parents]
+
+
+def walk_tree(visit, top, jobs=1):
+    """
+    Walk a tree, visiting up to `jobs` nodes (e.g. listing directories) at
+    the same time.
+
+    Nodes are visited depth-first in the calling thread if `jobs` is 1.
+    Otherwise sibling subtrees are visited concurrently and results are
+    yielded as they complete - a node's result always precedes its
+    children's. The first error stops the walk and is re-raised.
+
+    :argument visit: function getting a node and returning its result and
+    a list of its children
+    :type visit: function
+    :argument top: tree root node
+    :type top:
+    :argument jobs: max number of nodes visited at the same time
+    :type jobs: int
+
+    :returns generator - nodes results
+
+    """
+    if jobs <= 1:
+        nodes = [top]
+        while nodes:
+            result, children = visit(nodes.pop())
+            yield result
+
+            # visit children in the given order
+            nodes.extend(reversed(children))
+
+        return
+
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        futures = {executor.submit(visit, top)}
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                result, children = future.result()
+                futures.update(executor.submit(visit, c) for c in children)
+                yield result
+    finally:
+        # the walk may be abandoned half way, don't visit the rest
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def iter_in_thread(iterable, maxsize):
+    """
+    Iterate over an iterable in a producer thread, i.e. produce up to
+    `maxsize` items ahead of their consumption.
+
+    A producer error is re-raised once the items produced before it are
+    consumed. Closing the returned generator stops the producer.
+
+    :argument iterable: items producer
+    :type iterable: iterable
+    :argument maxsize: max number of items produced ahead
+    :type maxsize: int
+
+    :returns generator
+
+    """
+    items = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+    # marks the end of items
+    done = object()
+
+    def put(item, error=None):
+        while not stop.is_set():
             try:
-                err = err.decode("utf-8")
-            except AttributeError:
-                pass
-
-            # TODO use `gio` over `gvfs-*`.
-            # This started to manifest on Ubuntu 18.04.
-            if not err.startswith("This tool has been deprecated"):
-                exc_msg = 'Command "{cmd}" failed: {err}'.format(
-                    cmd=_cmd, err=err
-                )
-                raise BashException(exc_msg)
+                items.put((item, error), timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+
+        return False
 
+    def produce():
         try:
-            out = out.decode("utf-8")
-        except AttributeError:
-            pass
+            for item in iterable:
+                if not put(item):
+                    return
+        except Exception as exc:
+            put(done, exc)
+        else:
+            put(done)
+        finally:
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
 
-        return out.strip()
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
 
-    except OSError as exc:
-        exc_msg = 'Error while trying to execute command "{cmd}": {exc}'.format(
-            cmd=_cmd, exc=exc.strerror
-        )
-        raise OSError(exc_msg)
+    try:
+        while True:
+            item, error = items.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+
+            yield item
+    finally:
+        stop.set()
+        producer.join()
@@ -0,0 +1,352 @@
+"""Continuous synchronization driven by inotify events"""
+
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+
+
+#: constants
+# inotify event masks, see inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+# events telling a file is ready to be copied or is gone
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
+
+# struct inotify_event without the trailing (variable length) name
+EVENT_HEADER = struct.Struct("iIII")
+EVENT_BUFFER_SIZE = 64 * 1024
+
+# wait for events to stop coming for this long (in seconds) before
+# synchronizing, e.g. while a camera import writes hundreds of files
+DEBOUNCE = 2.0
+# but don't postpone synchronizing forever
+MAX_BATCH_DELAY = 60.0
+
+
+class Inotify(object):
+    def __init__(self):
+        """
+        Minimal ctypes wrapper for the Linux inotify API.
+        """
+        self._libc = ctypes.CDLL(
+            ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+        )
+
+        self.fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            self._raise_oserror()
+
+        # watch descriptor to a watched directory path and vice versa
+        self.paths = {}
+        self.wds = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _raise_oserror(self, path=None):
+        """
+        Raise OSError for the last failed libc call.
+
+        :argument path: path the call failed for
+        :type path: str or None
+
+        """
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err), path)
+
+    def close(self):
+        """
+        Stop watching.
+        """
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+        self.paths = {}
+        self.wds = {}
+
+    def add_watch(self, path):
+        """
+        Watch a directory.
+
+        :argument path: directory path
+        :type path: str
+
+        """
+        wd = self._libc.inotify_add_watch(
+            self.fd, os.fsencode(path), WATCH_MASK | IN_ONLYDIR
+        )
+        if wd < 0:
+            self._raise_oserror(path)
+
+        self.paths[wd] = path
+        self.wds[path] = wd
+
+    def add_tree(self, top):
+        """
+        Watch a directory tree.
+
+        NOTE: directories which disappear meanwhile are skipped.
+
+        :argument top: directory tree root
+        :type top: str
+
+        """
+        for root, _, _ in os.walk(top):
+            try:
+                self.add_watch(root)
+            except OSError as exc:
+                if exc.errno not in (errno.ENOENT, errno.ENOTDIR):
+                    raise
+
+    def remove_tree(self, top):
+        """
+        Stop watching a directory tree, e.g. moved out of the watched tree.
+
+        :argument top: directory tree root
+        :type top: str
+
+        """
+        prefix = top + os.sep
+
+        for path in list(self.wds):
+            if path == top or path.startswith(prefix):
+                wd = self.wds.pop(path)
+                self.paths.pop(wd, None)
+                # fails for already removed directories, nothing to do then
+                self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout=None):
+        """
+        Read available events, wait for them if necessary.
+
+        :argument timeout: max number of seconds to wait, forever if None
+        :type timeout: float or None
+
+        :returns list - (path, mask) tuples
+
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        data = os.read(self.fd, EVENT_BUFFER_SIZE)
+        events = []
+        offset = 0
+
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_IGNORED:
+                # watched directory is gone
+                path = self.paths.pop(wd, None)
+                if path is not None:
+                    self.wds.pop(path, None)
+                continue
+
+            path = self.paths.get(wd)
+            if path is None and not mask & IN_Q_OVERFLOW:
+                continue
+
+            if name:
+                path = os.path.join(path, os.fsdecode(name))
+
+            events.append((path, mask))
+
+        return events
+
+
+class Watcher(object):
+    def __init__(
+        self,
+        syncs,
+        debounce=DEBOUNCE,
+        max_batch_delay=MAX_BATCH_DELAY,
+        inotify=None,
+    ):
+        """
+        Keep synchronizing computer side source directories as their files
+        change, i.e. without re-scanning them.
+
+        Bursts of events are coalesced to batches, a batch is synchronized
+        once no event came for `debounce` seconds. If events are lost (or a
+        directory is moved away) the affected source is synchronized in full.
+
+        :argument syncs: Sync instances with computer side sources
+        :type syncs: list
+        :argument debounce: number of quiet seconds closing a batch
+        :type debounce: float
+        :argument max_batch_delay: max number of seconds a batch is open
+        :type max_batch_delay: float
+        :argument inotify: inotify instance, created if not given
+        :type inotify: Inotify or None
+
+        """
+        for sync in syncs:
+            if "mtp:host" in sync.source:
+                raise ValueError(
+                    'Can\'t watch "{s}", only sources on computer can be '
+                    "watched.".format(s=sync.source)
+                )
+
+        self.syncs = syncs
+        self.debounce = debounce
+        self.max_batch_delay = max_batch_delay
+        self.inotify = inotify or Inotify()
+
+        for sync in syncs:
+            self.inotify.add_tree(sync.source)
+
+    def close(self):
+        """
+        Stop watching and release resources held by syncs.
+        """
+        self.inotify.close()
+
+        for sync in self.syncs:
+            sync.close()
+
+    def get_sync(self, path):
+        """
+        Get Sync instance whose source contains a given path.
+
+        :argument path: file/directory path
+        :type path: str
+
+        :returns Sync or None
+
+        """
+        for sync in self.syncs:
+            if path == sync.source or path.startswith(sync.source + os.sep):
+                return sync
+
+    def wait_batch(self, timeout=None):
+        """
+        Wait for events and collect them until they stop coming.
+
+        :argument timeout: max number of seconds to wait for the first event,
+        forever if None
+        :type timeout: float or None
+
+        :returns list - (path, mask) tuples
+
+        """
+        events = self.inotify.read_events(timeout)
+        if not events:
+            return events
+
+        batch_end = time.time() + self.max_batch_delay
+
+        while True:
+            wait = min(self.debounce, batch_end - time.time())
+            if wait <= 0:
+                break
+
+            more_events = self.inotify.read_events(wait)
+            if not more_events:
+                break
+
+            events.extend(more_events)
+
+        return events
+
+    def handle_events(self, events):
+        """
+        Coalesce events to changed and removed files.
+
+        :argument events: (path, mask) tuples
+        :type events: list
+
+        :returns tuple - changed files, removed files and a flag whether the
+        full sync is needed, all per Sync instance
+
+        """
+        changed = {sync: set() for sync in self.syncs}
+        removed = {sync: set() for sync in self.syncs}
+        rescan = {sync: False for sync in self.syncs}
+
+        for path, mask in events:
+            if mask & IN_Q_OVERFLOW:
+                # events were lost
+                rescan = {sync: True for sync in self.syncs}
+                continue
+
+            sync = self.get_sync(path)
+            if sync is None:
+                continue
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # watch the new subtree and pick files created before
+                    # the watch was in place
+                    self.inotify.add_tree(path)
+                    for root, _, files in os.walk(path):
+                        for f in files:
+                            changed[sync].add(os.path.join(root, f))
+                elif mask & IN_MOVED_FROM:
+                    # files of a moved away directory are not reported
+                    self.inotify.remove_tree(path)
+                    rescan[sync] = True
+
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                changed[sync].add(path)
+                removed[sync].discard(path)
+
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                removed[sync].add(path)
+                changed[sync].discard(path)
+
+        return changed, removed, rescan
+
+    def sync_batch(self, events):
+        """
+        Synchronize files changed (or removed) according to events.
+
+        :argument events: (path, mask) tuples
+        :type events: list
+
+        """
+        changed, removed, rescan = self.handle_events(events)
+
+        for sync in self.syncs:
+            if rescan[sync]:
+                sync.sync()
+            elif changed[sync] or removed[sync]:
+                sync.sync_paths(changed[sync], removed[sync])
+
+    def run(self, timeout=None):
+        """
+        Keep synchronizing batches of events.
+
+        :argument timeout: return if no event came for this many seconds,
+        never if None
+        :type timeout: float or None
+
+        """
+        while True:
+            events = self.wait_batch(timeout)
+            if not events:
+                return
+
+            self.sync_batch(events)
@@ -3,13 +3,16 @@ import getpass
 from io import StringIO
 import os
 import pwd
+import sqlite3
 import sys
 import tempfile
 import unittest
-from unittest.mock import patch
+from unittest.mock import ANY, patch
 
 from pysyncdroid import cli
-from pysyncdroid.exceptions import MappingFileException
+from pysyncdroid.exceptions import MappingFileException, SyncException
+from pysyncdroid.plan import PlanSummary, write_plan_header, write_plan_record
+from pysyncdroid.state import STATE_DB_PATH, StateStore
 
 
 class TestCli(unittest.TestCase):
@@ -17,6 +20,11 @@ class TestCli(unittest.TestCase):
     def setUpClass(cls):
         cls.parser = cli.create_parser()
 
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.state_db = os.path.join(tmp_dir.name, "state.db")
+
     @patch("sys.stderr", new=StringIO())
     def test_parser_no_args(self):
         """
@@ -33,9 +41,18 @@ class TestCli(unittest.TestCase):
         args = self.parser.parse_args(cmd)
         self.assertEqual(
             str(args),
-            "Namespace(destination=None, file=None, ignore_file_type=None, "
-            "model='model', overwrite=False, source=None, unmatched='ignore', "
-            "vendor='vendor', verbose=False)",
+            "Namespace(apply_plan=None, backend='gvfs', bulk_list=False, "
+            "checksum=False, debounce=2.0, destination=None, "
+            "detect_moves=False, dry_run=False, file=None, "
+            "filter_rules=None, ignore_file_type=None, incremental=False, "
+            "jobs=1, manifest=False, max_age=None, max_size=None, "
+            "min_age=None, min_size=None, model='model', mtime_tolerance=2.0, "
+            "overwrite=False, rescan=False, save_plan=None, source=None, "
+            "spill_plan=False, state_db='{}', trust_state=False, "
+            "two_way=False, unmatched='ignore', update=False, "
+            "vendor='vendor', verbose=False, watch=False)".format(
+                STATE_DB_PATH
+            ),
         )
 
     @patch("sys.stderr", new=StringIO())
@@ -67,6 +84,67 @@ class TestCli(unittest.TestCase):
         args = self.parser.parse_args(cmd)
         self.assertIn("ignore_file_type=['txt', 'html']", str(args))
 
+    def test_parser_filter_rules(self):
+        """
+        Test `exclude` and `include` arguments are collected in the given
+        order.
+        """
+        cmd = (
+            "-M model -V vendor --exclude *.tmp cache/ --include keep.tmp "
+            "--exclude /Android/data/"
+        ).split(" ")
+        args = self.parser.parse_args(cmd)
+        self.assertEqual(
+            args.filter_rules,
+            ["*.tmp", "cache/", "!keep.tmp", "/Android/data/"],
+        )
+
+    @patch("sys.stderr", new=StringIO())
+    def test_parser_limits(self):
+        """
+        Test handling size and age limits arguments.
+        """
+        cmd = "-M model -V vendor --min-size 100 --max-size 2G --max-age 7"
+        args = self.parser.parse_args(cmd.split(" "))
+        self.assertEqual(args.min_size, 100)
+        self.assertEqual(args.max_size, 2 * 1024**3)
+        self.assertEqual(args.max_age, 7.0)
+        self.assertEqual(cli.days_to_seconds(args.max_age), 7 * 86400)
+        self.assertIsNone(cli.days_to_seconds(args.min_age))
+
+        self.assertEqual(cli.size("500K"), 500 * 1024)
+        with self.assertRaises(SystemExit):
+            cmd = "-M model -V vendor --max-size 1T".split(" ")
+            self.parser.parse_args(cmd)
+
+    @patch("sys.stderr", new=StringIO())
+    def test_parser_jobs(self):
+        """
+        Test handling `jobs` argument.
+        """
+        cmd = "-M model -V vendor -j 4".split(" ")
+        args = self.parser.parse_args(cmd)
+        self.assertIn("jobs=4", str(args))
+
+        for jobs in ("0", "foo"):
+            with self.assertRaises(SystemExit):
+                cmd = "-M model -V vendor -j {}".format(jobs).split(" ")
+                self.parser.parse_args(cmd)
+
+    @patch("sys.stderr", new=StringIO())
+    def test_parser_state(self):
+        """
+        Test `trust-state` and `rescan` arguments exclude each other.
+        """
+        cmd = "-M model -V vendor --trust-state".split(" ")
+        args = self.parser.parse_args(cmd)
+        self.assertTrue(args.trust_state)
+        self.assertFalse(args.rescan)
+
+        with self.assertRaises(SystemExit):
+            cmd = "-M model -V vendor --trust-state --rescan".split(" ")
+            self.parser.parse_args(cmd)
+
     def test_sync_info_missing(self):
         """
         Test mising sync info raises `ArgumentError`.
@@ -116,6 +194,34 @@ class TestCli(unittest.TestCase):
             destinations, ["Card/Music/Compilations/Rock", "Card/Music/Band1"]
         )
 
+    def test_mapping_filter_rules(self):
+        """
+        Test filter rules are taken from mapping file.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mapping_file = os.path.join(tmp_dir, "mapping.txt")
+            with open(mapping_file, "w") as f:
+                f.write(
+                    "- .thumbnails/\n"
+                    "/src/a==>Card/a\n"
+                    "- *.tmp\n"
+                    "+ keep.tmp\n"
+                    "\n"
+                    "/src/b==>Card/b\n"
+                )
+
+            cmd = "-M model -V vendor -f {}".format(mapping_file).split(" ")
+            args = self.parser.parse_args(cmd)
+
+            self.assertEqual(
+                cli.parse_sync_info(args),
+                (["/src/a", "/src/b"], ["Card/a", "Card/b"]),
+            )
+            self.assertEqual(
+                cli.parse_mapping_filter_rules(mapping_file),
+                [[".thumbnails/", "*.tmp", "!keep.tmp"], [".thumbnails/"]],
+            )
+
     def test_sync_info_file_incorrect_format(self):
         """
         Test incorrect mapping file format is reported.
@@ -206,13 +312,29 @@ class TestCli(unittest.TestCase):
         mock_parse_sync_info.return_value = (["/src"], ["/dst"])
         mock_sync_init.return_value = None
 
-        cmd = "-M model -V vendor -s /src -d /dst -ov".split(" ")
-        args = self.parser.parse_args(cmd)
+        cmd = "-M model -V vendor -s /src -d /dst -ov --state-db {}".format(
+            self.state_db
+        )
+        args = self.parser.parse_args(cmd.split(" "))
         cli.run(args)
 
         mock_sync_init.assert_called_once_with(
+            backend="gvfs",
+            bulk_list=False,
+            checksum=False,
             destination="/dst",
+            detect_moves=False,
+            device="vendor:model",
+            filter_rules=None,
             ignore_file_types=None,
+            incremental=False,
+            jobs=1,
+            manifest=False,
+            max_age=None,
+            max_size=None,
+            min_age=None,
+            min_size=None,
+            mtime_tolerance=2.0,
             mtp_details=(
                 "mtp://[usb:usb_bus_id,device_id]/",
                 "/run/user/{}/gvfs/mtp:host=%5Busb%3Ausb_bus_id%2C"
@@ -220,13 +342,250 @@ class TestCli(unittest.TestCase):
             ),
             overwrite_existing=True,
             source="/src",
+            spill_plan=False,
+            state=None,
+            trust_state=False,
+            two_way=False,
             unmatched="ignore",
+            update=False,
             verbose=True,
+            costs_store=ANY,
+        )
+        # operation costs are recorded on every run
+        self.assertIsInstance(
+            mock_sync_init.call_args[1]["costs_store"], StateStore
         )
         mock_set_source_abs.assert_called_once_with()
         mock_set_destination_abs.assert_called_once_with()
         mock_sync_sync.assert_called_once_with()
 
+    @patch("pysyncdroid.cli.Watcher")
+    @patch("pysyncdroid.cli.Sync")
+    @patch("pysyncdroid.cli.get_connection_details")
+    @patch("pysyncdroid.cli.parse_sync_info")
+    def test_run_watch(
+        self,
+        mock_parse_sync_info,
+        mock_get_connection_details,
+        mock_sync,
+        mock_watcher,
+    ):
+        """
+        Test sources are watched after the initial sync.
+        """
+        mock_get_connection_details.return_value = ("usb_bus_id", "device_id")
+        mock_parse_sync_info.return_value = (["/src"], ["/dst"])
+        mock_watcher.return_value.run.side_effect = KeyboardInterrupt
+
+        cmd = "-M model -V vendor -s /src -d /dst --watch --debounce 0.5 "
+        cmd += "--state-db {}".format(self.state_db)
+        args = self.parser.parse_args(cmd.split(" "))
+        cli.run(args)
+
+        mock_sync.return_value.sync.assert_called_once_with()
+        mock_watcher.assert_called_once_with(
+            [mock_sync.return_value], debounce=0.5
+        )
+        mock_watcher.return_value.close.assert_called_once_with()
+
+    @patch("pysyncdroid.cli.get_connection_details")
+    @patch("pysyncdroid.cli.parse_sync_info")
+    def test_run_state(
+        self, mock_parse_sync_info, mock_get_connection_details
+    ):
+        """
+        Test the state store is handed over to `Sync` and closed afterwards.
+        """
+        mock_get_connection_details.return_value = ("usb_bus_id", "device_id")
+        mock_parse_sync_info.return_value = (["/src"], ["/dst"])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state_db = os.path.join(tmp_dir, "state.db")
+            cmd = "-M model -V vendor -s /src -d /dst --trust-state "
+            cmd += "--state-db {}".format(state_db)
+            args = self.parser.parse_args(cmd.split(" "))
+
+            with patch("pysyncdroid.cli.Sync") as mock_sync:
+                cli.run(args)
+
+            kwargs = mock_sync.call_args[1]
+            self.assertIsInstance(kwargs["state"], StateStore)
+            self.assertTrue(kwargs["trust_state"])
+            self.assertTrue(os.path.exists(state_db))
+
+            # closed
+            with self.assertRaises(sqlite3.ProgrammingError):
+                kwargs["state"].get_files("vendor:model", "/src==>/dst")
+
+    @patch("pysyncdroid.cli.get_connection_details")
+    @patch("pysyncdroid.cli.parse_sync_info")
+    def test_run_state_unavailable(
+        self, mock_parse_sync_info, mock_get_connection_details
+    ):
+        """
+        Test a run goes on without recording operation costs if the state
+        database can't be opened, unless synchronized files are recorded.
+        """
+        mock_get_connection_details.return_value = ("usb_bus_id", "device_id")
+        mock_parse_sync_info.return_value = (["/src"], ["/dst"])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            not_a_dir = os.path.join(tmp_dir, "file")
+            with open(not_a_dir, "w"):
+                pass
+            state_db = os.path.join(not_a_dir, "state.db")
+
+            cmd = "-M model -V vendor -s /src -d /dst --state-db {}".format(
+                state_db
+            )
+            with patch("pysyncdroid.cli.Sync") as mock_sync:
+                self.assertIsNone(cli.run(self.parser.parse_args(cmd.split())))
+
+            self.assertIsNone(mock_sync.call_args[1]["costs_store"])
+            mock_sync.return_value.sync.assert_called_once_with()
+
+            with patch("pysyncdroid.cli.Sync") as mock_sync:
+                err = cli.run(
+                    self.parser.parse_args((cmd + " --trust-state").split())
+                )
+
+            self.assertTrue(err.startswith("Can't open state database"))
+            mock_sync.assert_not_called()
+
+    @patch("pysyncdroid.cli.get_connection_details")
+    @patch("pysyncdroid.cli.parse_sync_info")
+    def test_run_sync_refused(
+        self, mock_parse_sync_info, mock_get_connection_details
+    ):
+        """
+        Test a refused sync is reported as an error.
+        """
+        mock_get_connection_details.return_value = ("usb_bus_id", "device_id")
+        mock_parse_sync_info.return_value = (["/src"], ["/dst"])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cmd = "-M model -V vendor -s /src -d /dst --two-way --state-db {}"
+            args = self.parser.parse_args(
+                cmd.format(os.path.join(tmp_dir, "state.db")).split()
+            )
+            with patch("pysyncdroid.cli.Sync") as mock_sync:
+                mock_sync.return_value.sync.side_effect = SyncException(
+                    "refused"
+                )
+                self.assertEqual(cli.run(args), "refused")
+
+    @patch("pysyncdroid.cli.get_connection_details")
+    @patch("pysyncdroid.cli.parse_sync_info")
+    def test_run_dry_run(
+        self, mock_parse_sync_info, mock_get_connection_details
+    ):
+        """
+        Test a dry run reports planned actions instead of synchronizing and
+        reads operation costs from the state store.
+        """
+        mock_get_connection_details.return_value = ("usb_bus_id", "device_id")
+        mock_parse_sync_info.return_value = (["/src"], ["/dst"])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state_db = os.path.join(tmp_dir, "state.db")
+            cmd = "-M model -V vendor -s /src -d /dst -n "
+            cmd += "--state-db {}".format(state_db)
+            args = self.parser.parse_args(cmd.split(" "))
+
+            with patch("pysyncdroid.cli.Sync") as mock_sync, patch(
+                "sys.stdout", new=StringIO()
+            ) as mock_stdout:
+                summary = mock_sync.return_value.dry_run.return_value
+                summary.format.return_value = "report"
+                cli.run(args)
+
+            kwargs = mock_sync.call_args[1]
+            self.assertIsNone(kwargs["state"])
+            self.assertIsInstance(kwargs["costs_store"], StateStore)
+            mock_sync.return_value.sync.assert_not_called()
+            self.assertEqual(mock_stdout.getvalue(), "report\n")
+
+    @patch("pysyncdroid.cli.get_connection_details")
+    @patch("pysyncdroid.cli.parse_sync_info")
+    def test_run_save_apply_plan(
+        self, mock_parse_sync_info, mock_get_connection_details
+    ):
+        """
+        Test a plan is saved instead of synchronizing and applied later.
+        """
+        mock_get_connection_details.return_value = ("usb_bus_id", "device_id")
+        mock_parse_sync_info.return_value = (["/src"], ["/dst"])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            plan_path = os.path.join(tmp_dir, "plan.jsonl")
+            cmd = "-M model -V vendor -s /src -d /dst --state-db {} ".format(
+                os.path.join(tmp_dir, "state.db")
+            )
+
+            def dry_run(plan_file):
+                write_plan_header(plan_file, "vendor:model", "/src==>/dst")
+                write_plan_record(plan_file, ["dir", ".", False])
+                return PlanSummary("/src", "/dst")
+
+            args = self.parser.parse_args(
+                (cmd + "--save-plan " + plan_path).split(" ")
+            )
+            with patch("pysyncdroid.cli.Sync") as mock_sync, patch(
+                "sys.stdout", new=StringIO()
+            ):
+                mock_sync.return_value.dry_run.side_effect = dry_run
+                cli.run(args)
+
+            mock_sync.return_value.sync.assert_not_called()
+
+            args = self.parser.parse_args(
+                (cmd + "--apply-plan " + plan_path).split(" ")
+            )
+            with patch("pysyncdroid.cli.Sync") as mock_sync:
+                mock_sync.return_value.device = "vendor:model"
+                mock_sync.return_value.get_mapping_key.return_value = (
+                    "/src==>/dst"
+                )
+                mock_sync.return_value.apply_plan.return_value = 0
+                cli.run(args)
+
+            mock_sync.return_value.sync.assert_not_called()
+            mock_sync.return_value.apply_plan.assert_called_once_with(
+                [["dir", ".", False]]
+            )
+
+    @patch("pysyncdroid.cli.Sync")
+    @patch("pysyncdroid.cli.get_connection_details")
+    @patch("pysyncdroid.cli.parse_sync_info")
+    def test_run_two_way_conflicting(
+        self, mock_parse_sync_info, mock_get_connection_details, mock_sync
+    ):
+        """
+        Test two-way sync isn't combined with one-way only options.
+        """
+        mock_get_connection_details.return_value = ("usb_bus_id", "device_id")
+        mock_parse_sync_info.return_value = (["/src"], ["/dst"])
+
+        cmd = "-M model -V vendor -s /src -d /dst --two-way --detect-moves -n"
+        args = self.parser.parse_args(cmd.split(" "))
+
+        self.assertEqual(
+            cli.run(args),
+            "Two-way sync (--two-way) can't be combined with --detect-moves, "
+            "--dry-run",
+        )
+        mock_sync.assert_not_called()
+
+    @patch("sys.stderr", new=StringIO())
+    def test_parser_dry_run_watch(self):
+        """
+        Test a dry run can't be watched.
+        """
+        with self.assertRaises(SystemExit):
+            self.parser.parse_args(
+                "-M model -V vendor --dry-run --watch".split(" ")
+            )
+
     @patch("pysyncdroid.cli.create_parser")
     @patch("pysyncdroid.cli.run")
     def test_main(self, mock_run, mock_create_parser):
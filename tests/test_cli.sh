@@ -6,7 +6,17 @@ python setup.py install
 ACTUAL_OUTPUT="$(pysyncdroid 2>&1)"
 EXPECTED_OUTPUT="usage: pysyncdroid [-h] -V VENDOR -M MODEL [-s SOURCE] [-d DESTINATION]
                    [-f FILE] [-v] [-u {ignore,remove,synchronize}] [-o]
+                   [--update] [-c] [--detect-moves | --spill-plan]
+                   [--manifest] [--bulk-list] [--mtime-tolerance SECONDS]
                    [-i IGNORE_FILE_TYPE [IGNORE_FILE_TYPE ...]]
+                   [--exclude PATTERN [PATTERN ...]]
+                   [--include PATTERN [PATTERN ...]] [--min-size SIZE]
+                   [--max-size SIZE] [--min-age DAYS] [--max-age DAYS]
+                   [-b {gvfs,fuse,gio,helper,local}] [-j JOBS]
+                   [--trust-state | --rescan]
+                   [--watch | -n | --save-plan PATH | --apply-plan PATH]
+                   [--debounce SECONDS] [--incremental] [--two-way]
+                   [--state-db PATH]
 pysyncdroid: error: the following arguments are required: -V/--vendor, -M/--model"
 
 if [ "$ACTUAL_OUTPUT" != "$EXPECTED_OUTPUT" ]
@@ -0,0 +1,59 @@
+"""Tests for measured operation costs."""
+
+
+import unittest
+
+from pysyncdroid.costs import Costs, COPY_OP, REMOVE_OP
+
+
+class TestCosts(unittest.TestCase):
+    def test_get_rates(self):
+        """
+        Test 'get_rates' fits latency and per-byte time to measured
+        operations.
+        """
+        costs = Costs()
+        # 0.1s latency, 10 bytes per second
+        for count, size in ((1, 10), (1, 50), (3, 20)):
+            costs.add(COPY_OP, count * 0.1 + size / 10.0, count, size)
+
+        latency, per_byte = costs.get_rates(COPY_OP)
+        self.assertAlmostEqual(latency, 0.1)
+        self.assertAlmostEqual(per_byte, 0.1)
+        self.assertAlmostEqual(costs.estimate(COPY_OP, 2, 100), 10.2)
+
+    def test_get_rates_latency_only(self):
+        """
+        Test 'get_rates' attributes time of operations without transferred
+        bytes to latency.
+        """
+        costs = Costs()
+        costs.add(REMOVE_OP, 0.2)
+        costs.add(REMOVE_OP, 0.4)
+
+        latency, per_byte = costs.get_rates(REMOVE_OP)
+        self.assertAlmostEqual(latency, 0.3)
+        self.assertEqual(per_byte, 0.0)
+
+    def test_get_rates_same_size(self):
+        """
+        Test 'get_rates' attributes time to transferred bytes when it can't
+        tell latency from throughput.
+        """
+        costs = Costs()
+        costs.add(COPY_OP, 1.0, size=10)
+        costs.add(COPY_OP, 3.0, size=10)
+
+        self.assertEqual(costs.get_rates(COPY_OP), (0.0, 0.2))
+
+    def test_get_rates_not_measured(self):
+        """
+        Test 'get_rates' and 'estimate' don't guess unmeasured operations.
+        """
+        costs = Costs({REMOVE_OP: [1.0, 0.0, 0.0, 0.5, 0.0]})
+
+        self.assertTrue(costs)
+        self.assertFalse(Costs())
+        self.assertIsNone(costs.get_rates(COPY_OP))
+        self.assertIsNone(costs.estimate(COPY_OP, 1, 10))
+        self.assertEqual(costs.estimate(REMOVE_OP, 4), 2.0)
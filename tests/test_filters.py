@@ -0,0 +1,117 @@
+"""Tests for include/exclude filters."""
+
+
+import time
+import unittest
+
+from pysyncdroid.filters import Filter, translate
+
+
+class TestTranslate(unittest.TestCase):
+    def _matches(self, pattern, path):
+        regex, _ = translate(pattern)
+        return bool(regex.match(path))
+
+    def test_translate_name(self):
+        """
+        Test 'translate' matches a pattern without a slash at any depth.
+        """
+        self.assertTrue(self._matches("*.tmp", "a.tmp"))
+        self.assertTrue(self._matches("*.tmp", "dir/sub/a.tmp"))
+        self.assertFalse(self._matches("*.tmp", "a.tmp.mp3"))
+        self.assertTrue(self._matches("song?.mp3", "song1.mp3"))
+        self.assertTrue(self._matches("song[0-9].mp3", "dir/song1.mp3"))
+        self.assertFalse(self._matches("song[!0-9].mp3", "song1.mp3"))
+
+    def test_translate_anchored(self):
+        """
+        Test 'translate' anchors a pattern with a slash to the synchronized
+        directory.
+        """
+        self.assertTrue(self._matches("/Android/data", "Android/data"))
+        self.assertFalse(self._matches("/Android/data", "x/Android/data"))
+        self.assertTrue(self._matches("Android/data/", "Android/data"))
+        self.assertFalse(self._matches("/*.mp3", "dir/a.mp3"))
+
+    def test_translate_double_star(self):
+        """
+        Test 'translate' matches any number of directories by `**`.
+        """
+        self.assertTrue(self._matches("**/cache", "cache"))
+        self.assertTrue(self._matches("**/cache", "a/b/cache"))
+        self.assertTrue(self._matches("a/**/b", "a/b"))
+        self.assertTrue(self._matches("a/**/b", "a/x/y/b"))
+        self.assertTrue(self._matches("a/**", "a/x/y"))
+        self.assertFalse(self._matches("a/*", "a/x/y"))
+
+    def test_translate_dir_only(self):
+        """
+        Test 'translate' recognizes a directory only pattern.
+        """
+        self.assertEqual(translate(".thumbnails/")[1], True)
+        self.assertEqual(translate(".thumbnails")[1], False)
+
+
+class TestFilter(unittest.TestCase):
+    def test_excludes_dir(self):
+        """
+        Test 'excludes_dir' applies all rules.
+        """
+        f = Filter([".thumbnails/", "*.tmp", "/Android/data/"])
+
+        self.assertTrue(f.excludes_dir(".thumbnails"))
+        self.assertTrue(f.excludes_dir("DCIM/.thumbnails"))
+        self.assertTrue(f.excludes_dir("Android/data"))
+        self.assertTrue(f.excludes_dir("old.tmp"))
+        self.assertFalse(f.excludes_dir("Music/Android/data"))
+        self.assertFalse(Filter().excludes_dir(".thumbnails"))
+
+    def test_excludes_file(self):
+        """
+        Test 'excludes_file' applies file rules and ignored file types.
+        """
+        f = Filter([".thumbnails/", "/Music/*.tmp"], ["JPG", ".png"])
+
+        self.assertFalse(f.excludes_file(".thumbnails"))
+        self.assertTrue(f.excludes_file("a.tmp", "Music"))
+        self.assertFalse(f.excludes_file("a.tmp", "Other"))
+        self.assertTrue(f.excludes_file("cover.jpg"))
+        self.assertTrue(f.excludes_file("cover.PNG", "Music"))
+        self.assertFalse(f.excludes_file("jpg"))
+
+    def test_excludes_include(self):
+        """
+        Test the last matching rule wins.
+        """
+        f = Filter(["*.tmp", "!keep*.tmp", "keep-not.tmp"])
+
+        self.assertTrue(f.excludes_file("a.tmp"))
+        self.assertFalse(f.excludes_file("keep.tmp"))
+        self.assertTrue(f.excludes_file("keep-not.tmp"))
+        self.assertFalse(f.excludes_file("a.mp3"))
+
+    def test_excludes_path(self):
+        """
+        Test 'excludes_path' applies rules to parent directories as well.
+        """
+        f = Filter(["cache/", "!cache/keep.mp3"])
+
+        self.assertTrue(f.excludes_path("a/cache/song.mp3"))
+        # excluded directory's content can't be re-included
+        self.assertTrue(f.excludes_path("cache/keep.mp3"))
+        self.assertFalse(f.excludes_path("a/song.mp3"))
+        self.assertFalse(f.excludes_path("song.mp3"))
+
+    def test_excludes_stats(self):
+        """
+        Test 'excludes_stats' applies size and age limits.
+        """
+        now = time.time()
+        f = Filter(min_size=10, max_size=100, min_age=60, max_age=3600)
+
+        self.assertFalse(f.excludes_stats(50, now - 600))
+        self.assertTrue(f.excludes_stats(5, now - 600))
+        self.assertTrue(f.excludes_stats(500, now - 600))
+        self.assertTrue(f.excludes_stats(50, now))
+        self.assertTrue(f.excludes_stats(50, now - 7200))
+        self.assertFalse(Filter().excludes_stats(0, 0))
@@ -0,0 +1,57 @@
+"""Tests for the find wrapper."""
+
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from pysyncdroid.find import FIND_FORMAT, scan_tree
+
+
+class TestScanTree(unittest.TestCase):
+    @patch("pysyncdroid.find.iter_bash_cmd")
+    def test_scan_tree(self, mock_iter_bash_cmd):
+        """
+        Test 'scan_tree' indexes listed entries by their directory.
+        """
+        mock_iter_bash_cmd.return_value = [
+            "d\t4096\t100.5\tAlbum",
+            "f\t8\t200.0\tAlbum/a\tb.mp3",
+            "l\t5\t300.0\tlink.mp3",
+        ]
+
+        self.assertEqual(
+            scan_tree("/dst"),
+            {
+                ".": [
+                    ("Album", 4096, 100.5, True, False),
+                    ("link.mp3", 5, 300.0, False, True),
+                ],
+                "Album": [("a\tb.mp3", 8, 200.0, False, False)],
+            },
+        )
+        mock_iter_bash_cmd.assert_called_once_with(
+            ["find", "/dst", "-mindepth", "1", "-printf", FIND_FORMAT],
+            separator="\0",
+        )
+
+    def test_scan_tree_find(self):
+        """
+        Test 'scan_tree' lists a directory tree with `find`.
+        """
+        with tempfile.TemporaryDirectory() as top:
+            os.makedirs(os.path.join(top, "Album"))
+            path = os.path.join(top, "Album", "new\nline.mp3")
+            with open(path, "w") as f:
+                f.write("song")
+
+            tree = scan_tree(top)
+
+            self.assertEqual(sorted(tree), [".", "Album"])
+            [(name, size, mtime, is_dir, is_link)] = tree["Album"]
+            self.assertEqual(
+                (name, size, is_dir, is_link),
+                ("new\nline.mp3", 4, False, False),
+            )
+            self.assertAlmostEqual(mtime, os.path.getmtime(path), places=5)
@@ -0,0 +1,69 @@
+"""Tests for in-process FUSE file operations."""
+
+
+import errno
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from pysyncdroid import fuse
+
+
+class TestFuseCp(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.tmp_dir.name, "song.mp3")
+        self.dst = os.path.join(self.tmp_dir.name, "copy.mp3")
+
+        # make sure the data don't fit into a single buffer
+        self.data = os.urandom(fuse.COPY_BUFFER_SIZE * 2 + 7)
+        with open(self.src, "wb") as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _read_dst(self, dst):
+        with open(dst, "rb") as f:
+            return f.read()
+
+    def test_cp(self):
+        """
+        Test 'cp' copies file data.
+        """
+        fuse.cp(self.src, self.dst)
+
+        self.assertEqual(self._read_dst(self.dst), self.data)
+
+    def test_cp_to_directory(self):
+        """
+        Test 'cp' copies a file into a directory when destination is one.
+        """
+        dst_dir = os.path.join(self.tmp_dir.name, "Music")
+        os.mkdir(dst_dir)
+        fuse.cp(self.src, dst_dir)
+
+        self.assertEqual(
+            self._read_dst(os.path.join(dst_dir, "song.mp3")), self.data
+        )
+
+    @patch("pysyncdroid.fuse.os.sendfile")
+    def test_cp_kernel_copy_unsupported(self, mock_sendfile):
+        """
+        Test 'cp' falls back to buffered copy when 'sendfile' isn't supported.
+        """
+        mock_sendfile.side_effect = OSError(errno.EINVAL, "Invalid argument")
+        fuse.cp(self.src, self.dst)
+
+        self.assertEqual(self._read_dst(self.dst), self.data)
+
+    @patch("pysyncdroid.fuse.os.sendfile")
+    def test_cp_kernel_copy_error(self, mock_sendfile):
+        """
+        Test 'cp' doesn't hide other errors than missing 'sendfile' support.
+        """
+        mock_sendfile.side_effect = OSError(errno.EIO, "Input/output error")
+
+        with self.assertRaises(OSError):
+            fuse.cp(self.src, self.dst)
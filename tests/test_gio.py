@@ -0,0 +1,129 @@
+"""Tests for gio wrappers."""
+
+
+import unittest
+from unittest.mock import call, patch
+
+from pysyncdroid.exceptions import BashException
+from pysyncdroid.gio import (
+    batch_args,
+    cp,
+    cp_batch,
+    mv,
+    parse_failed_files,
+)
+
+
+class TestGioWrappers(unittest.TestCase):
+    def setUp(self):
+        self.patcher = patch("pysyncdroid.gio.run_bash_cmd")
+        self.mock_run_bash_cmd = self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_cp(self):
+        src = "/src"
+        dst = "/dst"
+        cp(src, dst)
+
+        self.mock_run_bash_cmd.assert_called_with(["gio", "copy", src, dst])
+
+    def test_mv(self):
+        src = "/src"
+        dst = "/dst"
+        mv(src, dst)
+
+        self.mock_run_bash_cmd.assert_called_with(["gio", "move", src, dst])
+
+    def test_cp_batch(self):
+        """
+        Test 'cp_batch' copies all files with a single 'gio copy' call.
+        """
+        srcs = ["/src/a.mp3", "/src/b.mp3"]
+        failed = cp_batch(srcs, "/dst")
+
+        self.assertEqual(failed, {})
+        self.mock_run_bash_cmd.assert_called_once_with(
+            ["gio", "copy", "/src/a.mp3", "/src/b.mp3", "/dst"]
+        )
+
+    def test_cp_batch_bounded(self):
+        """
+        Test 'cp_batch' splits files to multiple 'gio copy' calls when there
+        are too many of them.
+        """
+        srcs = ["/src/a.mp3", "/src/b.mp3"]
+        cp_batch(srcs, "/dst", max_length=30)
+
+        calls = (
+            call(["gio", "copy", "/src/a.mp3", "/dst"]),
+            call(["gio", "copy", "/src/b.mp3", "/dst"]),
+        )
+        self.mock_run_bash_cmd.assert_has_calls(calls)
+
+    def test_cp_batch_failed(self):
+        """
+        Test 'cp_batch' reports which files failed.
+        """
+        self.mock_run_bash_cmd.side_effect = BashException(
+            'Command "gio copy /src/a.mp3 /src/b b.mp3 /dst" failed: '
+            "gio: file:///src/b%20b.mp3: Connection reset by peer"
+        )
+        failed = cp_batch(["/src/a.mp3", "/src/b b.mp3"], "/dst")
+
+        self.assertEqual(failed, {"/src/b b.mp3": "Connection reset by peer"})
+
+
+class TestBatchArgs(unittest.TestCase):
+    def test_batch_args(self):
+        """
+        Test 'batch_args' keeps summed arguments length under a limit.
+        """
+        args = ["aaaa", "bbbb", "cccc", "dddd"]
+        batches = list(batch_args(args, fixed_length=2, max_length=12))
+
+        self.assertEqual(batches, [["aaaa", "bbbb"], ["cccc", "dddd"]])
+
+    def test_batch_args_long_argument(self):
+        """
+        Test 'batch_args' doesn't drop arguments longer than the limit.
+        """
+        batches = list(batch_args(["a" * 20, "b"], max_length=10))
+
+        self.assertEqual(batches, [["a" * 20], ["b"]])
+
+
+class TestParseFailedFiles(unittest.TestCase):
+    def test_parse_failed_files(self):
+        """
+        Test 'parse_failed_files' maps error lines to source files.
+        """
+        err = (
+            "gio: file:///run/user/1000/gvfs/mtp:host=%255Busb%253A002%252C003"
+            "%255D/a.mp3: Operation not supported\n"
+        )
+        srcs = [
+            "/run/user/1000/gvfs/mtp:host=%5Busb%3A002%2C003%5D/a.mp3",
+            "/run/user/1000/gvfs/mtp:host=%5Busb%3A002%2C003%5D/b.mp3",
+        ]
+
+        self.assertEqual(
+            parse_failed_files(err, srcs),
+            {srcs[0]: "Operation not supported"},
+        )
+
+    def test_parse_failed_files_unknown(self):
+        """
+        Test 'parse_failed_files' considers all files failed when the error
+        can't be mapped to a particular file.
+        """
+        srcs = ["/src/a.mp3", "/src/b.mp3"]
+
+        self.assertEqual(
+            parse_failed_files("Segmentation fault", srcs),
+            {
+                "/src/a.mp3": "Segmentation fault",
+                "/src/b.mp3": "Segmentation fault",
+            },
+        )
@@ -4,7 +4,19 @@
 import unittest
 from unittest.mock import call, patch
 
-from pysyncdroid.gvfs import cp, mkdir, mv, mount, rm
+from pysyncdroid.gvfs import (
+    cp,
+    cp_async,
+    mkdir,
+    mkdir_batch,
+    mount,
+    mount_async,
+    mv,
+    mv_async,
+    rm,
+    rm_async,
+)
+from tests.test_utils import run_async
 
 
 class TestGvfsWrappers(unittest.TestCase):
@@ -28,6 +40,17 @@ class TestGvfsWrappers(unittest.TestCase):
 
         self.mock_run_bash_cmd.assert_called_with(["gvfs-mkdir", "-p", path])
 
+    def test_mkdir_batch(self):
+        mkdir_batch(["/dst/a", "/dst/b", "/dst/c"], max_length=30)
+
+        self.assertEqual(
+            self.mock_run_bash_cmd.call_args_list,
+            [
+                call(["gvfs-mkdir", "-p", "/dst/a", "/dst/b"]),
+                call(["gvfs-mkdir", "-p", "/dst/c"]),
+            ],
+        )
+
     def test_mount(self):
         mtp_url = "mtp://[usb:2,3]/"
         mount(mtp_url)
@@ -39,16 +62,47 @@ class TestGvfsWrappers(unittest.TestCase):
         dst = "/dst"
         mv(src, dst)
 
-        self.assertEqual(self.mock_run_bash_cmd.call_count, 2)
-        # order is important here
-        calls = (
-            call(["gvfs-copy", src, dst]),
-            call(["gvfs-rm", "-f", "/src"]),
-        )
-        self.mock_run_bash_cmd.assert_has_calls(calls)
+        self.mock_run_bash_cmd.assert_called_once_with(["gvfs-move", src, dst])
 
     def test_rm(self):
         src = "/src"
         rm(src)
 
         self.mock_run_bash_cmd.assert_called_with(["gvfs-rm", "-f", src])
+
+
+class TestGvfsAsyncWrappers(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+        async def run_bash_cmd_async(cmd):
+            self.calls.append(call(cmd))
+
+        self.patcher = patch(
+            "pysyncdroid.gvfs.run_bash_cmd_async", new=run_bash_cmd_async
+        )
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_cp_async(self):
+        run_async(cp_async("/src", "/dst"))
+
+        self.assertEqual(self.calls, [call(["gvfs-copy", "/src", "/dst"])])
+
+    def test_mount_async(self):
+        mtp_url = "mtp://[usb:2,3]/"
+        run_async(mount_async(mtp_url))
+
+        self.assertEqual(self.calls, [call(["gvfs-mount", mtp_url])])
+
+    def test_mv_async(self):
+        run_async(mv_async("/src", "/dst"))
+
+        self.assertEqual(self.calls, [call(["gvfs-move", "/src", "/dst"])])
+
+    def test_rm_async(self):
+        run_async(rm_async("/src"))
+
+        self.assertEqual(self.calls, [call(["gvfs-rm", "-f", "/src"])])
@@ -0,0 +1,123 @@
+"""Tests for file content hashing."""
+
+
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from pysyncdroid import hashing
+from pysyncdroid.state import StateStore
+
+
+class TestHashFile(unittest.TestCase):
+    def test_hash_file(self):
+        """
+        Test 'hash_file' hashes the whole file content.
+        """
+        data = os.urandom(hashing.HASH_BUFFER_SIZE + 7)
+
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(data)
+            f.flush()
+
+            self.assertEqual(
+                hashing.hash_file(f.name),
+                hashlib.new(hashing.HASH_ALGORITHM, data).hexdigest(),
+            )
+
+
+class TestFingerprint(unittest.TestCase):
+    def _write(self, path, data):
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def test_fingerprint(self):
+        """
+        Test 'fingerprint' depends on file size and both file ends only.
+        """
+        size = hashing.FINGERPRINT_SIZE
+        head = os.urandom(size)
+        tail = os.urandom(size)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            a = os.path.join(tmp_dir, "a")
+            b = os.path.join(tmp_dir, "b")
+            c = os.path.join(tmp_dir, "c")
+            self._write(a, head + b"a" * 10 + tail)
+            self._write(b, head + b"b" * 10 + tail)
+            self._write(c, head + b"c" * 11 + tail)
+
+            self.assertEqual(hashing.fingerprint(a), hashing.fingerprint(b))
+            self.assertNotEqual(hashing.fingerprint(a), hashing.fingerprint(c))
+
+    def test_fingerprint_small_file(self):
+        """
+        Test 'fingerprint' covers whole small files.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            a = os.path.join(tmp_dir, "a")
+            b = os.path.join(tmp_dir, "b")
+            self._write(a, b"song a")
+            self._write(b, b"song b")
+
+            self.assertNotEqual(hashing.fingerprint(a), hashing.fingerprint(b))
+
+
+class TestHasher(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "song.mp3")
+        with open(self.path, "w") as f:
+            f.write("song")
+
+        self.state = StateStore(":memory:")
+
+    def tearDown(self):
+        self.state.close()
+        self.tmp_dir.cleanup()
+
+    def test_result(self):
+        """
+        Test 'Hasher' hashes submitted files.
+        """
+        hasher = hashing.Hasher(jobs=2)
+        hasher.submit(self.path)
+
+        self.assertEqual(
+            hasher.result(self.path), hashing.hash_file(self.path)
+        )
+        hasher.close()
+
+    def test_cached(self):
+        """
+        Test 'Hasher' doesn't re-hash files which didn't change.
+        """
+        hasher = hashing.Hasher(self.state)
+        hasher.submit(self.path)
+        expected = hasher.result(self.path)
+        hasher.close()
+
+        with patch("pysyncdroid.hashing.ProcessPoolExecutor") as mock_pool:
+            hasher.submit(self.path)
+            self.assertEqual(hasher.result(self.path), expected)
+        mock_pool.assert_not_called()
+
+    def test_modified(self):
+        """
+        Test 'Hasher' re-hashes modified files.
+        """
+        hasher = hashing.Hasher(self.state)
+        hasher.submit(self.path)
+        hasher.result(self.path)
+        hasher.close()
+
+        with open(self.path, "w") as f:
+            f.write("modified song")
+
+        hasher.submit(self.path)
+        self.assertEqual(
+            hasher.result(self.path), hashing.hash_file(self.path)
+        )
+        hasher.close()
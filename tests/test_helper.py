@@ -0,0 +1,162 @@
+"""Tests for the device operations helper process."""
+
+
+from io import StringIO
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from pysyncdroid.exceptions import BashException
+from pysyncdroid.helper import Helper, OPERATIONS, serve
+
+
+class TestServe(unittest.TestCase):
+    def _serve(self, *requests):
+        """
+        Run 'serve' for given requests.
+
+        :argument *requests: requests to execute
+        :type *requests: dict
+
+        :returns list - responses
+
+        """
+        stdin = StringIO("".join(json.dumps(r) + "\n" for r in requests))
+        stdout = StringIO()
+        serve(stdin, stdout)
+
+        return [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+    def test_serve(self):
+        """
+        Test 'serve' executes requested operations.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "Music", "Rock")
+            responses = self._serve(
+                {"op": "mkdir", "args": [path]}, {"op": "stat", "args": [path]}
+            )
+
+            self.assertTrue(os.path.isdir(path))
+
+        self.assertEqual(responses[0], {"ok": True, "result": None})
+        self.assertTrue(responses[1]["ok"])
+        self.assertTrue(responses[1]["result"][2])
+
+    def test_serve_error(self):
+        """
+        Test 'serve' reports failed and unknown operations.
+        """
+        responses = self._serve(
+            {"op": "stat", "args": ["/non/existent"]},
+            {"op": "chmod", "args": ["/non/existent"]},
+        )
+
+        self.assertEqual(
+            responses,
+            [
+                {
+                    "ok": False,
+                    "error": 'Operation "stat /non/existent" failed: '
+                    "No such file or directory",
+                },
+                {"ok": False, "error": 'Unknown operation "chmod"'},
+            ],
+        )
+
+    def test_serve_malformed(self):
+        """
+        Test 'serve' reports malformed requests and operations failing
+        unexpectedly, and keeps serving.
+        """
+        stdin = StringIO(
+            'not json\n{"op": ["stat"]}\n{"op": "stat", "args": [1, 2, 3]}\n'
+            '{"op": "stat", "args": ["/"]}\n'
+        )
+        stdout = StringIO()
+        serve(stdin, stdout)
+        responses = [
+            json.loads(line) for line in stdout.getvalue().splitlines()
+        ]
+
+        self.assertEqual(
+            responses[:2], [{"ok": False, "error": "Malformed request"}] * 2
+        )
+        self.assertFalse(responses[2]["ok"])
+        self.assertTrue(
+            responses[2]["error"].startswith('Operation "stat 1 2 3" failed:')
+        )
+        self.assertTrue(responses[3]["ok"])
+
+    def test_serve_operation_key_error(self):
+        """
+        Test 'serve' reports a KeyError raised by an operation as its failure.
+        """
+
+        def fail(path):
+            raise KeyError(path)
+
+        with patch.dict(OPERATIONS, {"stat": fail}):
+            responses = self._serve({"op": "stat", "args": ["/"]})
+
+        self.assertEqual(
+            responses,
+            [{"ok": False, "error": "Operation \"stat /\" failed: '/'"}],
+        )
+
+
+class TestHelper(unittest.TestCase):
+    def setUp(self):
+        self.helper = Helper()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+        self.src = os.path.join(self.tmp_dir.name, "song.mp3")
+        with open(self.src, "w") as f:
+            f.write("la la la")
+
+    def tearDown(self):
+        self.helper.close()
+        self.tmp_dir.cleanup()
+
+    def test_helper(self):
+        """
+        Test 'Helper' executes operations in a single helper process.
+        """
+        dst_dir = os.path.join(self.tmp_dir.name, "Music")
+        dst = os.path.join(dst_dir, "song.mp3")
+
+        self.helper.mkdir(dst_dir)
+        pid = self.helper._process.pid
+        self.helper.cp(self.src, dst)
+        self.assertEqual(self.helper.stat(dst)[0], 8)
+        moved = os.path.join(dst_dir, "moved.mp3")
+        self.helper.mv(dst, moved)
+        self.assertFalse(os.path.exists(dst))
+        self.helper.mv(moved, dst)
+        self.helper.rm(dst)
+
+        self.assertFalse(os.path.exists(dst))
+        self.assertEqual(self.helper._process.pid, pid)
+
+    def test_helper_restart(self):
+        """
+        Test 'Helper' restarts the helper process when it dies.
+        """
+        self.helper.stat(self.src)
+        self.helper._process.kill()
+        self.helper._process.wait()
+
+        self.assertEqual(self.helper.stat(self.src)[0], 8)
+
+    def test_helper_error(self):
+        """
+        Test 'Helper' raises a BashException when an operation fails.
+        """
+        with self.assertRaises(BashException) as exc:
+            self.helper.cp("/non/existent", self.src)
+
+        self.assertTrue(
+            str(exc.exception).endswith("No such file or directory")
+        )
@@ -0,0 +1,67 @@
+"""Tests for the manifest of synchronized files."""
+
+
+import unittest
+
+from pysyncdroid.manifest import Manifest, MANIFEST_NAME, SPOT_CHECKS
+from pysyncdroid.transport import FileInfo
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.manifest = Manifest(
+            {".": {"song.mp3": (10, 100.0)}, "Album": {"a.mp3": (20, 200.0)}}
+        )
+
+    def test_dumps_loads(self):
+        """
+        Test 'loads' loads a manifest serialized by 'dumps'.
+        """
+        manifest = Manifest.loads(self.manifest.dumps())
+
+        self.assertEqual(manifest.dirs, self.manifest.dirs)
+        self.assertEqual(manifest.get_dir("Album"), {"a.mp3": (20, 200.0)})
+        self.assertIsNone(manifest.get_dir("Other"))
+
+    def test_loads_unknown_format(self):
+        """
+        Test 'loads' refuses data which isn't a manifest.
+        """
+        for data in ("[]", '{"version": 0, "dirs": {}}', "not json"):
+            with self.assertRaises(ValueError):
+                Manifest.loads(data)
+
+    def test_is_stale(self):
+        """
+        Test 'is_stale' compares recorded file names and sizes with listed
+        ones.
+        """
+        listing = {
+            ".": [
+                FileInfo("song.mp3", 10, 150.0, False),
+                FileInfo("Album", 0, 150.0, True),
+                FileInfo(MANIFEST_NAME, 5, 150.0, False),
+            ],
+            "Album": [FileInfo("a.mp3", 20, 200.0, False)],
+        }
+        self.assertFalse(self.manifest.is_stale(listing.get))
+
+        listing["Album"] = [FileInfo("a.mp3", 21, 200.0, False)]
+        self.assertTrue(self.manifest.is_stale(listing.get))
+
+        del listing["Album"]
+        self.assertTrue(self.manifest.is_stale(listing.get))
+
+    def test_is_stale_spot_checks(self):
+        """
+        Test 'is_stale' lists up to 'SPOT_CHECKS' directories.
+        """
+        manifest = Manifest({str(d): {} for d in range(SPOT_CHECKS * 2)})
+        listed = []
+
+        def scan(rel_dir):
+            listed.append(rel_dir)
+            return []
+
+        self.assertFalse(manifest.is_stale(scan))
+        self.assertEqual(len(listed), SPOT_CHECKS)
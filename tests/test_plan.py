@@ -0,0 +1,224 @@
+"""Tests for synchronization plans."""
+
+
+from io import StringIO
+import os
+import unittest
+
+from pysyncdroid.plan import (
+    diff,
+    format_size,
+    load_plans,
+    merge,
+    write_plan_header,
+    write_plan_record,
+    DirPlan,
+    PlanStore,
+    PlanSummary,
+    CONFLICT,
+    COPY,
+    PULL,
+    REMOVE,
+    REMOVE_SOURCE,
+    SKIP,
+)
+from pysyncdroid.sync import Sync
+from tests.test_sync import FAKE_MTP_DETAILS
+
+
+class TestDiff(unittest.TestCase):
+    def test_diff(self):
+        """
+        Test 'diff' matches source and destination names, source names
+        first.
+        """
+        self.assertEqual(
+            list(diff(["b.mp3", "a.mp3"], ["c.mp3", "a.mp3", "d.mp3"])),
+            [
+                ("b.mp3", True, False),
+                ("a.mp3", True, True),
+                ("c.mp3", False, True),
+                ("d.mp3", False, True),
+            ],
+        )
+
+    def test_diff_empty(self):
+        """
+        Test 'diff' handles empty directories.
+        """
+        self.assertEqual(list(diff([], [])), [])
+        self.assertEqual(list(diff([], ["a.mp3"])), [("a.mp3", False, True)])
+
+
+class TestMerge(unittest.TestCase):
+    def test_merge_new(self):
+        """
+        Test 'merge' copies files not synchronized before to the other side.
+        """
+        self.assertEqual(merge((10, 1.0), None, None, 2.0), COPY)
+        self.assertEqual(merge(None, (10, 1.0), None, 2.0), PULL)
+        self.assertEqual(merge((10, 1.0), (10, 9.0), None, 2.0), SKIP)
+        self.assertEqual(merge((10, 1.0), (20, 1.0), None, 2.0), CONFLICT)
+
+    def test_merge_changed(self):
+        """
+        Test 'merge' propagates changes made on one side since the last sync
+        and reports changes made on both sides.
+        """
+        base = (10, 100.0, 10, 200.0)
+
+        self.assertEqual(merge((10, 101.0), (10, 199.0), base, 2.0), SKIP)
+        self.assertEqual(merge((10, 150.0), (10, 200.0), base, 2.0), COPY)
+        self.assertEqual(merge((20, 100.0), (10, 200.0), base, 2.0), COPY)
+        self.assertEqual(merge((10, 100.0), (20, 200.0), base, 2.0), PULL)
+        self.assertEqual(merge((20, 100.0), (30, 200.0), base, 2.0), CONFLICT)
+
+    def test_merge_removed(self):
+        """
+        Test 'merge' removes files removed on one side since the last sync
+        from the other side, unless changed there.
+        """
+        base = (10, 100.0, 10, 200.0)
+
+        self.assertEqual(merge(None, (10, 200.0), base, 2.0), REMOVE)
+        self.assertEqual(merge((10, 100.0), None, base, 2.0), REMOVE_SOURCE)
+        self.assertEqual(merge(None, (20, 200.0), base, 2.0), CONFLICT)
+        self.assertEqual(merge((20, 100.0), None, base, 2.0), CONFLICT)
+
+
+class TestDirPlan(unittest.TestCase):
+    def test_dir_plan(self):
+        """
+        Test 'DirPlan' keeps planned actions with absolute paths.
+        """
+        dir_plan = DirPlan("/src/Rock", "/dst/Rock")
+        dir_plan.add(COPY, "a.mp3")
+        dir_plan.add(SKIP, "b.mp3")
+        dir_plan.add(COPY, "c.mp3")
+
+        self.assertEqual(
+            [(a.name, a.src_file, a.dst_file) for a in dir_plan.get(COPY)],
+            [
+                ("a.mp3", "/src/Rock/a.mp3", "/dst/Rock/a.mp3"),
+                ("c.mp3", "/src/Rock/c.mp3", "/dst/Rock/c.mp3"),
+            ],
+        )
+        self.assertEqual(dir_plan.get(REMOVE), [])
+
+        with self.assertRaises(AttributeError):
+            dir_plan.actions[0].extra = True
+
+
+class TestPlanSummary(unittest.TestCase):
+    def test_format_size(self):
+        """
+        Test 'format_size' formats sizes in binary units.
+        """
+        self.assertEqual(format_size(0), "0 B")
+        self.assertEqual(format_size(1023), "1023 B")
+        self.assertEqual(format_size(1536), "1.5 KiB")
+        self.assertEqual(format_size(3 * 1024**3), "3.0 GiB")
+        self.assertEqual(format_size(2048 * 1024**4), "2048.0 TiB")
+
+    def test_plan_summary(self):
+        """
+        Test 'PlanSummary' reports totals of planned actions.
+        """
+        summary = PlanSummary("/src", "/dst")
+        summary.add(COPY, 1024)
+        summary.add(COPY, 2048)
+        summary.add(PULL, 10)
+        summary.dirs = 2
+        summary.seconds = 83.4
+
+        self.assertEqual(
+            summary.format(),
+            "/src ==> /dst\n"
+            "  copy: 2 files, 3.0 KiB\n"
+            "  remove: 0 files, 0 B\n"
+            "  pull: 1 files, 10 B\n"
+            "  create: 2 directories\n"
+            "  estimated duration: 0:01:23",
+        )
+
+
+class TestPlanFile(unittest.TestCase):
+    def test_load_plans(self):
+        """
+        Test 'load_plans' loads records of each mapping of a saved plan.
+        """
+        f = StringIO()
+        write_plan_header(f, "vendor:model", "/src==>/dst")
+        write_plan_record(f, ["dir", "Album", True])
+        write_plan_record(f, [COPY, "a.mp3", 10, 100.0])
+        write_plan_header(f, "vendor:model", "/other==>/dst")
+        write_plan_header(f, "vendor:model", "/src==>/dst")
+        write_plan_record(f, [REMOVE, "b.mp3", 20, 200.0])
+        f.seek(0)
+
+        self.assertEqual(
+            load_plans(f),
+            {
+                ("vendor:model", "/src==>/dst"): [
+                    ["dir", "Album", True],
+                    [COPY, "a.mp3", 10, 100.0],
+                    [REMOVE, "b.mp3", 20, 200.0],
+                ],
+                ("vendor:model", "/other==>/dst"): [],
+            },
+        )
+
+    def test_load_plans_unknown_format(self):
+        """
+        Test 'load_plans' refuses data which isn't a plan.
+        """
+        for data in (
+            '{"version": 0, "device": "d", "mapping": "m"}',
+            '["dir", ".", false]',
+            "not json",
+        ):
+            with self.assertRaises(ValueError):
+                load_plans(StringIO(data))
+
+
+class TestPlanStore(unittest.TestCase):
+    def setUp(self):
+        self.sync = Sync(FAKE_MTP_DETAILS, "/src", "/dst")
+        self.store = PlanStore("/src", "/dst", self.sync.sync_data_template)
+
+    def test_plan_store(self):
+        """
+        Test 'PlanStore' rebuilds stored sync data in the stored order.
+        """
+        root = self.sync.sync_data_template("/src", "/dst")
+        root["src_dir_fls"] = ["/src/a.mp3"]
+        root["src_dir_stats"] = {"/src/a.mp3": (10, 100.0)}
+        root["src_dir_hashes"] = {"/src/a.mp3": "abc"}
+        root["recorded_dir_fls"] = {"a.mp3": (10, 100.0, "abc")}
+
+        album = self.sync.sync_data_template(
+            "/src/Rock/Album", "/dst/Rock/Album"
+        )
+        album["src_dir_fls"] = ["/src/Rock/Album/b.mp3"]
+        album["src_dir_stats"] = {"/src/Rock/Album/b.mp3": (20, 200.0)}
+        album["dst_dir_fls"] = ["/dst/Rock/Album/c.mp3"]
+        album["dst_dir_stats"] = {"/dst/Rock/Album/c.mp3": (30, 300.0)}
+
+        self.store.put(root)
+        self.store.put(album)
+
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(list(self.store), [root, album])
+        # again
+        self.assertEqual(list(self.store), [root, album])
+
+        self.store.close()
+
+    def test_plan_store_close(self):
+        """
+        Test 'PlanStore' removes its temporary database when closed.
+        """
+        self.assertTrue(os.path.exists(self.store.path))
+        self.store.close()
+
+        self.assertFalse(os.path.exists(self.store.path))
@@ -0,0 +1,150 @@
+"""Tests for sync state store."""
+
+
+import os
+import tempfile
+import unittest
+
+from pysyncdroid.state import StateStore
+
+
+DEVICE = "vendor:model"
+MAPPING = "/src==>/dst"
+
+
+class TestStateStore(unittest.TestCase):
+    def setUp(self):
+        self.state = StateStore(":memory:")
+
+    def tearDown(self):
+        self.state.close()
+
+    def test_get_files_empty(self):
+        """
+        Test 'get_files' returns nothing for an unknown mapping.
+        """
+        self.assertEqual(self.state.get_files(DEVICE, MAPPING), {})
+
+    def test_set_files(self):
+        """
+        Test 'set_files' records files grouped by directories.
+        """
+        files = {
+            ".": {"a.mp3": (1, 1.5, None)},
+            "Album": {"b.mp3": (2, 2.5, "hash")},
+        }
+        self.state.set_files(DEVICE, MAPPING, files)
+
+        self.assertEqual(self.state.get_files(DEVICE, MAPPING), files)
+        self.assertEqual(self.state.get_files("other:device", MAPPING), {})
+        self.assertEqual(self.state.get_files(DEVICE, "/src==>/other"), {})
+
+    def test_set_files_replaces_directory(self):
+        """
+        Test 'set_files' replaces files recorded for a directory, but keeps
+        other directories untouched.
+        """
+        self.state.set_files(
+            DEVICE,
+            MAPPING,
+            {
+                ".": {"a.mp3": (1, 1.5, None)},
+                "Album": {"b.mp3": (2, 2.5, None)},
+            },
+        )
+        self.state.set_files(DEVICE, MAPPING, {".": {"c.mp3": (3, 3.5, None)}})
+
+        self.assertEqual(
+            self.state.get_files(DEVICE, MAPPING),
+            {
+                ".": {"c.mp3": (3, 3.5, None)},
+                "Album": {"b.mp3": (2, 2.5, None)},
+            },
+        )
+
+    def test_persistent(self):
+        """
+        Test recorded files survive re-opening the database.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "nested", "state.db")
+
+            state = StateStore(path)
+            state.set_files(DEVICE, MAPPING, {".": {"a.mp3": (1, 1.5, None)}})
+            state.close()
+
+            state = StateStore(path)
+            self.assertEqual(
+                state.get_files(DEVICE, MAPPING),
+                {".": {"a.mp3": (1, 1.5, None)}},
+            )
+            state.close()
+
+    def test_hashes(self):
+        """
+        Test cached hash is returned only for an unmodified file.
+        """
+        self.assertIsNone(self.state.get_hash(1, 2, 3, 4))
+
+        self.state.set_hashes([(1, 2, 3, 4, "hash")])
+        self.assertEqual(self.state.get_hash(1, 2, 3, 4), "hash")
+        self.assertIsNone(self.state.get_hash(1, 2, 3, 5))
+
+        self.state.set_hashes([(1, 2, 3, 5, "new hash")])
+        self.assertEqual(self.state.get_hash(1, 2, 3, 5), "new hash")
+
+    def test_set_dirs(self):
+        """
+        Test 'set_dirs' replaces all directories recorded for a mapping.
+        """
+        self.state.set_dirs(
+            DEVICE,
+            MAPPING,
+            {".": (1.5, ["Album"], ["a.mp3"]), "Album": (2.5, [], [])},
+        )
+        self.state.set_dirs(DEVICE, MAPPING, {".": (3.5, [], ["a.mp3"])})
+
+        self.assertEqual(
+            self.state.get_dirs(DEVICE, MAPPING), {".": (3.5, [], ["a.mp3"])}
+        )
+        self.assertEqual(self.state.get_dirs("other:device", MAPPING), {})
+
+    def test_set_baseline(self):
+        """
+        Test 'set_baseline' replaces the whole baseline of a mapping.
+        """
+        self.state.set_baseline(
+            DEVICE,
+            MAPPING,
+            {
+                ".": {"a.mp3": (1, 1.5, 1, 2.5)},
+                "Album": {"b.mp3": (2, 2, 2, 3)},
+            },
+        )
+        self.state.set_baseline(
+            DEVICE, MAPPING, {".": {"c.mp3": (3, 3.5, 3, 4.5)}}
+        )
+
+        self.assertEqual(
+            self.state.get_baseline(DEVICE, MAPPING),
+            {".": {"c.mp3": (3, 3.5, 3, 4.5)}},
+        )
+        self.assertEqual(self.state.get_baseline("other:device", MAPPING), {})
+
+    def test_costs(self):
+        """
+        Test 'add_costs' adds operation costs to the recorded ones.
+        """
+        self.assertEqual(self.state.get_costs(DEVICE), {})
+
+        self.state.add_costs(DEVICE, {"copy": [1.0, 2.0, 4.0, 0.5, 1.0]})
+        self.state.add_costs(
+            DEVICE,
+            {"copy": [1.0, 2.0, 4.0, 0.5, 1.0], "rm": [1.0, 0, 0, 0.2, 0]},
+        )
+
+        self.assertEqual(
+            self.state.get_costs(DEVICE),
+            {"copy": [2.0, 4.0, 8.0, 1.0, 2.0], "rm": [1.0, 0, 0, 0.2, 0]},
+        )
+        self.assertEqual(self.state.get_costs("other:device"), {})
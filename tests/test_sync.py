@@ -1,15 +1,32 @@
 """Tests for synchronization functionality."""
 
 
+import asyncio
 from io import StringIO
 import os
+import tempfile
+import threading
+import time
 import unittest
-from unittest.mock import call, patch
+from unittest.mock import ANY, call, patch
 
 import pysyncdroid
-from pysyncdroid.exceptions import BashException, IgnoredTypeException
-from pysyncdroid.gvfs import cp, mkdir, rm
-from pysyncdroid.sync import Sync, readlink, REMOVE, SYNCHRONIZE
+import pysyncdroid.transport
+from pysyncdroid.costs import Costs, COPY_OP, REMOVE_OP
+from pysyncdroid.exceptions import BashException, SyncException
+from pysyncdroid.hashing import Hasher
+from pysyncdroid.manifest import MANIFEST_NAME, SPOT_CHECKS
+from pysyncdroid.plan import load_plans
+from pysyncdroid.state import StateStore
+from pysyncdroid.sync import Sync, readlink, IGNORE, REMOVE, SYNCHRONIZE
+from pysyncdroid.transport import (
+    FileInfo,
+    GIO,
+    GvfsTransport,
+    LocalTransport,
+    SimulatedTransport,
+)
+from tests.test_utils import run_async
 
 
 FAKE_MTP_DETAILS = (
@@ -114,6 +131,22 @@ class TestSync(unittest.TestCase):
         sync._verbose("Hello World!")
         self.assertEqual("", mock_stdout.getvalue().strip())
 
+    #
+    # '__init__()'
+    def test_init_transport(self):
+        """
+        Test 'Sync' accepts both transport names and instances.
+        """
+        sync = Sync(FAKE_MTP_DETAILS, "", "")
+        self.assertIsInstance(sync.transport, GvfsTransport)
+
+        transport = LocalTransport()
+        sync = Sync(FAKE_MTP_DETAILS, "", "", backend=transport)
+        self.assertIs(sync.transport, transport)
+
+        with self.assertRaises(ValueError):
+            Sync(FAKE_MTP_DETAILS, "", "", backend="ftp")
+
     #
     # 'gvfs_wrapper()'
     @patch("pysyncdroid.gvfs.mkdir")
@@ -319,41 +352,47 @@ class TestSync(unittest.TestCase):
         self.assertIn("src_dir_fls", sync_data)
         self.assertIn("dst_dir_abs", sync_data)
         self.assertIn("dst_dir_fls", sync_data)
+        self.assertIn("src_dir_stats", sync_data)
+        self.assertIn("dst_dir_stats", sync_data)
+        self.assertIn("src_dir_hashes", sync_data)
+        self.assertIn("recorded_dir_fls", sync_data)
+        self.assertIn("src_dir_skipped", sync_data)
+        self.assertIn("plan", sync_data)
 
     #
-    # 'handle_ignored_file_type()'
-    def test_handle_ignored_file_type(self):
+    # 'filter'
+    def test_filter_ignored_file_type(self):
         """
-        Test 'handle_ignored_file_type' raises IgnoredTypeException exception
-        only for files with specified extensions.
+        Test 'filter' excludes only files with specified extensions.
         """
-        sync = Sync(FAKE_MTP_DETAILS, "", "", ignore_file_types=["jpg"])
+        sync = Sync(FAKE_MTP_DETAILS, "", "", ignore_file_types=["JPG"])
         sync.set_source_abs()
         sync.set_destination_abs()
 
-        # this one is fine
-        sync.handle_ignored_file_type("/tmp/test.png")
-
-        # this one should be ignored
-        with self.assertRaises(IgnoredTypeException):
-            sync.handle_ignored_file_type("/tmp/test.jpg")
+        self.assertFalse(sync.filter.excludes_file("test.png"))
+        self.assertTrue(sync.filter.excludes_file("test.jpg"))
 
     #
     # 'get_source_subdir_data()'
-    @patch.object(pysyncdroid.sync.Sync, "handle_ignored_file_type")
-    def test_get_source_subdir_data(self, mock_handle_ignored_file_type):
+    def test_get_source_subdir_data(self):
         """
         Test 'get_source_subdir_data' populates 'src_dir_fls' with collected
         data.
         """
-        mock_handle_ignored_file_type.side_effect = [
-            None,
-            IgnoredTypeException,
-            None,
+        src_subdir_files = [
+            FileInfo("song.mp3", 1024, 1500000000.0, False),
+            FileInfo("cover.jpg", 512, 1500000000.0, False),
+            FileInfo("demo.mp3", 2048, 1500000001.0, False),
+            FileInfo("live.mp3", 4096, 1500000001.0, False),
         ]
-        src_subdir_files = ["song.mp3", "cover.jpg", "demo.mp3"]
 
-        sync = Sync(FAKE_MTP_DETAILS, "/tmp", "Card/Music")
+        sync = Sync(
+            FAKE_MTP_DETAILS,
+            "/tmp",
+            "Card/Music",
+            ignore_file_types=["jpg"],
+            max_size=2048,
+        )
         sync.set_source_abs()
         sync.set_destination_abs()
         sync_data = self._create_empty_sync_data(sync)
@@ -363,19 +402,29 @@ class TestSync(unittest.TestCase):
             sync_data["src_dir_fls"],
             ["/tmp/testdir/song.mp3", "/tmp/testdir/demo.mp3"],
         )
+        self.assertEqual(
+            sync_data["src_dir_stats"],
+            {
+                "/tmp/testdir/song.mp3": (1024, 1500000000.0),
+                "/tmp/testdir/demo.mp3": (2048, 1500000001.0),
+            },
+        )
+        self.assertEqual(sync_data["src_dir_skipped"], {"live.mp3"})
 
     #
     # 'get_destination_subdir_data()'
+    @patch.object(pysyncdroid.transport.Transport, "scandir")
     @patch("pysyncdroid.sync.os.path.exists")
     @patch.object(pysyncdroid.sync.Sync, "gvfs_wrapper")
     def test_get_destination_subdir_data_doesnt_exist(
-        self, mock_gvfs_wrapper, mock_path_exists
+        self, mock_gvfs_wrapper, mock_path_exists, mock_scandir
     ):
         """
-        Test 'get_destination_subdir_data' creates destination direcotry if it
-        doesn't exist.
+        Test 'get_destination_subdir_data' plans creating destination
+        direcotry if it doesn't exist.
         """
-        mock_path_exists.side_effect = (True, False)
+        mock_path_exists.return_value = True
+        mock_scandir.side_effect = FileNotFoundError
 
         sync = Sync(FAKE_MTP_DETAILS, "/tmp", "Card/Music")
         sync.set_source_abs()
@@ -383,34 +432,66 @@ class TestSync(unittest.TestCase):
         sync_data = self._create_empty_sync_data(sync)
         sync.get_destination_subdir_data(sync_data)
 
+        mock_gvfs_wrapper.assert_not_called()
+        self.assertFalse(sync_data["dst_dir_fls"])
+
+        sync.create_dirs()
         mock_gvfs_wrapper.assert_called_once_with(
-            mkdir,
-            "/run/user/<user>/gvfs/mtp:host=%5Busb%3A002%2C003%5D/Card/Music/testdir",  # noqa
+            sync.transport.mkdir_batch,
+            [
+                "/run/user/<user>/gvfs/mtp:host=%5Busb%3A002%2C003%5D/Card/Music/testdir"  # noqa
+            ],
+        )
+
+    @patch.object(pysyncdroid.transport.Transport, "scandir")
+    @patch.object(pysyncdroid.sync.Sync, "gvfs_wrapper")
+    def test_get_destination_subdir_data_missing_parent(
+        self, mock_gvfs_wrapper, mock_scandir
+    ):
+        """
+        Test 'get_destination_subdir_data' doesn't list subdirs of a missing
+        directory and 'create_dirs' creates only the leaf ones.
+        """
+        mock_scandir.side_effect = FileNotFoundError
+
+        sync = Sync(FAKE_MTP_DETAILS, "/src", "/dst")
+        for subdir in ("/a", "/a/b", "/a/b/c", "/a/d"):
+            sync.get_destination_subdir_data(
+                sync.sync_data_template("/src" + subdir, "/dst" + subdir)
+            )
+
+        mock_scandir.assert_called_once_with("/dst/a")
+
+        sync.create_dirs()
+        mock_gvfs_wrapper.assert_called_once_with(
+            sync.transport.mkdir_batch, ["/dst/a/b/c", "/dst/a/d"]
         )
-        self.assertFalse(sync_data["dst_dir_fls"])
 
+    @patch.object(pysyncdroid.transport.Transport, "scandir")
     @patch("pysyncdroid.sync.os.path.exists")
-    @patch("pysyncdroid.sync.os.listdir")
-    @patch.object(pysyncdroid.sync.Sync, "handle_ignored_file_type")
     def test_get_destination_subdir_data_(
-        self, mock_handle_ignored_file_type, mock_listdir, mock_path_exists
+        self, mock_path_exists, mock_scandir
     ):
         """
         Test 'get_destination_subdir_data' populates 'dst_dir_fls' with
-        collected data.
+        collected data, leaving out excluded files and files whose source
+        counterparts are skipped.
         """
         mock_path_exists.return_value = True
-        mock_listdir.return_value = ["song.mp3", "cover.jpg", "demo.mp3"]
-        mock_handle_ignored_file_type.side_effect = [
-            None,
-            IgnoredTypeException,
-            None,
+        mock_scandir.return_value = [
+            FileInfo("song.mp3", 1024, 1500000000.0, False),
+            FileInfo("cover.jpg", 512, 1500000000.0, False),
+            FileInfo("demo.mp3", 2048, 1500000000.0, False),
+            FileInfo("live.mp3", 4096, 1500000000.0, False),
         ]
 
-        sync = Sync(FAKE_MTP_DETAILS, "/tmp", "Card/Music")
+        sync = Sync(
+            FAKE_MTP_DETAILS, "/tmp", "Card/Music", ignore_file_types=["jpg"]
+        )
         sync.set_source_abs()
         sync.set_destination_abs()
         sync_data = self._create_empty_sync_data(sync)
+        sync_data["src_dir_skipped"].add("live.mp3")
         sync.get_destination_subdir_data(sync_data)
 
         self.assertEqual(
@@ -421,24 +502,116 @@ class TestSync(unittest.TestCase):
             ],
         )
 
+    @patch.object(pysyncdroid.transport.Transport, "scandir")
+    @patch("pysyncdroid.sync.os.path.exists")
+    def test_get_destination_subdir_data_update(
+        self, mock_path_exists, mock_scandir
+    ):
+        """
+        Test 'get_destination_subdir_data' collects files size and
+        modification time from the directory listing.
+        """
+        mock_path_exists.return_value = True
+        mock_scandir.return_value = [
+            FileInfo("song.mp3", 1024, 1500000000.0, False),
+            FileInfo("Covers", 4096, 1500000000.0, True),
+        ]
+
+        sync = Sync(FAKE_MTP_DETAILS, "/tmp", "Card/Music")
+        sync.set_source_abs()
+        sync.set_destination_abs()
+        sync_data = self._create_empty_sync_data(sync)
+        sync.get_destination_subdir_data(sync_data)
+
+        dst_file = os.path.join(sync_data["dst_dir_abs"], "song.mp3")
+        self.assertEqual(sync_data["dst_dir_fls"], [dst_file])
+        self.assertEqual(
+            sync_data["dst_dir_stats"], {dst_file: (1024, 1500000000.0)}
+        )
+
+    #
+    # 'walk_source()'
+    def test_walk_source(self):
+        """
+        Test 'walk_source' walks the source top-down, listing each directory
+        once, and doesn't walk symlinked directories.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            album_dir = os.path.join(src_dir, "Artist", "Album")
+            os.makedirs(album_dir)
+            with open(os.path.join(album_dir, "song.mp3"), "w") as f:
+                f.write("song")
+            os.symlink(album_dir, os.path.join(src_dir, "Link"))
+
+            sync = Sync(
+                FAKE_MTP_DETAILS, src_dir, "/dst", backend=SimulatedTransport()
+            )
+            walk = [
+                (root, dirs, [(e.name, e.size) for e in files])
+                for root, dirs, files in sync.walk_source()
+            ]
+
+            self.assertEqual(
+                walk,
+                [
+                    (src_dir, ["Artist"], []),
+                    (os.path.dirname(album_dir), ["Album"], []),
+                    (album_dir, [], [("song.mp3", 4)]),
+                ],
+            )
+            self.assertEqual(sync.transport.calls, {"listdir": 3})
+
+    def test_walk_source_device(self):
+        """
+        Test 'walk_source' lists sibling subtrees of a source on the device
+        concurrently.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            src_dir = os.path.join(tmp_dir, "mtp:host=device", "DCIM")
+            for album in ("A", "B", "C", "D"):
+                os.makedirs(os.path.join(src_dir, album))
+
+            sync = Sync(
+                FAKE_MTP_DETAILS,
+                src_dir,
+                "/dst",
+                backend=SimulatedTransport(latency=0.05),
+            )
+
+            start = time.time()
+            roots = [root for root, _, _ in sync.walk_source()]
+
+            # the source, then its 4 subdirs at once
+            self.assertLess(time.time() - start, 0.2)
+            self.assertEqual(roots[0], src_dir)
+            self.assertEqual(
+                sorted(roots[1:]),
+                [os.path.join(src_dir, a) for a in ("A", "B", "C", "D")],
+            )
+
     #
     # 'get_sync_data()'
-    @patch("pysyncdroid.sync.os.walk")
+    @patch.object(pysyncdroid.transport.Transport, "scandir")
     @patch.object(pysyncdroid.sync.Sync, "set_destination_subdir_abs")
     @patch.object(pysyncdroid.sync.Sync, "get_destination_subdir_data")
     def test_get_sync_data(
         self,
         mock_get_destination_subdir_data,
         mock_set_destination_subdir_abs,
-        mock_oswalk,
+        mock_scandir,
     ):
         """
         Test 'get_sync_data' gets list of valid sync_data dictionaries.
         """
-        mock_oswalk.return_value = (
-            ("/tmp/testdir", ["testsubdir"], ["song.mp3", "demo.mp3"]),
-            ("/tmp/testdir/testsubdir", ["testsubdir2"], []),
-            ("/tmp/testdir/testsubdir/testsubdir2", [], ["song2.mp3"]),
+        mock_scandir.side_effect = (
+            [FileInfo("testdir", 4096, 1500000000.0, True)],
+            [
+                FileInfo("testsubdir", 4096, 1500000000.0, True),
+                FileInfo("song.mp3", 1024, 1500000000.0, False),
+                FileInfo("demo.mp3", 2048, 1500000000.0, False),
+            ],
+            [FileInfo("testsubdir2", 4096, 1500000000.0, True)],
+            [FileInfo("song2.mp3", 512, 1500000000.0, False)],
         )
         mock_set_destination_subdir_abs.side_effect = (
             "/run/user/<user>/gvfs/mtp:host=%5Busb%3A002%2C003%5D/Card/Music/testdir",  # noqa
@@ -462,6 +635,15 @@ class TestSync(unittest.TestCase):
                 ],
                 "dst_dir_fls": [],
                 "dst_dir_abs": "/run/user/<user>/gvfs/mtp:host=%5Busb%3A002%2C003%5D/Card/Music/testdir",  # noqa
+                "src_dir_stats": {
+                    "/tmp/testdir/song.mp3": (1024, 1500000000.0),
+                    "/tmp/testdir/demo.mp3": (2048, 1500000000.0),
+                },
+                "dst_dir_stats": {},
+                "src_dir_hashes": {},
+                "recorded_dir_fls": {},
+                "src_dir_skipped": set(),
+                "plan": None,
             },
             {
                 "src_dir_abs": "/tmp/testdir/testsubdir/testsubdir2",
@@ -470,6 +652,17 @@ class TestSync(unittest.TestCase):
                 ],
                 "dst_dir_fls": [],
                 "dst_dir_abs": "/run/user/<user>/gvfs/mtp:host=%5Busb%3A002%2C003%5D/Card/Music/testdir/testsubdir2",  # noqa
+                "src_dir_stats": {
+                    "/tmp/testdir/testsubdir/testsubdir2/song2.mp3": (
+                        512,
+                        1500000000.0,
+                    )
+                },
+                "dst_dir_stats": {},
+                "src_dir_hashes": {},
+                "recorded_dir_fls": {},
+                "src_dir_skipped": set(),
+                "plan": None,
             },
         ]
 
@@ -491,7 +684,48 @@ class TestSync(unittest.TestCase):
         sync.set_destination_abs()
         sync.copy_file(src_file, dst_file)
 
-        mock_gfvs_wrapper.assert_called_once_with(cp, src_file, dst_file)
+        mock_gfvs_wrapper.assert_called_once_with(
+            sync.transport.cp, src_file, dst_file
+        )
+
+    #
+    # 'copy_files()'
+    @patch.object(pysyncdroid.sync.Sync, "copy_file")
+    def test_copy_files(self, mock_copy_file):
+        """
+        Test 'copy_files' copies files one by one by default.
+        """
+        files = [("/tmp/a.mp3", "/dst/a.mp3"), ("/tmp/b.mp3", "/dst/b.mp3")]
+
+        sync = Sync(FAKE_MTP_DETAILS, "/tmp", "Card/Music")
+        sync.copy_files(files)
+
+        mock_copy_file.assert_has_calls([call(*f) for f in files])
+
+    @patch("pysyncdroid.gio.cp_batch")
+    @patch.object(pysyncdroid.sync.Sync, "copy_file")
+    def test_copy_files_gio(self, mock_copy_file, mock_cp_batch):
+        """
+        Test 'copy_files' copies files in batches per destination directory
+        and retries failed files one by one.
+        """
+        mock_cp_batch.side_effect = [{"/tmp/b.mp3": "Failed"}, {}]
+        files = [
+            ("/tmp/a.mp3", "/dst/a.mp3"),
+            ("/tmp/b.mp3", "/dst/b.mp3"),
+            ("/tmp/c.mp3", "/dst/sub/c.mp3"),
+        ]
+
+        sync = Sync(FAKE_MTP_DETAILS, "/tmp", "Card/Music", backend=GIO)
+        sync.copy_files(files)
+
+        mock_cp_batch.assert_has_calls(
+            [
+                call(["/tmp/a.mp3", "/tmp/b.mp3"], "/dst"),
+                call(["/tmp/c.mp3"], "/dst/sub"),
+            ]
+        )
+        mock_copy_file.assert_called_once_with("/tmp/b.mp3", "/dst/b.mp3")
 
     #
     # 'do_sync()'
@@ -542,6 +776,102 @@ class TestSync(unittest.TestCase):
         )
         mock_copy_file.assert_has_calls(calls)
 
+    #
+    # 'is_modified()'
+    def test_is_modified(self):
+        """
+        Test 'is_modified' compares files size and modification time.
+        """
+        sync_data = {
+            "src_dir_stats": {
+                "/src/same.mp3": (10, 100.0),
+                "/src/size.mp3": (10, 100.0),
+                "/src/newer.mp3": (10, 103.0),
+                "/src/tolerated.mp3": (10, 101.5),
+                "/src/older.mp3": (10, 50.0),
+            },
+            "dst_dir_stats": {
+                "/dst/same.mp3": (10, 100.0),
+                "/dst/size.mp3": (20, 100.0),
+                "/dst/newer.mp3": (10, 100.0),
+                "/dst/tolerated.mp3": (10, 100.0),
+                "/dst/older.mp3": (10, 100.0),
+            },
+        }
+        sync = Sync(FAKE_MTP_DETAILS, "/tmp", "Card/Music", update=True)
+
+        def is_modified(name):
+            return sync.is_modified("/src/" + name, "/dst/" + name, sync_data)
+
+        self.assertFalse(is_modified("same.mp3"))
+        self.assertTrue(is_modified("size.mp3"))
+        self.assertTrue(is_modified("newer.mp3"))
+        self.assertFalse(is_modified("tolerated.mp3"))
+        self.assertFalse(is_modified("older.mp3"))
+        self.assertTrue(is_modified("unknown.mp3"))
+
+    @patch.object(pysyncdroid.sync.Sync, "copy_file")
+    def test_do_sync_update(self, mock_copy_file):
+        """
+        Test 'do_sync' overwrites only modified existing files in update
+        mode.
+        """
+        sync_data = {
+            "src_dir_abs": "/src",
+            "src_dir_fls": ["/src/same.mp3", "/src/edited.mp3"],
+            "dst_dir_abs": "/dst",
+            "dst_dir_fls": ["/dst/same.mp3", "/dst/edited.mp3"],
+            "src_dir_stats": {
+                "/src/same.mp3": (10, 100.0),
+                "/src/edited.mp3": (12, 100.0),
+            },
+            "dst_dir_stats": {
+                "/dst/same.mp3": (10, 100.0),
+                "/dst/edited.mp3": (10, 100.0),
+            },
+        }
+
+        sync = Sync(FAKE_MTP_DETAILS, "/tmp", "Card/Music", update=True)
+        sync.do_sync(sync_data)
+
+        mock_copy_file.assert_called_once_with(
+            "/src/edited.mp3", "/dst/edited.mp3"
+        )
+        self.assertEqual(sync_data["dst_dir_fls"], [])
+
+    #
+    # 'get_plan()'
+    def test_get_plan(self):
+        """
+        Test 'get_plan' plans copy, skip and unmatched files actions and
+        leaves only unmatched files in the list of destination files.
+        """
+        for unmatched, action in (
+            (IGNORE, "skip"),
+            (REMOVE, "remove"),
+            (SYNCHRONIZE, "pull"),
+        ):
+            sync_data = {
+                "src_dir_abs": "/src",
+                "src_dir_fls": ["/src/new.mp3", "/src/same.mp3"],
+                "dst_dir_abs": "/dst",
+                "dst_dir_fls": ["/dst/old.mp3", "/dst/same.mp3"],
+            }
+
+            sync = Sync(FAKE_MTP_DETAILS, "/src", "/dst", unmatched=unmatched)
+            dir_plan = sync.get_plan(sync_data)
+
+            self.assertEqual(
+                [(a.kind, a.name) for a in dir_plan.actions],
+                [
+                    ("copy", "new.mp3"),
+                    ("skip", "same.mp3"),
+                    (action, "old.mp3"),
+                ],
+            )
+            self.assertEqual(sync_data["dst_dir_fls"], ["/dst/old.mp3"])
+            self.assertIs(sync_data["plan"], dir_plan)
+
     #
     # 'handle_destination_dir_data()'
     @patch.object(pysyncdroid.sync.Sync, "gvfs_wrapper")
@@ -553,7 +883,14 @@ class TestSync(unittest.TestCase):
         sync = Sync(FAKE_MTP_DETAILS, "/tmp", "Card/Music", unmatched=REMOVE)
         sync.set_source_abs()
         sync.set_destination_abs()
-        sync.handle_destination_dir_data({"dst_dir_fls": []})
+        sync.handle_destination_dir_data(
+            {
+                "src_dir_abs": "/tmp/testdir",
+                "src_dir_fls": ["/tmp/testdir/song.mp3"],
+                "dst_dir_abs": "/run/user/<user>/gvfs/mtp:host=%5Busb%3A002%2C003%5D/Card/Music/testdir",  # noqa
+                "dst_dir_fls": [],
+            }
+        )
 
         mock_gfvs_wrapper.assert_not_called()
 
@@ -567,14 +904,17 @@ class TestSync(unittest.TestCase):
         sync.set_destination_abs()
         sync.handle_destination_dir_data(
             {
+                "src_dir_abs": "/tmp/testdir",
+                "src_dir_fls": [],
                 "dst_dir_fls": [
                     "/run/user/<user>/gvfs/mtp:host=%5Busb%3A002%2C003%5D/Card/Music/testdir/song.mp3"  # noqa
-                ]
+                ],
+                "dst_dir_abs": "/run/user/<user>/gvfs/mtp:host=%5Busb%3A002%2C003%5D/Card/Music/testdir",  # noqa
             }
         )
 
         mock_gfvs_wrapper.assert_called_once_with(
-            rm,
+            sync.transport.rm,
             "/run/user/<user>/gvfs/mtp:host=%5Busb%3A002%2C003%5D/Card/Music/testdir/song.mp3",  # noqa
         )
 
@@ -592,6 +932,7 @@ class TestSync(unittest.TestCase):
         sync.handle_destination_dir_data(
             {
                 "src_dir_abs": "/tmp/testdir",
+                "src_dir_fls": [],
                 "dst_dir_fls": [
                     "/run/user/<user>/gvfs/mtp:host=%5Busb%3A002%2C003%5D/Card/Music/testdir/song.mp3"  # noqa
                 ],
@@ -600,19 +941,19 @@ class TestSync(unittest.TestCase):
         )
 
         mock_copy_file.assert_called_once_with(
-            dst_file="/tmp/testdir/song.mp3",
-            src_file="/run/user/<user>/gvfs/mtp:host=%5Busb%3A002%2C003%5D/Card/Music/testdir/song.mp3",  # noqa
+            "/run/user/<user>/gvfs/mtp:host=%5Busb%3A002%2C003%5D/Card/Music/testdir/song.mp3",  # noqa
+            "/tmp/testdir/song.mp3",
         )
 
     #
     # 'sync()'
     @patch.object(pysyncdroid.sync.Sync, "do_sync")
-    @patch.object(pysyncdroid.sync.Sync, "get_sync_data")
-    def test_sync_no_data(self, mock_get_sync_data, mock_do_sync):
+    @patch.object(pysyncdroid.sync.Sync, "iter_sync_data")
+    def test_sync_no_data(self, mock_iter_sync_data, mock_do_sync):
         """
         Test 'sync' ends early if there are no files to synchronize.
         """
-        mock_get_sync_data.return_value = [{"src_dir_fls": []}]
+        mock_iter_sync_data.return_value = [{"src_dir_fls": []}]
 
         sync = Sync(FAKE_MTP_DETAILS, "/tmp", "Card/Music")
         sync.set_source_abs()
@@ -622,18 +963,18 @@ class TestSync(unittest.TestCase):
         mock_do_sync.assert_not_called()
 
     @patch.object(pysyncdroid.sync.Sync, "do_sync")
-    @patch.object(pysyncdroid.sync.Sync, "get_sync_data")
+    @patch.object(pysyncdroid.sync.Sync, "iter_sync_data")
     @patch.object(pysyncdroid.sync.Sync, "handle_destination_dir_data")
     def test_sync_ignore_unmatched(
         self,
         mock_handle_destination_dir_data,
-        mock_get_sync_data,
+        mock_iter_sync_data,
         mock_do_sync,
     ):
         """
         Test 'sync' ignores unmatched files.
         """
-        mock_get_sync_data.return_value = [FAKE_SYNC_DATA]
+        mock_iter_sync_data.return_value = [FAKE_SYNC_DATA]
 
         sync = Sync(FAKE_MTP_DETAILS, "/tmp", "Card/Music")
         sync.set_source_abs()
@@ -644,18 +985,18 @@ class TestSync(unittest.TestCase):
         mock_handle_destination_dir_data.assert_not_called()
 
     @patch.object(pysyncdroid.sync.Sync, "do_sync")
-    @patch.object(pysyncdroid.sync.Sync, "get_sync_data")
+    @patch.object(pysyncdroid.sync.Sync, "iter_sync_data")
     @patch.object(pysyncdroid.sync.Sync, "handle_destination_dir_data")
     def test_sync_handle_unmatched(
         self,
         mock_handle_destination_dir_data,
-        mock_get_sync_data,
+        mock_iter_sync_data,
         mock_do_sync,
     ):
         """
         Test 'sync' handles (removes, in this case) unmatched files.
         """
-        mock_get_sync_data.return_value = [FAKE_SYNC_DATA]
+        mock_iter_sync_data.return_value = [FAKE_SYNC_DATA]
 
         sync = Sync(FAKE_MTP_DETAILS, "/tmp", "Card/Music", unmatched=REMOVE)
         sync.set_source_abs()
@@ -666,3 +1007,1228 @@ class TestSync(unittest.TestCase):
         mock_handle_destination_dir_data.assert_called_once_with(
             FAKE_SYNC_DATA
         )
+
+    @patch.object(pysyncdroid.sync.Sync, "copy_file")
+    @patch.object(pysyncdroid.sync.Sync, "iter_sync_data")
+    def test_sync_jobs(self, mock_iter_sync_data, mock_copy_file):
+        """
+        Test 'sync' copies files concurrently when running multiple jobs.
+        """
+        mock_iter_sync_data.return_value = [
+            {
+                "src_dir_abs": "/tmp/testdir",
+                "src_dir_fls": [
+                    "/tmp/testdir/song.mp3",
+                    "/tmp/testdir/demo.mp3",
+                ],
+                "dst_dir_abs": "/dst/testdir",
+                "dst_dir_fls": [],
+            }
+        ]
+
+        sync = Sync(FAKE_MTP_DETAILS, "/tmp", "Card/Music", jobs=2)
+        sync.sync()
+
+        self.assertEqual(mock_copy_file.call_count, 2)
+        self.assertIsNone(sync.job_pool)
+
+    @patch.object(pysyncdroid.sync.Sync, "copy_file")
+    @patch.object(pysyncdroid.sync.Sync, "iter_sync_data")
+    def test_sync_streamed(self, mock_iter_sync_data, mock_copy_file):
+        """
+        Test 'sync' copies files of scanned directories while scanning the
+        others.
+        """
+        copied = threading.Event()
+        scanned_after_copy = []
+        mock_copy_file.side_effect = lambda *args: copied.set()
+
+        def iter_sync_data():
+            for name in ("first", "second"):
+                yield {
+                    "src_dir_abs": "/tmp/" + name,
+                    "src_dir_fls": ["/tmp/{n}/song.mp3".format(n=name)],
+                    "dst_dir_abs": "/dst/" + name,
+                    "dst_dir_fls": [],
+                }
+                scanned_after_copy.append(copied.wait(timeout=1))
+
+        mock_iter_sync_data.side_effect = iter_sync_data
+
+        sync = Sync(FAKE_MTP_DETAILS, "/tmp", "Card/Music")
+        sync.sync()
+
+        self.assertEqual(scanned_after_copy, [True, True])
+        self.assertEqual(mock_copy_file.call_count, 2)
+
+    @patch.object(pysyncdroid.sync.Sync, "copy_file")
+    @patch.object(pysyncdroid.sync.Sync, "iter_sync_data")
+    def test_sync_jobs_error(self, mock_iter_sync_data, mock_copy_file):
+        """
+        Test 'sync' stops on the first error when running multiple jobs.
+        """
+        mock_copy_file.side_effect = BashException("Permission denied")
+        mock_iter_sync_data.return_value = [
+            {
+                "src_dir_abs": "/tmp/testdir",
+                "src_dir_fls": ["/tmp/testdir/song.mp3"],
+                "dst_dir_abs": "/dst/testdir",
+                "dst_dir_fls": [],
+            }
+        ]
+
+        sync = Sync(FAKE_MTP_DETAILS, "/tmp", "Card/Music", jobs=2)
+
+        with self.assertRaises(BashException):
+            sync.sync()
+
+    #
+    # 'gvfs_wrapper_async()'
+    def test_gvfs_wrapper_async_bash_exception_exact(self):
+        """
+        Test 'gvfs_wrapper_async' re-mounts the device and tries again when
+        the connection was reset.
+        """
+        calls = []
+
+        async def mkdir_async(path):
+            calls.append(path)
+            if len(calls) == 1:
+                raise BashException("Connection reset by peer")
+
+        async def mount_async(mtp_url):
+            calls.append(mtp_url)
+
+        sync = Sync(FAKE_MTP_DETAILS, "", "")
+        sync.transport.mount_async = mount_async
+        run_async(sync.gvfs_wrapper_async(mkdir_async, "/tmp/dir"))
+
+        self.assertEqual(calls, ["/tmp/dir", sync.mtp_url, "/tmp/dir"])
+
+    #
+    # 'sync_async()'
+    @patch.object(pysyncdroid.sync.Sync, "get_sync_data")
+    def test_sync_async(self, mock_get_sync_data):
+        """
+        Test 'sync_async' copies files and handles unmatched files.
+        """
+        mock_get_sync_data.return_value = [
+            {
+                "src_dir_abs": "/tmp/testdir",
+                "src_dir_fls": ["/tmp/testdir/song.mp3"],
+                "dst_dir_abs": "/dst/testdir",
+                "dst_dir_fls": ["/dst/testdir/oldsong.mp3"],
+            }
+        ]
+        calls = []
+
+        async def gvfs_wrapper_async(func, *args):
+            calls.append(call(func, *args))
+
+        sync = Sync(
+            FAKE_MTP_DETAILS, "/tmp", "Card/Music", unmatched=REMOVE, jobs=2
+        )
+        sync.gvfs_wrapper_async = gvfs_wrapper_async
+        run_async(sync.sync_async())
+
+        self.assertEqual(
+            calls,
+            [
+                call(
+                    sync.transport.cp_async,
+                    "/tmp/testdir/song.mp3",
+                    "/dst/testdir/song.mp3",
+                ),
+                call(sync.transport.rm_async, "/dst/testdir/oldsong.mp3"),
+            ],
+        )
+
+    @patch.object(pysyncdroid.sync.Sync, "get_sync_data")
+    def test_sync_async_error(self, mock_get_sync_data):
+        """
+        Test 'sync_async' cancels other operations on the first error.
+        """
+        mock_get_sync_data.return_value = [
+            {
+                "src_dir_abs": "/tmp/testdir",
+                "src_dir_fls": ["/tmp/testdir/a.mp3", "/tmp/testdir/b.mp3"],
+                "dst_dir_abs": "/dst/testdir",
+                "dst_dir_fls": [],
+            }
+        ]
+        cancelled = []
+
+        async def copy_file_async(src_file, dst_file):
+            if src_file.endswith("a.mp3"):
+                raise BashException("Permission denied")
+
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(src_file)
+                raise
+
+        sync = Sync(FAKE_MTP_DETAILS, "/tmp", "Card/Music", jobs=2)
+        sync.copy_file_async = copy_file_async
+
+        with self.assertRaises(BashException):
+            run_async(sync.sync_async())
+
+        self.assertEqual(cancelled, ["/tmp/testdir/b.mp3"])
+
+
+    #
+    # 'sync_paths()'
+    @patch.object(pysyncdroid.sync.Sync, "copy_file")
+    @patch.object(pysyncdroid.sync.Sync, "gvfs_wrapper")
+    def test_sync_paths(self, mock_gvfs_wrapper, mock_copy_file):
+        """
+        Test 'sync_paths' copies changed files and removes removed files
+        without listing any directory.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            song = os.path.join(src_dir, "Album", "song.mp3")
+            os.makedirs(os.path.dirname(song))
+            with open(song, "w"):
+                pass
+
+            sync = Sync(
+                FAKE_MTP_DETAILS,
+                src_dir,
+                "/dst",
+                unmatched=REMOVE,
+                ignore_file_types=["txt"],
+                backend=LocalTransport(),
+            )
+            with patch.object(
+                sync.transport, "exists", return_value=True
+            ), patch.object(sync.transport, "scandir") as mock_scandir:
+                sync.sync_paths(
+                    [song, os.path.join(src_dir, "gone.mp3")],
+                    [
+                        os.path.join(src_dir, "old.mp3"),
+                        os.path.join(src_dir, "notes.txt"),
+                    ],
+                )
+
+            mock_scandir.assert_not_called()
+            mock_copy_file.assert_called_once_with(song, "/dst/Album/song.mp3")
+            mock_gvfs_wrapper.assert_called_once_with(
+                sync.transport.rm, "/dst/old.mp3"
+            )
+
+
+    #
+    # 'get_moves()'
+    @patch.object(pysyncdroid.transport.Transport, "fingerprint")
+    def test_get_moves(self, mock_fingerprint):
+        """
+        Test 'get_moves' pairs unmatched destination files with new source
+        files by size and fingerprint.
+        """
+        mock_fingerprint.side_effect = lambda path: os.path.basename(path)
+        sync_data_set = [
+            {
+                "src_dir_abs": "/src",
+                "src_dir_fls": [],
+                "src_dir_stats": {},
+                "dst_dir_abs": "/dst",
+                "dst_dir_fls": ["/dst/song.mp3", "/dst/other.mp3"],
+                "dst_dir_stats": {
+                    "/dst/song.mp3": (10, 1.0),
+                    "/dst/other.mp3": (10, 1.0),
+                },
+            },
+            {
+                "src_dir_abs": "/src/Artist",
+                "src_dir_fls": [
+                    "/src/Artist/song.mp3",
+                    "/src/Artist/new.mp3",
+                ],
+                "src_dir_stats": {
+                    "/src/Artist/song.mp3": (10, 1.0),
+                    "/src/Artist/new.mp3": (10, 1.0),
+                },
+                "dst_dir_abs": "/dst/Artist",
+                "dst_dir_fls": [],
+                "dst_dir_stats": {},
+            },
+        ]
+
+        sync = Sync(FAKE_MTP_DETAILS, "/src", "/dst", detect_moves=True)
+        moves = sync.get_moves(sync_data_set)
+
+        self.assertEqual(moves, [("/dst/song.mp3", "/dst/Artist/song.mp3")])
+        self.assertEqual(sync_data_set[0]["dst_dir_fls"], ["/dst/other.mp3"])
+        self.assertEqual(
+            sync_data_set[1]["dst_dir_fls"], ["/dst/Artist/song.mp3"]
+        )
+        self.assertEqual(
+            sync_data_set[1]["dst_dir_stats"],
+            {"/dst/Artist/song.mp3": (10, 1.0)},
+        )
+        self.assertEqual(
+            sync_data_set[1]["moved_fls"], {"/dst/Artist/song.mp3"}
+        )
+
+    def test_sync_detect_moves(self):
+        """
+        Test 'sync' moves files moved in the source on the destination instead
+        of copying them again.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                with open(os.path.join(src_dir, "song.mp3"), "w") as f:
+                    f.write("song")
+
+                transport = SimulatedTransport()
+                sync = Sync(
+                    FAKE_MTP_DETAILS,
+                    src_dir,
+                    dst_dir,
+                    unmatched=REMOVE,
+                    backend=transport,
+                    detect_moves=True,
+                )
+                sync.set_source_abs()
+                sync.set_destination_abs()
+                sync.sync()
+
+                os.makedirs(os.path.join(src_dir, "Artist"))
+                os.rename(
+                    os.path.join(src_dir, "song.mp3"),
+                    os.path.join(src_dir, "Artist", "song.mp3"),
+                )
+                transport.calls = {}
+                sync.sync()
+
+                self.assertEqual(transport.calls.get("cp"), None)
+                self.assertEqual(transport.calls.get("mv"), 1)
+                self.assertEqual(
+                    os.listdir(os.path.join(dst_dir, "Artist")), ["song.mp3"]
+                )
+                self.assertFalse(
+                    os.path.exists(os.path.join(dst_dir, "song.mp3"))
+                )
+
+    def test_sync_detect_moves_overwrite(self):
+        """
+        Test 'sync' doesn't overwrite files moved in place, i.e. doesn't copy
+        to a path being moved to.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                with open(os.path.join(src_dir, "song.mp3"), "w") as f:
+                    f.write("song")
+
+                transport = SimulatedTransport()
+                sync = Sync(
+                    FAKE_MTP_DETAILS,
+                    src_dir,
+                    dst_dir,
+                    overwrite_existing=True,
+                    unmatched=REMOVE,
+                    backend=transport,
+                    detect_moves=True,
+                    jobs=4,
+                )
+                sync.set_source_abs()
+                sync.set_destination_abs()
+                sync.sync()
+
+                os.rename(
+                    os.path.join(src_dir, "song.mp3"),
+                    os.path.join(src_dir, "renamed.mp3"),
+                )
+                transport.calls = {}
+                sync.sync()
+
+                self.assertEqual(transport.calls.get("cp"), None)
+                self.assertEqual(transport.calls.get("mv"), 1)
+                self.assertEqual(os.listdir(dst_dir), ["renamed.mp3"])
+
+    def test_sync_spill_plan(self):
+        """
+        Test 'sync' synchronizes from a spilled plan.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                os.makedirs(os.path.join(src_dir, "Album"))
+                for name in ("song.mp3", os.path.join("Album", "a.mp3")):
+                    with open(os.path.join(src_dir, name), "w"):
+                        pass
+                with open(os.path.join(dst_dir, "old.mp3"), "w"):
+                    pass
+
+                sync = Sync(
+                    FAKE_MTP_DETAILS,
+                    src_dir,
+                    dst_dir,
+                    unmatched=REMOVE,
+                    backend=LocalTransport(),
+                    spill_plan=True,
+                )
+                sync.set_source_abs()
+                sync.set_destination_abs()
+                sync.sync()
+
+                self.assertEqual(
+                    sorted(os.listdir(dst_dir)), ["Album", "song.mp3"]
+                )
+                self.assertEqual(
+                    os.listdir(os.path.join(dst_dir, "Album")), ["a.mp3"]
+                )
+
+    def _sync_manifest(self, src_dir, dst_dir, transport):
+        sync = Sync(
+            FAKE_MTP_DETAILS,
+            src_dir,
+            dst_dir,
+            unmatched=REMOVE,
+            backend=transport,
+            manifest=True,
+        )
+        sync.set_source_abs()
+        sync.set_destination_abs()
+        sync.sync()
+
+        return sync
+
+    def test_sync_manifest(self):
+        """
+        Test 'sync' saves the manifest and reads destination directories
+        from it next time.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                for d in range(5):
+                    album_dir = os.path.join(src_dir, "Album{}".format(d))
+                    os.makedirs(album_dir)
+                    with open(os.path.join(album_dir, "a.mp3"), "w") as f:
+                        f.write("song")
+
+                self._sync_manifest(src_dir, dst_dir, LocalTransport())
+                self.assertEqual(
+                    len(os.listdir(dst_dir)), 6, os.listdir(dst_dir)
+                )
+                self.assertIn(MANIFEST_NAME, os.listdir(dst_dir))
+
+                with open(os.path.join(src_dir, "Album0", "b.mp3"), "w"):
+                    pass
+                os.remove(os.path.join(src_dir, "Album0", "a.mp3"))
+
+                transport = SimulatedTransport()
+                sync = self._sync_manifest(src_dir, dst_dir, transport)
+
+                # source directories and spot-checked destination ones
+                self.assertEqual(transport.calls["listdir"], 6 + SPOT_CHECKS)
+                self.assertEqual(
+                    os.listdir(os.path.join(dst_dir, "Album0")), ["b.mp3"]
+                )
+                self.assertEqual(
+                    sync.saved_manifest.get_dir("Album0"), {"b.mp3": (0, ANY)}
+                )
+                self.assertEqual(
+                    sync.saved_manifest.get_dir("Album1"), {"a.mp3": (4, ANY)}
+                )
+
+    def test_sync_manifest_stale(self):
+        """
+        Test 'sync' lists destination directories if the manifest is stale.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                with open(os.path.join(src_dir, "song.mp3"), "w"):
+                    pass
+
+                self._sync_manifest(src_dir, dst_dir, LocalTransport())
+                with open(os.path.join(dst_dir, "old.mp3"), "w"):
+                    pass
+
+                transport = SimulatedTransport()
+                self._sync_manifest(src_dir, dst_dir, transport)
+
+                # source directory, spot-checked and listed destination one
+                self.assertEqual(transport.calls["listdir"], 3)
+                self.assertEqual(
+                    sorted(os.listdir(dst_dir)), [MANIFEST_NAME, "song.mp3"]
+                )
+
+    def test_sync_bulk_list(self):
+        """
+        Test 'sync' lists the whole destination tree at once.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                for d in range(3):
+                    album_dir = os.path.join(src_dir, "Album{}".format(d))
+                    os.makedirs(album_dir)
+                    with open(os.path.join(album_dir, "a.mp3"), "w"):
+                        pass
+                os.makedirs(os.path.join(dst_dir, "Album0"))
+                with open(os.path.join(dst_dir, "Album0", "old.mp3"), "w"):
+                    pass
+
+                transport = SimulatedTransport()
+                sync = Sync(
+                    FAKE_MTP_DETAILS,
+                    src_dir,
+                    dst_dir,
+                    unmatched=REMOVE,
+                    backend=transport,
+                    bulk_list=True,
+                )
+                sync.set_source_abs()
+                sync.set_destination_abs()
+                sync.sync()
+
+                # source directories and destination directories
+                self.assertEqual(transport.calls["listdir"], 4 + 2)
+                self.assertEqual(transport.calls["mkdir"], 2)
+                for d in range(3):
+                    self.assertEqual(
+                        os.listdir(os.path.join(dst_dir, "Album{}".format(d))),
+                        ["a.mp3"],
+                    )
+
+    @patch.object(pysyncdroid.transport.LocalTransport, "scan_tree")
+    def test_sync_bulk_list_error(self, mock_scan_tree):
+        """
+        Test 'sync' lists destination directories one by one if the tree
+        can't be listed at once.
+        """
+        mock_scan_tree.side_effect = OSError("find: not found")
+
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                with open(os.path.join(src_dir, "song.mp3"), "w"):
+                    pass
+                with open(os.path.join(dst_dir, "song.mp3"), "w") as f:
+                    f.write("old")
+
+                sync = Sync(
+                    FAKE_MTP_DETAILS,
+                    src_dir,
+                    dst_dir,
+                    backend=LocalTransport(),
+                    bulk_list=True,
+                )
+                sync.set_source_abs()
+                sync.set_destination_abs()
+                sync.sync()
+
+                # the existing file is left alone
+                with open(os.path.join(dst_dir, "song.mp3")) as f:
+                    self.assertEqual(f.read(), "old")
+
+    def test_sync_filter(self):
+        """
+        Test 'sync' doesn't list excluded directories and leaves destination
+        files of skipped source files alone.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                for subdir in (".thumbnails", "Album"):
+                    os.makedirs(os.path.join(src_dir, subdir))
+                for name, data in (
+                    (os.path.join(".thumbnails", "a.jpg"), ""),
+                    (os.path.join("Album", "a.mp3"), ""),
+                    (os.path.join("Album", "a.tmp"), ""),
+                    (os.path.join("Album", "live.mp3"), "too big"),
+                ):
+                    with open(os.path.join(src_dir, name), "w") as f:
+                        f.write(data)
+                os.makedirs(os.path.join(dst_dir, "Album"))
+                with open(os.path.join(dst_dir, "Album", "live.mp3"), "w"):
+                    pass
+
+                transport = SimulatedTransport()
+                sync = Sync(
+                    FAKE_MTP_DETAILS,
+                    src_dir,
+                    dst_dir,
+                    unmatched=REMOVE,
+                    backend=transport,
+                    filter_rules=[".thumbnails/", "*.tmp"],
+                    max_size=1,
+                )
+                sync.set_source_abs()
+                sync.set_destination_abs()
+                sync.sync()
+
+                # source root, 'Album' and the destination 'Album'
+                self.assertEqual(transport.calls["listdir"], 3)
+                self.assertEqual(os.listdir(dst_dir), ["Album"])
+                self.assertEqual(
+                    sorted(os.listdir(os.path.join(dst_dir, "Album"))),
+                    ["a.mp3", "live.mp3"],
+                )
+
+                # watching for changes
+                sync.sync_paths(
+                    [
+                        os.path.join(src_dir, ".thumbnails", "a.jpg"),
+                        os.path.join(src_dir, "Album", "a.tmp"),
+                    ]
+                )
+                self.assertEqual(os.listdir(dst_dir), ["Album"])
+
+    def test_sync_filter_all_files(self):
+        """
+        Test 'sync' goes on with the other directories if all files of one
+        are filtered out.
+        """
+        for kwargs in ({"filter_rules": ["*.tmp"]}, {"min_size": 1000}):
+            for use_async in (False, True):
+                with tempfile.TemporaryDirectory() as src_dir:
+                    with tempfile.TemporaryDirectory() as dst_dir:
+                        os.makedirs(os.path.join(src_dir, "sub"))
+                        with open(os.path.join(src_dir, "x.tmp"), "w"):
+                            pass
+                        with open(
+                            os.path.join(src_dir, "sub", "y.mp3"), "w"
+                        ) as f:
+                            f.write("y" * 1000)
+
+                        sync = Sync(
+                            FAKE_MTP_DETAILS,
+                            src_dir,
+                            dst_dir,
+                            backend=LocalTransport(),
+                            **kwargs
+                        )
+                        sync.set_source_abs()
+                        sync.set_destination_abs()
+                        if use_async:
+                            run_async(sync.sync_async())
+                        else:
+                            sync.sync()
+
+                        self.assertEqual(os.listdir(dst_dir), ["sub"])
+                        self.assertEqual(
+                            os.listdir(os.path.join(dst_dir, "sub")),
+                            ["y.mp3"],
+                        )
+
+    def test_init_spill_plan_detect_moves(self):
+        """
+        Test 'Sync' refuses to detect moves with a spilled plan.
+        """
+        with self.assertRaises(ValueError):
+            Sync(
+                FAKE_MTP_DETAILS,
+                "/src",
+                "/dst",
+                detect_moves=True,
+                spill_plan=True,
+            )
+
+
+class TestSyncState(unittest.TestCase):
+    def setUp(self):
+        self.state = StateStore(":memory:")
+
+    def tearDown(self):
+        self.state.close()
+
+    def _create_sync(self, src_dir, dst_dir, trust_state=True):
+        """
+        Create local filesystem Sync instance recording its state.
+
+        :argument src_dir: source directory
+        :type src_dir: str
+        :argument dst_dir: destination directory
+        :type dst_dir: str
+        :argument trust_state: flag to skip unchanged directories
+        :type trust_state: bool
+
+        :returns Sync
+
+        """
+        sync = Sync(
+            FAKE_MTP_DETAILS,
+            src_dir,
+            dst_dir,
+            backend=LocalTransport(),
+            state=self.state,
+            device="vendor:model",
+            trust_state=trust_state,
+        )
+        sync.set_source_abs()
+        sync.set_destination_abs()
+
+        return sync
+
+    def test_get_mapping_key(self):
+        """
+        Test 'get_mapping_key' doesn't depend on the device gvfs path.
+        """
+        sync = Sync(FAKE_MTP_DETAILS, "/tmp", "Card/Music")
+        sync.set_destination_abs()
+
+        self.assertEqual(sync.get_mapping_key(), "/tmp==>/Card/Music")
+
+    def test_sync_records_state(self):
+        """
+        Test 'sync' records synchronized source files.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                with open(os.path.join(src_dir, "song.mp3"), "w") as f:
+                    f.write("song")
+
+                sync = self._create_sync(src_dir, dst_dir)
+                sync.sync()
+
+                recorded = self.state.get_files(
+                    "vendor:model", sync.get_mapping_key()
+                )
+                self.assertEqual(list(recorded), ["."])
+                self.assertEqual(recorded["."]["song.mp3"][0], 4)
+
+    def test_sync_trust_state(self):
+        """
+        Test 'sync' doesn't list destination directories unchanged since the
+        recorded sync, unless the state isn't trusted.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                os.makedirs(os.path.join(src_dir, "Album"))
+                for name in ("song.mp3", os.path.join("Album", "demo.mp3")):
+                    with open(os.path.join(src_dir, name), "w") as f:
+                        f.write("song")
+
+                self._create_sync(src_dir, dst_dir).sync()
+
+                # nothing changed
+                sync = self._create_sync(src_dir, dst_dir)
+                with patch.object(
+                    sync, "get_destination_subdir_data"
+                ) as mock_get_destination_subdir_data:
+                    sync.sync()
+                mock_get_destination_subdir_data.assert_not_called()
+
+                # a file was added
+                with open(os.path.join(src_dir, "Album", "new.mp3"), "w"):
+                    pass
+
+                sync = self._create_sync(src_dir, dst_dir)
+                sync.sync()
+                self.assertTrue(
+                    os.path.exists(os.path.join(dst_dir, "Album", "new.mp3"))
+                )
+
+                # state isn't trusted
+                sync = self._create_sync(src_dir, dst_dir, trust_state=False)
+                with patch.object(
+                    sync, "get_destination_subdir_data"
+                ) as mock_get_destination_subdir_data:
+                    sync.sync()
+                self.assertEqual(
+                    mock_get_destination_subdir_data.call_count, 2
+                )
+
+    def test_sync_checksum(self):
+        """
+        Test 'sync' in checksum mode overwrites existing files only if their
+        content changed since the recorded sync, regardless of modification
+        times.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                src_file = os.path.join(src_dir, "song.mp3")
+                dst_file = os.path.join(dst_dir, "song.mp3")
+                with open(src_file, "w") as f:
+                    f.write("song")
+
+                sync = self._create_sync(src_dir, dst_dir, trust_state=False)
+                sync.checksum = True
+                sync.hasher = Hasher(self.state)
+                sync.sync()
+                self.assertTrue(os.path.exists(dst_file))
+
+                # touched only
+                os.utime(src_file, (1, 1))
+                with patch.object(sync, "copy_file") as mock_copy_file:
+                    sync.sync()
+                mock_copy_file.assert_not_called()
+
+                # same size, same modification time, different content
+                tmp_file = os.path.join(src_dir, "song.tmp")
+                with open(tmp_file, "w") as f:
+                    f.write("SONG")
+                os.utime(tmp_file, (1, 1))
+                os.replace(tmp_file, src_file)
+                with patch.object(sync, "copy_file") as mock_copy_file:
+                    sync.sync()
+                mock_copy_file.assert_called_once_with(src_file, dst_file)
+
+    def test_init_incremental_no_state(self):
+        """
+        Test incremental scan can't be used without the state store.
+        """
+        with self.assertRaises(ValueError):
+            Sync(FAKE_MTP_DETAILS, "/tmp", "Card/Music", incremental=True)
+
+    def test_sync_incremental(self):
+        """
+        Test 'sync' in incremental mode lists only source directories
+        modified since the recorded sync.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                album_dir = os.path.join(src_dir, "Artist", "Album")
+                os.makedirs(album_dir)
+                for path in (src_dir, album_dir):
+                    with open(os.path.join(path, "song.mp3"), "w"):
+                        pass
+
+                # modified long enough ago
+                for path in (src_dir, os.path.dirname(album_dir), album_dir):
+                    os.utime(path, (1, 1))
+
+                sync = self._create_sync(src_dir, dst_dir, trust_state=False)
+                sync.incremental = True
+                sync.sync()
+
+                with open(os.path.join(album_dir, "new.mp3"), "w"):
+                    pass
+
+                with patch.object(
+                    sync.transport, "scandir", wraps=sync.transport.scandir
+                ) as mock_scandir:
+                    sync_data_set = sync.get_sync_data()
+
+                # the destination directory is listed as well
+                self.assertEqual(
+                    mock_scandir.call_args_list,
+                    [
+                        call(album_dir),
+                        call(album_dir.replace(src_dir, dst_dir)),
+                    ],
+                )
+                self.assertEqual(
+                    [sync_data["src_dir_abs"] for sync_data in sync_data_set],
+                    [album_dir],
+                )
+                self.assertEqual(
+                    sorted(sync_data_set[0]["src_dir_fls"]),
+                    [
+                        os.path.join(album_dir, "new.mp3"),
+                        os.path.join(album_dir, "song.mp3"),
+                    ],
+                )
+
+    def test_dry_run(self):
+        """
+        Test 'dry_run' reports planned actions without carrying them out.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                os.makedirs(os.path.join(src_dir, "Album"))
+                for name in ("a.mp3", "b.mp3"):
+                    with open(os.path.join(src_dir, "Album", name), "w") as f:
+                        f.write("song")
+                with open(os.path.join(dst_dir, "old.mp3"), "w") as f:
+                    f.write("old")
+                with open(os.path.join(src_dir, "new.mp3"), "w") as f:
+                    f.write("new song")
+
+                sync = self._create_sync(src_dir, dst_dir, trust_state=False)
+                sync.unmatched = REMOVE
+                summary = sync.dry_run()
+
+                self.assertEqual(summary.totals["copy"], [3, 16])
+                self.assertEqual(summary.totals["remove"], [1, 3])
+                self.assertEqual(summary.totals["pull"], [0, 0])
+                self.assertEqual(summary.dirs, 1)
+                # nothing measured yet
+                self.assertIsNone(summary.seconds)
+                self.assertIn("estimated duration: unknown", summary.format())
+
+                self.assertEqual(os.listdir(dst_dir), ["old.mp3"])
+                self.assertEqual(
+                    self.state.get_files(
+                        "vendor:model", sync.get_mapping_key()
+                    ),
+                    {},
+                )
+
+    def test_dry_run_estimate(self):
+        """
+        Test 'dry_run' estimates duration from operation costs measured in
+        previous runs.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                os.makedirs(os.path.join(src_dir, "Album"))
+                with open(os.path.join(src_dir, "Album", "a.mp3"), "w") as f:
+                    f.write("song")
+
+                sync = self._create_sync(src_dir, dst_dir, trust_state=False)
+                sync.sync()
+
+                self.assertEqual(
+                    sorted(self.state.get_costs("vendor:model")),
+                    ["copy", "mkdir"],
+                )
+
+                with open(os.path.join(src_dir, "Album", "b.mp3"), "w") as f:
+                    f.write("song")
+
+                summary = sync.dry_run()
+                self.assertEqual(summary.totals["copy"], [1, 4])
+                self.assertEqual(summary.dirs, 0)
+                self.assertGreaterEqual(summary.seconds, 0)
+                self.assertFalse(
+                    os.path.exists(os.path.join(dst_dir, "Album", "b.mp3"))
+                )
+
+    def test_costs_store(self):
+        """
+        Test 'sync' records operation costs in the costs store without
+        recording synchronized files.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                with open(os.path.join(src_dir, "song.mp3"), "w") as f:
+                    f.write("song")
+
+                sync = Sync(
+                    FAKE_MTP_DETAILS,
+                    src_dir,
+                    dst_dir,
+                    backend=LocalTransport(),
+                    device="vendor:model",
+                    costs_store=self.state,
+                )
+                sync.set_source_abs()
+                sync.set_destination_abs()
+                sync.sync()
+
+                self.assertEqual(
+                    list(self.state.get_costs("vendor:model")), ["copy"]
+                )
+                self.assertEqual(
+                    self.state.get_files(
+                        "vendor:model", sync.get_mapping_key()
+                    ),
+                    {},
+                )
+
+    def test_apply_plan(self):
+        """
+        Test 'apply_plan' carries out a saved plan without scanning, skipping
+        actions whose files changed since planned or were carried out
+        already.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                os.makedirs(os.path.join(src_dir, "Album"))
+                for name in ("a.mp3", "b.mp3"):
+                    with open(os.path.join(src_dir, "Album", name), "w") as f:
+                        f.write("song")
+                for name in ("old.mp3", "kept.mp3"):
+                    with open(os.path.join(dst_dir, name), "w") as f:
+                        f.write("old")
+                with open(os.path.join(src_dir, "new.mp3"), "w") as f:
+                    f.write("new song")
+
+                sync = self._create_sync(src_dir, dst_dir, trust_state=False)
+                sync.unmatched = REMOVE
+                plan_file = StringIO()
+                sync.dry_run(plan_file)
+                plan_file.seek(0)
+                records = load_plans(plan_file)[
+                    ("vendor:model", sync.get_mapping_key())
+                ]
+
+                # changed since planned
+                with open(os.path.join(src_dir, "Album", "b.mp3"), "w") as f:
+                    f.write("longer song")
+                with open(os.path.join(dst_dir, "kept.mp3"), "w") as f:
+                    f.write("modified")
+
+                with patch.object(
+                    sync.transport, "scandir", wraps=sync.transport.scandir
+                ) as mock_scandir:
+                    self.assertEqual(sync.apply_plan(records), 2)
+                mock_scandir.assert_not_called()
+
+                self.assertEqual(
+                    sorted(os.listdir(dst_dir)),
+                    ["Album", "kept.mp3", "new.mp3"],
+                )
+                self.assertEqual(
+                    os.listdir(os.path.join(dst_dir, "Album")), ["a.mp3"]
+                )
+
+                # carried out already
+                with patch.object(sync.transport, "cp") as mock_cp:
+                    self.assertEqual(sync.apply_plan(records), 2)
+                mock_cp.assert_not_called()
+
+    def test_apply_plan_overwrite(self):
+        """
+        Test 'apply_plan' carries out planned overwrites, i.e. doesn't take
+        an existing destination file for a copied one.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                src_file = os.path.join(src_dir, "song.mp3")
+                dst_file = os.path.join(dst_dir, "song.mp3")
+                with open(src_file, "w") as f:
+                    f.write("new!")
+                with open(dst_file, "w") as f:
+                    f.write("old!")
+                # the destination file is newer
+                os.utime(src_file, (1000.0, 1000.0))
+                os.utime(dst_file, (2000.0, 2000.0))
+
+                sync = self._create_sync(src_dir, dst_dir, trust_state=False)
+                sync.overwrite_existing = True
+                plan_file = StringIO()
+                sync.dry_run(plan_file)
+                plan_file.seek(0)
+                records = load_plans(plan_file)[
+                    ("vendor:model", sync.get_mapping_key())
+                ]
+
+                self.assertEqual(sync.apply_plan(records), 0)
+                with open(dst_file) as f:
+                    self.assertEqual(f.read(), "new!")
+
+                # carried out already
+                with patch.object(sync.transport, "cp") as mock_cp:
+                    self.assertEqual(sync.apply_plan(records), 0)
+                mock_cp.assert_not_called()
+
+                # changed since planned
+                with open(dst_file, "w") as f:
+                    f.write("other content")
+                self.assertEqual(sync.apply_plan(records), 1)
+
+    def test_apply_plan_move(self):
+        """
+        Test 'apply_plan' carries out planned moves.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                with open(os.path.join(src_dir, "song.mp3"), "w") as f:
+                    f.write("song")
+
+                sync = self._create_sync(src_dir, dst_dir, trust_state=False)
+                sync.unmatched = REMOVE
+                sync.detect_moves = True
+                sync.sync()
+
+                os.makedirs(os.path.join(src_dir, "Artist"))
+                os.rename(
+                    os.path.join(src_dir, "song.mp3"),
+                    os.path.join(src_dir, "Artist", "song.mp3"),
+                )
+                plan_file = StringIO()
+                summary = sync.dry_run(plan_file)
+                plan_file.seek(0)
+
+                self.assertEqual(summary.moves, 1)
+                self.assertEqual(summary.totals["copy"], [0, 0])
+
+                with patch.object(sync.transport, "cp") as mock_cp:
+                    sync.apply_plan(list(load_plans(plan_file).values())[0])
+                mock_cp.assert_not_called()
+
+                self.assertEqual(
+                    os.listdir(os.path.join(dst_dir, "Artist")), ["song.mp3"]
+                )
+                self.assertFalse(
+                    os.path.exists(os.path.join(dst_dir, "song.mp3"))
+                )
+
+    def test_sync_two_way(self):
+        """
+        Test 'sync' in two-way mode propagates changes made on either side
+        since the last sync, without resurrecting removed files, and leaves
+        conflicting files alone.
+        """
+
+        def write(path, data):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(data)
+
+        def listing(top):
+            return sorted(
+                os.path.relpath(os.path.join(root, name), top)
+                for root, _, files in os.walk(top)
+                for name in files
+            )
+
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                write(os.path.join(src_dir, "a.mp3"), "a")
+                write(os.path.join(src_dir, "Album", "b.mp3"), "b")
+                write(os.path.join(dst_dir, "c.mp3"), "c")
+                write(os.path.join(dst_dir, "New", "d.mp3"), "d")
+
+                sync = self._create_sync(src_dir, dst_dir, trust_state=False)
+                sync.two_way = True
+                sync.sync()
+
+                expected = ["Album/b.mp3", "New/d.mp3", "a.mp3", "c.mp3"]
+                self.assertEqual(listing(src_dir), expected)
+                self.assertEqual(listing(dst_dir), expected)
+
+                os.remove(os.path.join(src_dir, "a.mp3"))
+                os.remove(os.path.join(dst_dir, "Album", "b.mp3"))
+                write(os.path.join(dst_dir, "c.mp3"), "changed")
+                write(os.path.join(src_dir, "New", "d.mp3"), "source")
+                write(os.path.join(dst_dir, "New", "d.mp3"), "destination")
+                write(os.path.join(dst_dir, "e.mp3"), "e")
+
+                with patch.object(
+                    sync.transport, "cp", wraps=sync.transport.cp
+                ) as mock_cp:
+                    sync.sync()
+
+                # pulled only
+                self.assertEqual(
+                    sorted(c[0][0] for c in mock_cp.call_args_list),
+                    [
+                        os.path.join(dst_dir, "c.mp3"),
+                        os.path.join(dst_dir, "e.mp3"),
+                    ],
+                )
+                expected = ["New/d.mp3", "c.mp3", "e.mp3"]
+                self.assertEqual(listing(src_dir), expected)
+                self.assertEqual(listing(dst_dir), expected)
+                with open(os.path.join(src_dir, "c.mp3")) as f:
+                    self.assertEqual(f.read(), "changed")
+
+                self.assertEqual(
+                    sync.conflicts,
+                    [
+                        (
+                            os.path.join(src_dir, "New", "d.mp3"),
+                            os.path.join(dst_dir, "New", "d.mp3"),
+                        )
+                    ],
+                )
+                with open(os.path.join(dst_dir, "New", "d.mp3")) as f:
+                    self.assertEqual(f.read(), "destination")
+
+                # nothing changed meanwhile
+                with patch.object(sync.transport, "cp") as mock_cp:
+                    sync.sync()
+                mock_cp.assert_not_called()
+                self.assertEqual(len(sync.conflicts), 1)
+
+    def test_sync_two_way_missing_side(self):
+        """
+        Test 'sync' in two-way mode refuses to synchronize once a side synced
+        before is missing, rather than removing its files from the other one.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            src_dir = os.path.join(tmp_dir, "src")
+            dst_dir = os.path.join(tmp_dir, "dst")
+            os.makedirs(src_dir)
+            for name in ("a.mp3", "b.mp3"):
+                with open(os.path.join(src_dir, name), "w") as f:
+                    f.write(name)
+
+            sync = self._create_sync(src_dir, dst_dir, trust_state=False)
+            sync.two_way = True
+            # a missing destination is created the first time
+            sync.sync()
+            self.assertEqual(sorted(os.listdir(dst_dir)), ["a.mp3", "b.mp3"])
+
+            os.rename(dst_dir, dst_dir + ".old")
+            with self.assertRaises(SyncException):
+                sync.sync()
+            self.assertEqual(sorted(os.listdir(src_dir)), ["a.mp3", "b.mp3"])
+
+            os.rename(dst_dir + ".old", dst_dir)
+            os.rename(src_dir, src_dir + ".old")
+            with self.assertRaises(SyncException):
+                sync.sync()
+            self.assertEqual(sorted(os.listdir(dst_dir)), ["a.mp3", "b.mp3"])
+
+    def test_sync_two_way_remove_all(self):
+        """
+        Test 'sync' in two-way mode refuses to remove all files synchronized
+        last time from a side, but removes some of them.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                for name in ("a.mp3", "b.mp3"):
+                    with open(os.path.join(src_dir, name), "w") as f:
+                        f.write(name)
+
+                sync = self._create_sync(src_dir, dst_dir, trust_state=False)
+                sync.two_way = True
+                sync.sync()
+
+                for name in ("a.mp3", "b.mp3"):
+                    os.remove(os.path.join(dst_dir, name))
+                with self.assertRaises(SyncException):
+                    sync.sync()
+                self.assertEqual(
+                    sorted(os.listdir(src_dir)), ["a.mp3", "b.mp3"]
+                )
+
+                with open(os.path.join(dst_dir, "b.mp3"), "w") as f:
+                    f.write("b.mp3")
+                sync.sync()
+                self.assertEqual(os.listdir(src_dir), ["b.mp3"])
+
+    def test_sync_two_way_costs(self):
+        """
+        Test 'sync' in two-way mode measures only copies to and removals
+        from the destination.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                for top, name in (
+                    (src_dir, "a.mp3"),
+                    (src_dir, "b.mp3"),
+                    (dst_dir, "c.mp3"),
+                ):
+                    with open(os.path.join(top, name), "w") as f:
+                        f.write(name)
+
+                sync = self._create_sync(src_dir, dst_dir, trust_state=False)
+                sync.two_way = True
+
+                with patch.object(Costs, "add", autospec=True) as mock_add:
+                    sync.sync()
+                self.assertEqual(
+                    [c[0][1] for c in mock_add.call_args_list],
+                    [COPY_OP, COPY_OP],
+                )
+
+                os.remove(os.path.join(src_dir, "a.mp3"))
+                os.remove(os.path.join(dst_dir, "c.mp3"))
+                with patch.object(Costs, "add", autospec=True) as mock_add:
+                    sync.sync()
+                self.assertEqual(
+                    [c[0][1] for c in mock_add.call_args_list], [REMOVE_OP]
+                )
+                self.assertEqual(os.listdir(src_dir), ["b.mp3"])
+
+    def test_init_two_way(self):
+        """
+        Test 'Sync' refuses two-way sync without a state store or with
+        one-way only features.
+        """
+        with self.assertRaises(ValueError):
+            Sync(FAKE_MTP_DETAILS, "/src", "/dst", two_way=True)
+
+        with self.assertRaises(ValueError):
+            Sync(
+                FAKE_MTP_DETAILS,
+                "/src",
+                "/dst",
+                state=self.state,
+                two_way=True,
+                detect_moves=True,
+            )
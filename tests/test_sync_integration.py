@@ -3,6 +3,7 @@ import tempfile
 import unittest
 
 from pysyncdroid.sync import Sync, REMOVE, SYNCHRONIZE
+from pysyncdroid.transport import LOCAL
 from tests.test_sync import FAKE_MTP_DETAILS
 
 
@@ -121,3 +122,42 @@ class TestSyncIntegration(unittest.TestCase):
                         os.path.join(src_tmp_dir_path, self.DST_FILE)
                     )
                 )
+
+    def test_sync_local_transport(self):
+        """
+        Test `sync` is able to copy files from src to dst and removes unmatched
+        files from dst with the local filesystem transport.
+        """
+        with tempfile.TemporaryDirectory() as src_tmp_dir_path:
+            with tempfile.TemporaryDirectory() as dst_tmp_dir_path:
+                os.makedirs(os.path.join(src_tmp_dir_path, self.DST_DIR))
+                with open(
+                    os.path.join(
+                        src_tmp_dir_path, self.DST_DIR, self.COPY_FILE
+                    ),
+                    "w",
+                ):
+                    pass
+
+                dst_dir_path = os.path.join(dst_tmp_dir_path, self.DST_DIR)
+                os.makedirs(dst_dir_path)
+                with open(os.path.join(dst_dir_path, self.DST_FILE), "w"):
+                    pass
+
+                sync = Sync(
+                    FAKE_MTP_DETAILS,
+                    src_tmp_dir_path,
+                    dst_tmp_dir_path,
+                    unmatched=REMOVE,
+                    backend=LOCAL,
+                )
+                sync.set_source_abs()
+                sync.set_destination_abs()
+                sync.sync()
+
+                self.assertTrue(
+                    os.path.exists(os.path.join(dst_dir_path, self.COPY_FILE))
+                )
+                self.assertFalse(
+                    os.path.exists(os.path.join(dst_dir_path, self.DST_FILE))
+                )
@@ -0,0 +1,270 @@
+"""Tests for transports."""
+
+
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import ANY, patch
+
+from pysyncdroid.transport import (
+    get_transport,
+    FuseTransport,
+    GioTransport,
+    GvfsTransport,
+    HelperTransport,
+    LocalTransport,
+    SimulatedTransport,
+    Transport,
+    GVFS,
+    LOCAL,
+)
+from tests.test_utils import run_async
+
+
+class TestGetTransport(unittest.TestCase):
+    def test_get_transport(self):
+        """
+        Test 'get_transport' creates transports by name and passes
+        instances through.
+        """
+        self.assertIsInstance(get_transport(GVFS), GvfsTransport)
+        self.assertIsInstance(get_transport(LOCAL), LocalTransport)
+
+        transport = SimulatedTransport()
+        self.assertIs(get_transport(transport), transport)
+
+    def test_get_transport_unknown(self):
+        """
+        Test 'get_transport' refuses unknown transports.
+        """
+        with self.assertRaises(ValueError):
+            get_transport("ftp")
+
+
+class TestGvfsTransport(unittest.TestCase):
+    @patch("pysyncdroid.gvfs.run_bash_cmd")
+    def test_gvfs_transport(self, mock_run_bash_cmd):
+        """
+        Test 'GvfsTransport' executes gvfs-tools.
+        """
+        transport = GvfsTransport()
+        transport.cp("/src", "/dst")
+        mock_run_bash_cmd.assert_called_with(["gvfs-copy", "/src", "/dst"])
+
+        transport.mkdir("/dst")
+        mock_run_bash_cmd.assert_called_with(["gvfs-mkdir", "-p", "/dst"])
+
+        transport.mkdir_batch(["/dst/a", "/dst/b"])
+        mock_run_bash_cmd.assert_called_with(
+            ["gvfs-mkdir", "-p", "/dst/a", "/dst/b"]
+        )
+
+        transport.mv("/src", "/dst")
+        mock_run_bash_cmd.assert_called_with(["gvfs-move", "/src", "/dst"])
+
+        transport.rm("/dst")
+        mock_run_bash_cmd.assert_called_with(["gvfs-rm", "-f", "/dst"])
+
+    @patch("pysyncdroid.gio.cp_batch")
+    def test_gio_transport(self, mock_cp_batch):
+        """
+        Test 'GioTransport' copies files in batches.
+        """
+        mock_cp_batch.return_value = {}
+
+        transport = GioTransport()
+        self.assertTrue(transport.batch_copy)
+        self.assertEqual(transport.cp_batch(["/src/a", "/src/b"], "/dst"), {})
+
+        mock_cp_batch.assert_called_once_with(["/src/a", "/src/b"], "/dst")
+
+
+class TestFuseTransport(unittest.TestCase):
+    @patch("pysyncdroid.gvfs.cp")
+    @patch("pysyncdroid.fuse.cp")
+    def test_fuse_transport(self, mock_fuse_cp, mock_gvfs_cp):
+        """
+        Test 'FuseTransport' copies files via FUSE.
+        """
+        FuseTransport().cp("/src", "/dst")
+
+        mock_fuse_cp.assert_called_once_with("/src", "/dst")
+        mock_gvfs_cp.assert_not_called()
+
+    @patch("pysyncdroid.gvfs.cp")
+    @patch("pysyncdroid.fuse.cp")
+    def test_fuse_transport_fallback(self, mock_fuse_cp, mock_gvfs_cp):
+        """
+        Test 'FuseTransport' falls back to gvfs-tools when FUSE fails.
+        """
+        mock_fuse_cp.side_effect = OSError("Operation not supported")
+        messages = []
+
+        FuseTransport(log=messages.append).cp("/src", "/dst")
+
+        mock_gvfs_cp.assert_called_once_with("/src", "/dst")
+        self.assertEqual(len(messages), 1)
+
+
+class TestHelperTransport(unittest.TestCase):
+    def test_helper_transport(self):
+        """
+        Test 'HelperTransport' starts the helper on demand and stops it when
+        closed.
+        """
+        transport = HelperTransport()
+        self.assertIsNone(transport.helper)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "Music")
+            transport.mkdir(path)
+            self.assertTrue(transport.stat(path)[2])
+            self.assertEqual(transport.scan(path), [])
+            self.assertIsNone(transport.scan(os.path.join(tmp_dir, "Gone")))
+
+        transport.close()
+        self.assertIsNone(transport.helper)
+
+
+class TestLocalTransport(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.tmp_dir.name, "song.mp3")
+        with open(self.src, "w") as f:
+            f.write("la la la")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_local_transport(self):
+        """
+        Test 'LocalTransport' manipulates local files.
+        """
+        transport = LocalTransport()
+        dst_dir = os.path.join(self.tmp_dir.name, "Music", "Rock")
+
+        transport.mkdir(dst_dir)
+        transport.cp(self.src, dst_dir)
+        dst = os.path.join(dst_dir, "song.mp3")
+        self.assertEqual(os.listdir(dst_dir), ["song.mp3"])
+        self.assertEqual(transport.stat(dst)[0], 8)
+        self.assertEqual(
+            transport.fingerprint(dst), transport.fingerprint(self.src)
+        )
+
+        moved = os.path.join(dst_dir, "moved.mp3")
+        transport.mv(dst, moved)
+        self.assertEqual(os.listdir(dst_dir), ["moved.mp3"])
+        transport.mv(moved, dst)
+
+        transport.rm(dst)
+        transport.rm(dst)
+        self.assertFalse(transport.exists(dst))
+
+    def test_scan(self):
+        """
+        Test 'scan' lists directory entries with their stat data, or returns
+        None for a missing directory.
+        """
+        transport = LocalTransport()
+        os.makedirs(os.path.join(self.tmp_dir.name, "Album"))
+        os.symlink(
+            os.path.join(self.tmp_dir.name, "Album"),
+            os.path.join(self.tmp_dir.name, "Link"),
+        )
+        os.symlink(
+            os.path.join(self.tmp_dir.name, "gone.mp3"),
+            os.path.join(self.tmp_dir.name, "dangling.mp3"),
+        )
+
+        entries = {e.name: e for e in transport.scan(self.tmp_dir.name)}
+
+        self.assertEqual(
+            sorted(entries), ["Album", "Link", "dangling.mp3", "song.mp3"]
+        )
+        self.assertEqual(entries["song.mp3"].size, 8)
+        self.assertEqual(entries["song.mp3"].mtime, os.path.getmtime(self.src))
+        self.assertFalse(entries["song.mp3"].is_dir)
+        self.assertTrue(entries["Album"].is_dir)
+        self.assertFalse(entries["Album"].is_link)
+        self.assertTrue(entries["Link"].is_dir)
+        self.assertTrue(entries["Link"].is_link)
+        self.assertFalse(entries["dangling.mp3"].is_dir)
+
+        self.assertIsNone(
+            transport.scan(os.path.join(self.tmp_dir.name, "Gone"))
+        )
+
+    def test_scan_tree(self):
+        """
+        Test 'scan_tree' lists the whole directory tree, or returns None for
+        a missing directory.
+        """
+        transport = LocalTransport()
+        os.makedirs(os.path.join(self.tmp_dir.name, "Album", "Empty"))
+        with open(os.path.join(self.tmp_dir.name, "Album", "a.mp3"), "w"):
+            pass
+
+        tree = transport.scan_tree(self.tmp_dir.name)
+
+        self.assertEqual(sorted(tree), [".", "Album", "Album/Empty"])
+        self.assertEqual(
+            sorted(tree["."]), sorted(transport.scan(self.tmp_dir.name))
+        )
+        self.assertEqual(
+            sorted((e.name, e.size, e.is_dir) for e in tree["Album"]),
+            [("Empty", ANY, True), ("a.mp3", 0, False)],
+        )
+        self.assertEqual(tree["Album/Empty"], [])
+
+        self.assertIsNone(
+            transport.scan_tree(os.path.join(self.tmp_dir.name, "Gone"))
+        )
+
+    def test_local_transport_async(self):
+        """
+        Test asyncio operations run the blocking ones in an executor.
+        """
+        dst = os.path.join(self.tmp_dir.name, "copy.mp3")
+        run_async(LocalTransport().cp_async(self.src, dst))
+
+        self.assertTrue(os.path.exists(dst))
+
+    def test_simulated_transport(self):
+        """
+        Test 'SimulatedTransport' counts calls and injects latency and
+        throughput caps.
+        """
+        transport = SimulatedTransport(latency=0.01, throughput=800)
+        dst = os.path.join(self.tmp_dir.name, "copy.mp3")
+
+        start = time.time()
+        transport.cp(self.src, dst)
+        transport.scandir(self.tmp_dir.name)
+        transport.exists(dst)
+
+        # 3 calls and 8 bytes at 800 B/s
+        self.assertGreaterEqual(time.time() - start, 0.04)
+        self.assertEqual(transport.calls, {"cp": 1, "listdir": 1, "stat": 1})
+
+    def test_simulated_transport_scan_tree(self):
+        """
+        Test 'SimulatedTransport' counts a round trip per directory of a
+        listed tree.
+        """
+        transport = SimulatedTransport()
+        os.makedirs(os.path.join(self.tmp_dir.name, "Album", "Empty"))
+
+        transport.scan_tree(self.tmp_dir.name)
+
+        self.assertEqual(transport.calls["listdir"], 3)
+
+
+class TestTransport(unittest.TestCase):
+    def test_transport_not_implemented(self):
+        """
+        Test base 'Transport' doesn't implement file operations.
+        """
+        with self.assertRaises(NotImplementedError):
+            Transport().cp("/src", "/dst")
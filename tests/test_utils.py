@@ -1,11 +1,39 @@
 """Tests for utils functionality."""
 
 
+import asyncio
+import threading
+import time
 import unittest
 from unittest.mock import Mock, patch
 
 from pysyncdroid.exceptions import BashException
-from pysyncdroid.utils import run_bash_cmd
+from pysyncdroid.utils import (
+    iter_bash_cmd,
+    iter_in_thread,
+    JobPool,
+    leaf_paths,
+    run_bash_cmd,
+    run_bash_cmd_async,
+    walk_tree,
+)
+
+
+def run_async(coro):
+    """
+    Run a coroutine in a new event loop.
+
+    :argument coro: coroutine to run
+    :type coro: coroutine
+
+    :returns coroutine result
+
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
 
 
 class TestRunBashCmd(unittest.TestCase):
@@ -66,3 +94,328 @@ class TestRunBashCmd(unittest.TestCase):
 
         err_msg = 'Command "lsusb -d" failed: {}'.format(lsub_msg)
         self.assertEqual(str(exc.exception), err_msg)
+
+
+class TestIterBashCmd(unittest.TestCase):
+    def test_iter_bash_cmd(self):
+        """
+        Test 'iter_bash_cmd' yields output records.
+        """
+        records = iter_bash_cmd(["printf", "a\\0b c\\0d"], separator="\0")
+
+        self.assertEqual(list(records), ["a", "b c", "d"])
+
+    def test_iter_bash_cmd_bashexception(self):
+        """
+        Test 'iter_bash_cmd' raises a BashException after the output if the
+        command reports an error.
+        """
+        records = iter_bash_cmd(["sh", "-c", "echo a; echo oops >&2"])
+
+        self.assertEqual(next(records), "a")
+        with self.assertRaises(BashException) as exc:
+            next(records)
+
+        self.assertTrue(str(exc.exception).endswith("failed: oops\n"))
+
+    def test_iter_bash_cmd_oserror(self):
+        """
+        Test 'iter_bash_cmd' raises an OSError when trying to execute a
+        non-existent file.
+        """
+        with self.assertRaises(OSError):
+            list(iter_bash_cmd(["no_command"]))
+
+    def test_iter_bash_cmd_close(self):
+        """
+        Test 'iter_bash_cmd' stops the command when closed.
+        """
+        records = iter_bash_cmd(["yes"])
+        self.assertEqual(next(records), "y")
+
+        records.close()
+
+
+class TestRunBashCmdAsync(unittest.TestCase):
+    def setUp(self):
+        self.patcher = patch(
+            "pysyncdroid.utils.asyncio.create_subprocess_exec"
+        )
+        self.mock_create_subprocess_exec = self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def _mock_communicate(self, return_value):
+        """
+        Prepare 'Process.communicate' response.
+
+        :argument return_value: communicate return value
+        :type return_value: tuple
+
+        """
+
+        async def communicate():
+            return return_value
+
+        async def create_subprocess_exec(*args, **kwargs):
+            return Mock(communicate=communicate)
+
+        self.mock_create_subprocess_exec.side_effect = create_subprocess_exec
+
+    def test_run_bash_cmd_async_output(self):
+        """
+        Test 'run_bash_cmd_async' returns an expected output for a valid
+        command.
+        """
+        self._mock_communicate((b"a\n", b""))
+
+        out = run_async(run_bash_cmd_async(["echo", "a"]))
+        self.assertEqual(out, "a")
+
+    def test_run_bash_cmd_async_oserror(self):
+        """
+        Test 'run_bash_cmd_async' raises an OSError when trying to execute a
+        non-existent file.
+        """
+        self.mock_create_subprocess_exec.side_effect = OSError
+        with self.assertRaises(OSError) as exc:
+            run_async(run_bash_cmd_async(["no_command"]))
+
+        err_msg = 'Error while trying to execute command "no_command": None'
+        self.assertEqual(str(exc.exception), err_msg)
+
+    def test_run_bash_cmd_async_bashexception(self):
+        """
+        Test 'run_bash_cmd_async' raises a BashException when a command
+        fails.
+        """
+        lsub_msg = b'lsusb: option requires an argument -- "d"'
+        self._mock_communicate((b"", lsub_msg))
+
+        with self.assertRaises(BashException) as exc:
+            run_async(run_bash_cmd_async(["lsusb", "-d"]))
+
+        err_msg = 'Command "lsusb -d" failed: {}'.format(lsub_msg.decode())
+        self.assertEqual(str(exc.exception), err_msg)
+
+    def test_run_bash_cmd_async_cancelled(self):
+        """
+        Test 'run_bash_cmd_async' kills and reaps the command when cancelled.
+        """
+        process = Mock(reaped=False)
+
+        async def communicate():
+            await asyncio.sleep(10)
+
+        async def wait():
+            process.reaped = True
+
+        async def create_subprocess_exec(*args, **kwargs):
+            return process
+
+        process.communicate = communicate
+        process.wait = wait
+        self.mock_create_subprocess_exec.side_effect = create_subprocess_exec
+
+        async def cancel():
+            task = asyncio.ensure_future(run_bash_cmd_async(["sleep", "10"]))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        run_async(cancel())
+
+        process.kill.assert_called_once_with()
+        self.assertTrue(process.reaped)
+
+
+class TestJobPool(unittest.TestCase):
+    def test_job_pool_inline(self):
+        """
+        Test 'JobPool' runs jobs right away in the calling thread by default.
+        """
+        threads = []
+
+        with JobPool() as pool:
+            pool.submit(lambda: threads.append(threading.current_thread()))
+            self.assertEqual(threads, [threading.current_thread()])
+
+    def test_job_pool_concurrent(self):
+        """
+        Test 'JobPool' runs jobs concurrently, but no more than allowed.
+        """
+        lock = threading.Lock()
+        running = [0]
+        max_running = [0]
+
+        def job():
+            with lock:
+                running[0] += 1
+                max_running[0] = max(max_running[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+        with JobPool(jobs=3) as pool:
+            for _ in range(12):
+                pool.submit(job)
+
+        self.assertEqual(running[0], 0)
+        self.assertEqual(max_running[0], 3)
+
+    def test_job_pool_error(self):
+        """
+        Test 'JobPool' re-raises the first error and doesn't start jobs
+        submitted after it.
+        """
+        done = []
+
+        def fail():
+            raise BashException("Connection timed out")
+
+        with self.assertRaises(BashException):
+            with JobPool(jobs=2) as pool:
+                pool.submit(fail)
+                time.sleep(0.05)
+                pool.submit(done.append, 1)
+
+        self.assertEqual(done, [])
+
+    def test_job_pool_inline_error(self):
+        """
+        Test 'JobPool' re-raises an error of a job run in the calling thread.
+        """
+        def fail():
+            raise BashException("Connection timed out")
+
+        with self.assertRaises(BashException) as exc:
+            with JobPool() as pool:
+                pool.submit(fail)
+
+        self.assertEqual(str(exc.exception), "Connection timed out")
+
+
+class TestLeafPaths(unittest.TestCase):
+    def test_leaf_paths(self):
+        """
+        Test 'leaf_paths' drops parents of other paths and duplicates.
+        """
+        self.assertEqual(
+            leaf_paths(["/a", "/a b", "/a/b", "/a/b/c", "/a/d", "/a/d", "/e"]),
+            ["/a b", "/a/b/c", "/a/d", "/e"],
+        )
+
+
+class TestWalkTree(unittest.TestCase):
+    # node to its children
+    TREE = {"a": ["b", "c"], "b": ["d"], "c": [], "d": []}
+
+    def _visit(self, node):
+        time.sleep(0.01)
+        return node, self.TREE[node]
+
+    def test_walk_tree_inline(self):
+        """
+        Test 'walk_tree' visits nodes depth-first by default.
+        """
+        self.assertEqual(
+            list(walk_tree(self._visit, "a")), ["a", "b", "d", "c"]
+        )
+
+    def test_walk_tree_concurrent(self):
+        """
+        Test 'walk_tree' visits siblings concurrently, parents first.
+        """
+        lock = threading.Lock()
+        running = [0]
+        max_running = [0]
+
+        def visit(node):
+            with lock:
+                running[0] += 1
+                max_running[0] = max(max_running[0], running[0])
+            try:
+                return self._visit(node)
+            finally:
+                with lock:
+                    running[0] -= 1
+
+        walk = list(walk_tree(visit, "a", jobs=2))
+
+        # b and c are visited at the same time
+        self.assertEqual(max_running[0], 2)
+        self.assertEqual(sorted(walk), ["a", "b", "c", "d"])
+        self.assertEqual(walk[0], "a")
+        self.assertLess(walk.index("b"), walk.index("d"))
+
+    def test_walk_tree_error(self):
+        """
+        Test 'walk_tree' re-raises the first error.
+        """
+
+        def visit(node):
+            if node == "b":
+                raise OSError("Connection reset by peer")
+            return self._visit(node)
+
+        with self.assertRaises(OSError):
+            list(walk_tree(visit, "a", jobs=2))
+
+
+class TestIterInThread(unittest.TestCase):
+    def test_iter_in_thread(self):
+        """
+        Test 'iter_in_thread' produces items in another thread, but no more
+        than allowed ahead.
+        """
+        produced = []
+
+        def produce():
+            for i in range(5):
+                produced.append(threading.current_thread())
+                yield i
+
+        items = iter_in_thread(produce(), 2)
+        self.assertEqual(next(items), 0)
+        time.sleep(0.05)
+
+        # 1 consumed, 2 queued and 1 waiting to be queued
+        self.assertEqual(len(produced), 4)
+        self.assertNotIn(threading.current_thread(), produced)
+        self.assertEqual(list(items), [1, 2, 3, 4])
+
+    def test_iter_in_thread_error(self):
+        """
+        Test 'iter_in_thread' re-raises the producer error after items
+        produced before it.
+        """
+
+        def produce():
+            yield 0
+            raise OSError("Connection reset by peer")
+
+        items = iter_in_thread(produce(), 2)
+        self.assertEqual(next(items), 0)
+        with self.assertRaises(OSError):
+            next(items)
+
+    def test_iter_in_thread_close(self):
+        """
+        Test 'iter_in_thread' stops the producer when closed.
+        """
+        closed = []
+
+        def produce():
+            try:
+                while True:
+                    yield 0
+            finally:
+                closed.append(True)
+
+        items = iter_in_thread(produce(), 2)
+        next(items)
+        items.close()
+
+        self.assertEqual(closed, [True])
@@ -0,0 +1,215 @@
+"""Tests for inotify driven synchronization."""
+
+
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from pysyncdroid.sync import Sync, REMOVE
+from pysyncdroid.transport import LocalTransport
+from pysyncdroid.watch import (
+    Inotify,
+    Watcher,
+    IN_CLOSE_WRITE,
+    IN_CREATE,
+    IN_DELETE,
+    IN_ISDIR,
+    IN_MOVED_FROM,
+    IN_Q_OVERFLOW,
+)
+from tests.test_sync import FAKE_MTP_DETAILS
+
+
+class TestInotify(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.inotify = Inotify()
+
+    def tearDown(self):
+        self.inotify.close()
+        self.tmp_dir.cleanup()
+
+    def test_read_events(self):
+        """
+        Test 'Inotify' reports files written in a watched directory tree.
+        """
+        subdir = os.path.join(self.tmp_dir.name, "Album")
+        os.makedirs(subdir)
+        self.inotify.add_tree(self.tmp_dir.name)
+
+        path = os.path.join(subdir, "song.mp3")
+        with open(path, "w"):
+            pass
+
+        events = self.inotify.read_events(timeout=1)
+        self.assertIn((path, IN_CLOSE_WRITE), events)
+
+    def test_read_events_timeout(self):
+        """
+        Test 'Inotify' returns no events when nothing happened.
+        """
+        self.inotify.add_tree(self.tmp_dir.name)
+
+        self.assertEqual(self.inotify.read_events(timeout=0), [])
+
+    def test_remove_tree(self):
+        """
+        Test 'Inotify' stops watching a directory tree.
+        """
+        subdir = os.path.join(self.tmp_dir.name, "Album")
+        os.makedirs(subdir)
+        self.inotify.add_tree(self.tmp_dir.name)
+        self.inotify.remove_tree(subdir)
+
+        self.assertEqual(list(self.inotify.wds), [self.tmp_dir.name])
+
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        self.sync = Mock(source="/src")
+        self.other_sync = Mock(source="/src2")
+        self.inotify = Mock()
+        self.watcher = Watcher(
+            [self.sync, self.other_sync], inotify=self.inotify
+        )
+
+    def test_init_device_source(self):
+        """
+        Test 'Watcher' refuses to watch sources on device.
+        """
+        sync = Mock(source=FAKE_MTP_DETAILS[1] + "/Music")
+
+        with self.assertRaises(ValueError):
+            Watcher([sync], inotify=self.inotify)
+
+    def test_handle_events(self):
+        """
+        Test 'handle_events' coalesces events per sync.
+        """
+        changed, removed, rescan = self.watcher.handle_events(
+            [
+                ("/src/a.mp3", IN_CLOSE_WRITE),
+                ("/src/a.mp3", IN_CLOSE_WRITE),
+                ("/src/b.mp3", IN_CLOSE_WRITE),
+                ("/src/b.mp3", IN_DELETE),
+                ("/src/c.mp3", IN_DELETE),
+                ("/src/c.mp3", IN_CLOSE_WRITE),
+                ("/src2/d.mp3", IN_CLOSE_WRITE),
+                ("/elsewhere/e.mp3", IN_CLOSE_WRITE),
+            ]
+        )
+
+        self.assertEqual(changed[self.sync], {"/src/a.mp3", "/src/c.mp3"})
+        self.assertEqual(removed[self.sync], {"/src/b.mp3"})
+        self.assertEqual(changed[self.other_sync], {"/src2/d.mp3"})
+        self.assertFalse(rescan[self.sync])
+
+    def test_handle_events_rescan(self):
+        """
+        Test 'handle_events' asks for the full sync when events are lost or a
+        directory is moved away.
+        """
+        _, _, rescan = self.watcher.handle_events(
+            [("/src/Album", IN_MOVED_FROM | IN_ISDIR)]
+        )
+        self.assertTrue(rescan[self.sync])
+        self.assertFalse(rescan[self.other_sync])
+        self.inotify.remove_tree.assert_called_once_with("/src/Album")
+
+        _, _, rescan = self.watcher.handle_events([(None, IN_Q_OVERFLOW)])
+        self.assertTrue(rescan[self.sync])
+        self.assertTrue(rescan[self.other_sync])
+
+    def test_handle_events_new_directory(self):
+        """
+        Test 'handle_events' watches a new directory and picks its files.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.sync.source = tmp_dir
+            path = os.path.join(tmp_dir, "song.mp3")
+            with open(path, "w"):
+                pass
+
+            changed, _, _ = self.watcher.handle_events(
+                [(tmp_dir, IN_CREATE | IN_ISDIR)]
+            )
+
+        self.assertEqual(changed[self.sync], {path})
+        self.inotify.add_tree.assert_called_with(tmp_dir)
+
+    def test_sync_batch(self):
+        """
+        Test 'sync_batch' synchronizes only changed paths, unless the full
+        sync is needed.
+        """
+        self.watcher.sync_batch(
+            [
+                ("/src/a.mp3", IN_CLOSE_WRITE),
+                ("/src/b.mp3", IN_DELETE),
+                ("/src2/Album", IN_MOVED_FROM | IN_ISDIR),
+            ]
+        )
+
+        self.sync.sync_paths.assert_called_once_with(
+            {"/src/a.mp3"}, {"/src/b.mp3"}
+        )
+        self.sync.sync.assert_not_called()
+        self.other_sync.sync.assert_called_once_with()
+        self.other_sync.sync_paths.assert_not_called()
+
+    def test_wait_batch(self):
+        """
+        Test 'wait_batch' collects events until they stop coming.
+        """
+        self.inotify.read_events.side_effect = (
+            [("/src/a.mp3", IN_CLOSE_WRITE)],
+            [("/src/b.mp3", IN_CLOSE_WRITE)],
+            [],
+        )
+
+        self.assertEqual(
+            self.watcher.wait_batch(),
+            [("/src/a.mp3", IN_CLOSE_WRITE), ("/src/b.mp3", IN_CLOSE_WRITE)],
+        )
+
+
+class TestWatcherIntegration(unittest.TestCase):
+    def test_run(self):
+        """
+        Test 'Watcher' copies written files and removes deleted ones.
+        """
+        with tempfile.TemporaryDirectory() as src_dir:
+            with tempfile.TemporaryDirectory() as dst_dir:
+                with open(os.path.join(src_dir, "old.mp3"), "w"):
+                    pass
+                with open(os.path.join(dst_dir, "old.mp3"), "w"):
+                    pass
+
+                sync = Sync(
+                    FAKE_MTP_DETAILS,
+                    src_dir,
+                    dst_dir,
+                    unmatched=REMOVE,
+                    backend=LocalTransport(),
+                )
+                sync.set_source_abs()
+                sync.set_destination_abs()
+
+                watcher = Watcher([sync], debounce=0.1)
+                try:
+                    os.makedirs(os.path.join(src_dir, "Album"))
+                    with open(os.path.join(src_dir, "Album", "a.mp3"), "w"):
+                        pass
+                    os.remove(os.path.join(src_dir, "old.mp3"))
+
+                    watcher.run(timeout=0.5)
+                finally:
+                    watcher.close()
+
+                self.assertTrue(
+                    os.path.exists(os.path.join(dst_dir, "Album", "a.mp3"))
+                )
+                self.assertFalse(
+                    os.path.exists(os.path.join(dst_dir, "old.mp3"))
+                )